@@ -0,0 +1,152 @@
+"""
+Генератор синтетических данных для нагрузочных тестов (bets + ledger + bet_events)
+"""
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Tuple
+
+from constants import PLAYERS, BET_NAMES
+from config import PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME
+from database.db import _backfill_bet_events
+from models.bet import STATUS_DRAFT, STATUS_OPEN, STATUS_TAKEN, STATUS_FINISHED, STATUS_CANCELED, calculate_payout
+
+
+# Фиктивные Telegram ID игроков
+MAKERS = [
+    (100001, PLAYER_INZAAA_USERNAME),
+    (100002, PLAYER_TROOLZ_USERNAME),
+]
+
+# Распределение статусов в реальной истории: почти всё завершено
+STATUS_WEIGHTS = [
+    (STATUS_FINISHED, 86),
+    (STATUS_CANCELED, 6),
+    (STATUS_OPEN, 3),
+    (STATUS_TAKEN, 3),
+    (STATUS_DRAFT, 2),
+]
+
+# Проценты на победу, как на кнопках шага 2 (чаще около 50%)
+PERCENT_WEIGHTS = [(pct, 20 - abs(50 - pct) // 3) for pct in range(5, 100, 5)]
+
+# Готовые суммы встречаются чаще свободного ввода
+STAKES = [500, 1000, 1500, 2000]
+
+BATCH_SIZE = 10_000
+
+
+def _weighted(rng: random.Random, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def generate_bets(count: int, seed: int = 42, days: int = 365,
+                  now: Optional[datetime] = None) -> Iterator[Tuple[tuple, list]]:
+    """Генерация строк (bet_row, ledger_rows) в хронологическом порядке"""
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    start = now - timedelta(days=days)
+    step = timedelta(days=days) / max(count, 1)
+
+    for i in range(count):
+        maker_id, maker_username = rng.choice(MAKERS)
+        taker_id, taker_username = MAKERS[1] if maker_id == MAKERS[0][0] else MAKERS[0]
+        playerA, playerB = rng.sample(PLAYERS, 2)
+        bet_name = rng.choice(BET_NAMES) if rng.random() < 0.8 else f"Матч {rng.randint(1, 500)}"
+
+        pct = _weighted(rng, PERCENT_WEIGHTS)
+        oddsA = round(100 / pct, 2)
+        oddsB = round(100 / (100 - pct), 2)
+        stake = float(rng.choice(STAKES)) if rng.random() < 0.85 else float(rng.randrange(100, 5000, 50))
+
+        created_at = start + step * i + timedelta(seconds=rng.randint(0, 600))
+        status = _weighted(rng, STATUS_WEIGHTS)
+        # Незакрытые пари — только в хвосте истории
+        if status in (STATUS_OPEN, STATUS_TAKEN, STATUS_DRAFT) and i < count * 0.9:
+            status = STATUS_FINISHED
+
+        taker_user_id = None
+        taker_side = None
+        result = None
+        finished_at = None
+        maker_win = 0.0
+        taker_win = 0.0
+        ledger_rows = []
+
+        if status == STATUS_DRAFT:
+            stake = None
+            if rng.random() < 0.5:
+                oddsA = oddsB = None
+        if status in (STATUS_TAKEN, STATUS_FINISHED):
+            taker_user_id = taker_id
+            taker_side = rng.choice('AB')
+        if status == STATUS_FINISHED:
+            result = 'VOID' if rng.random() < 0.03 else ('A' if rng.random() * 100 < pct else 'B')
+            finished_at = created_at + timedelta(hours=rng.uniform(0.5, 6))
+            maker_win, taker_win = calculate_payout(stake, oddsA, oddsB, taker_side, result)
+            ledger_rows = [
+                (maker_id, maker_username, maker_win, finished_at.isoformat()),
+                (taker_user_id, taker_username, taker_win, finished_at.isoformat()),
+            ]
+
+        bet_row = (
+            maker_id, maker_username, taker_user_id, taker_username, bet_name,
+            playerA, playerB, oddsA, oddsB, stake, status, taker_side, result,
+            created_at.isoformat(), finished_at.isoformat() if finished_at else None,
+            maker_win, taker_win
+        )
+        yield bet_row, ledger_rows
+
+
+def populate(conn: sqlite3.Connection, count: int, seed: int = 42, days: int = 365,
+             now: Optional[datetime] = None) -> dict:
+    """Заполнение базы синтетической историей пачками по BATCH_SIZE"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM bets')
+    next_id = cursor.fetchone()[0] + 1
+
+    bets_batch = []
+    ledger_batch = []
+    totals = {'bets': 0, 'ledger': 0}
+
+    def flush():
+        cursor.executemany('''
+            INSERT INTO bets
+            (id, maker_user_id, maker_username, taker_user_id, taker_username, bet_name,
+             playerA_name, playerB_name, oddsA, oddsB, stake, status, taker_side, result,
+             created_at, finished_at, maker_win, taker_win)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', bets_batch)
+        cursor.executemany('''
+            INSERT INTO ledger (bet_id, user_id, username, amount, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ledger_batch)
+        # Журнал событий, как после миграции истории
+        _backfill_bet_events(cursor, bets_batch[0][0])
+        conn.commit()
+        totals['bets'] += len(bets_batch)
+        totals['ledger'] += len(ledger_batch)
+        bets_batch.clear()
+        ledger_batch.clear()
+
+    for bet_row, ledger_rows in generate_bets(count, seed=seed, days=days, now=now):
+        bet_id = next_id
+        next_id += 1
+        bets_batch.append((bet_id,) + bet_row)
+        for user_id, username, amount, created_at in ledger_rows:
+            ledger_batch.append((bet_id, user_id, username, amount, created_at))
+        if len(bets_batch) >= BATCH_SIZE:
+            flush()
+
+    if bets_batch:
+        flush()
+
+    # Игроки истории известны реестру пользователей, как после их первых обновлений
+    seen_at = (now or datetime.now()).isoformat()
+    cursor.executemany('''
+        INSERT OR IGNORE INTO users (user_id, username, username_lower, first_name, first_seen, last_seen)
+        VALUES (?, ?, ?, NULL, ?, ?)
+    ''', [(user_id, username, username.lower(), seen_at, seen_at) for user_id, username in MAKERS])
+    conn.commit()
+    return totals
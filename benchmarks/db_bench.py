@@ -0,0 +1,309 @@
+"""
+Нагрузочный бенчмарк функций database/db.py на синтетической истории
+
+Запуск:
+    python -m benchmarks.db_bench --scales 10000,100000,1000000 --output bench_db.json
+    python -m benchmarks.db_bench --scales 10000 --compare bench_db.json
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database import db
+from benchmarks.datagen import populate, MAKERS
+from models.bet import Bet, STATUS_DRAFT, STATUS_OPEN, STATUS_TAKEN, STATUS_FINISHED
+from models.bet_event import EVENT_CREATED, BET_FIELDS
+from models.tenant import DEFAULT_TENANT_ID
+
+
+REPORT_VERSION = 1
+
+# Функции, которые не являются запросами к данным, и генераторы (вызов не читает строки)
+SKIP_FUNCTIONS = {'get_connection', 'iter_export_rows'}
+
+
+def _insert_bet(conn, status, taker_side=None):
+    """Вставка подготовительного пари в обход измеряемых функций"""
+    maker_id, maker_username = MAKERS[0]
+    taker_id, taker_username = MAKERS[1]
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO bets
+        (maker_user_id, maker_username, taker_user_id, taker_username, bet_name, playerA_name, playerB_name,
+         oddsA, oddsB, stake, status, taker_side, created_at)
+        VALUES (?, ?, ?, ?, 'BO3', 'ash', 'fog', 1.67, 2.5, 1000, ?, ?, ?)
+    ''', (maker_id, maker_username, taker_id if taker_side else None, taker_username,
+          status, taker_side, datetime.now().isoformat()))
+    bet_id = cursor.lastrowid
+    # Журнал как у пари, созданного ботом: без него нечего отменять
+    cursor.execute('SELECT * FROM bets WHERE id = ?', (bet_id,))
+    row = cursor.fetchone()
+    db._append_event(cursor, bet_id, EVENT_CREATED, {field: row[field] for field in BET_FIELDS}, maker_id)
+    conn.commit()
+    return bet_id
+
+
+class BenchContext:
+    """Общие данные для подготовки аргументов кейсов"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT MAX(id) FROM bets')
+        self.max_id = cursor.fetchone()[0] or 1
+        conn.close()
+
+    def random_id(self):
+        return self.rng.randint(1, self.max_id)
+
+    def fresh_bet(self, status, taker_side=None):
+        conn = db.get_connection()
+        try:
+            return _insert_bet(conn, status, taker_side)
+        finally:
+            conn.close()
+
+
+def _new_bet():
+    maker_id, maker_username = MAKERS[0]
+    return Bet(
+        id=None, maker_user_id=maker_id, maker_username=maker_username,
+        taker_user_id=None, taker_username=MAKERS[1][1], bet_name='BO3',
+        playerA_name='ash', playerB_name='fog', oddsA=None, oddsB=None, stake=None,
+        status=STATUS_DRAFT, taker_side=None, result=None, created_at=datetime.now()
+    )
+
+
+def _finished_bets(ctx, count):
+    """Завершенные пари для пакетного импорта"""
+    bets = []
+    for _ in range(count):
+        bet = _new_bet()
+        bet.taker_user_id = MAKERS[1][0]
+        bet.oddsA, bet.oddsB, bet.stake = 1.67, 2.5, 1000.0
+        bet.status, bet.taker_side, bet.result = STATUS_FINISHED, ctx.rng.choice('AB'), ctx.rng.choice('AB')
+        bet.finished_at = bet.created_at
+        bet.maker_win, bet.taker_win = bet.payout(bet.result)
+        bets.append(bet)
+    return bets
+
+
+def _settled_bet(ctx):
+    """Пари с результатом, проставленным игроком: его отменит undo_last_action; возвращает ID игрока"""
+    db.set_bet_result(ctx.fresh_bet(STATUS_TAKEN, 'A'), ctx.rng.choice('AB'), MAKERS[0][0])
+    return MAKERS[0][0]
+
+
+# Кейсы: имя функции -> (prepare(ctx) -> (args, kwargs), destructive)
+CASES = {
+    'init_db': (lambda ctx: ((), {}), False),
+    'create_bet': (lambda ctx: ((_new_bet(),), {}), False),
+    'update_bet_step2': (lambda ctx: ((ctx.fresh_bet(STATUS_DRAFT), 1.67, 2.5), {}), False),
+    'update_bet_name': (lambda ctx: ((ctx.random_id(), 'BO5'), {}), False),
+    'update_bet_step3': (lambda ctx: ((ctx.fresh_bet(STATUS_DRAFT), 1000.0), {}), False),
+    'update_taker_user_id': (lambda ctx: ((ctx.fresh_bet(STATUS_OPEN), MAKERS[1][0]), {}), False),
+    'get_bet': (lambda ctx: ((ctx.random_id(),), {}), False),
+    'get_active_bets': (lambda ctx: ((), {}), False),
+    'get_active_bets[tenant]': (lambda ctx: ((DEFAULT_TENANT_ID,), {}), False),
+    'get_bets_last_24h': (lambda ctx: ((), {}), False),
+    'get_bets_last_24h[tenant]': (lambda ctx: ((DEFAULT_TENANT_ID,), {}), False),
+    'get_digest_chats': (lambda ctx: ((datetime.now() - timedelta(days=7),), {}), False),
+    'take_bet': (lambda ctx: ((ctx.fresh_bet(STATUS_OPEN), MAKERS[1][0], 'A'), {}), False),
+    'set_bet_result': (lambda ctx: ((ctx.fresh_bet(STATUS_TAKEN, 'A'), ctx.rng.choice('AB')), {}), False),
+    'change_bet_result': (lambda ctx: ((ctx.fresh_bet(STATUS_TAKEN, 'B'), 'VOID'), {}), False),
+    'get_bets_to_remind': (lambda ctx: ((STATUS_OPEN, datetime.now() - timedelta(hours=12)), {}), False),
+    'mark_bets_reminded': (lambda ctx: (([ctx.random_id() for _ in range(20)],), {}), False),
+    'import_bets[500]': (lambda ctx: ((_finished_bets(ctx, 500),), {}), False),
+    'cancel_bet': (lambda ctx: ((ctx.fresh_bet(STATUS_OPEN),), {}), False),
+    'get_bet_events': (lambda ctx: ((ctx.random_id(),), {}), False),
+    'undo_last_action': (lambda ctx: ((_settled_bet(ctx), DEFAULT_TENANT_ID), {}), False),
+    'get_user_statistics': (lambda ctx: ((MAKERS[0][0],), {}), False),
+    'get_user_statistics[30d]': (
+        lambda ctx: ((MAKERS[0][0], datetime.now() - timedelta(days=30), datetime.now()), {}), False),
+    'get_all_statistics': (lambda ctx: ((), {}), False),
+    'get_all_statistics[30d]': (
+        lambda ctx: ((datetime.now() - timedelta(days=30), datetime.now()), {}), False),
+    'get_data_version': (lambda ctx: ((), {}), False),
+    'get_export_columns': (lambda ctx: (('bets',), {}), False),
+    'count_export_rows[ledger,player]': (lambda ctx: (('ledger',), {'username': MAKERS[0][1]}), False),
+    'get_tenant': (lambda ctx: ((DEFAULT_TENANT_ID,), {}), False),
+    'get_tenant_by_chat': (lambda ctx: ((ctx.rng.randint(-10**12, -1),), {}), False),
+    'save_tenant': (
+        lambda ctx: ((ctx.rng.randint(-10**12, -1), 'bench', MAKERS[0][1], MAKERS[1][1]), {}), False),
+    'save_user': (lambda ctx: ((ctx.rng.randint(10**6, 10**9), 'bench_user', 'Bench'), {}), False),
+    'get_users': (lambda ctx: ((), {}), False),
+    'find_user_ids': (lambda ctx: (([MAKERS[0][1], MAKERS[1][1]],), {}), False),
+    'expire_bets': (lambda ctx: ((STATUS_OPEN, datetime.now() - timedelta(hours=72)), {}), True),
+    'reset_statistics': (lambda ctx: ((), {}), True),
+}
+
+
+def _resolve(case_name):
+    return getattr(db, case_name.split('[', 1)[0])
+
+
+def uncovered_functions():
+    """Публичные функции db.py без кейса в бенчмарке"""
+    covered = {name.split('[', 1)[0] for name in CASES}
+    return sorted(
+        name for name, obj in inspect.getmembers(db, inspect.isfunction)
+        if obj.__module__ == db.__name__ and not name.startswith('_')
+        and name not in covered and name not in SKIP_FUNCTIONS
+    )
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_case(case_name, ctx, repeat):
+    """Замер одного кейса: подготовка аргументов не входит в измерение"""
+    prepare, _ = CASES[case_name]
+    func = _resolve(case_name)
+    samples = []
+    for _ in range(repeat):
+        args, kwargs = prepare(ctx)
+        started = time.perf_counter()
+        func(*args, **kwargs)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'function': case_name,
+        'runs': len(samples),
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(_percentile(samples, 95), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def run_scale(scale, repeat, seed, workdir):
+    """Генерация базы заданного размера и замер всех функций"""
+    db.DB_PATH = os.path.join(workdir, f'bench_{scale}.db')
+    db.init_db()
+
+    conn = sqlite3.connect(db.DB_PATH)
+    started = time.perf_counter()
+    totals = populate(conn, scale, seed=seed)
+    generate_s = time.perf_counter() - started
+    conn.close()
+
+    size_bytes = os.path.getsize(db.DB_PATH)
+    print(f"[{scale}] сгенерировано {totals['bets']} пари и {totals['ledger']} записей ledger "
+          f"за {generate_s:.1f} с ({size_bytes / 1024 / 1024:.1f} МБ)", file=sys.stderr)
+
+    ctx = BenchContext(random.Random(seed))
+    results = []
+    # Разрушающие кейсы выполняются последними
+    ordered = sorted(CASES, key=lambda name: CASES[name][1])
+    for case_name in ordered:
+        destructive = CASES[case_name][1]
+        row = time_case(case_name, ctx, 1 if destructive else repeat)
+        row['scale'] = scale
+        results.append(row)
+        print(f"[{scale}] {case_name:<28} median {row['median_ms']:>10.3f} мс  "
+              f"p95 {row['p95_ms']:>10.3f} мс", file=sys.stderr)
+
+    return {
+        'scale': scale,
+        'bets': totals['bets'],
+        'ledger': totals['ledger'],
+        'db_size_bytes': size_bytes,
+        'generate_s': round(generate_s, 3),
+    }, results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """Сравнение отчета с базовым: отношение медиан по (scale, function)"""
+    base = {(r['scale'], r['function']): r for r in baseline['results']}
+    lines = []
+    for row in report['results']:
+        old = base.get((row['scale'], row['function']))
+        if not old or not old['median_ms']:
+            continue
+        ratio = row['median_ms'] / old['median_ms']
+        mark = ' ⚠️' if ratio > 1.2 else ''
+        lines.append(f"{row['scale']:>9} {row['function']:<28} {old['median_ms']:>10.3f} → "
+                     f"{row['median_ms']:>10.3f} мс  x{ratio:.2f}{mark}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк функций database/db.py')
+    parser.add_argument('--scales', default='10000,100000,1000000',
+                        help='Размеры истории через запятую (количество пари)')
+    parser.add_argument('--repeat', type=int, default=5, help='Повторов на функцию')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_db.json', help='Файл JSON-отчета')
+    parser.add_argument('--compare', help='Базовый JSON-отчет для сравнения')
+    parser.add_argument('--keep', action='store_true', help='Не удалять временные базы')
+    args = parser.parse_args(argv)
+
+    missing = uncovered_functions()
+    if missing:
+        print(f"⚠️ Нет кейсов для: {', '.join(missing)}", file=sys.stderr)
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    workdir = tempfile.mkdtemp(prefix='betbot-bench-')
+    original_path = db.DB_PATH
+    report = {
+        'version': REPORT_VERSION,
+        'suite': 'db',
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'datasets': [],
+        'results': [],
+        'uncovered': missing,
+    }
+    try:
+        for scale in scales:
+            dataset, results = run_scale(scale, args.repeat, args.seed, workdir)
+            report['datasets'].append(dataset)
+            report['results'].extend(results)
+    finally:
+        db.DB_PATH = original_path
+        if args.keep:
+            print(f"Базы сохранены в {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Отчет записан в {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        for line in compare(report, baseline):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Фейковый Telegram Bot API для локальных бенчмарков обработчиков
+
+FakeRequest подменяет сетевой слой python-telegram-bot: настоящий Bot и Application
+работают как обычно, но запросы к API записываются и получают синтетические ответы
+с настраиваемой задержкой. Повторный answerCallbackQuery на то же нажатие отклоняется,
+как в Telegram (400 Bad Request), и считается в duplicate_answers.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+
+BOT_USER = {'id': 999000, 'is_bot': True, 'first_name': 'BetBot', 'username': 'bench_bet_bot'}
+BOT_TOKEN = '999000:BENCHMARK-TOKEN'
+DUPLICATE_ANSWER_ERROR = 'Bad Request: query is too old and response timeout expired or query id is invalid'
+
+# Счетчики текущего взаимодействия (устанавливаются раннером)
+current_sample: ContextVar[Optional['Sample']] = ContextVar('current_sample', default=None)
+
+
+@dataclass
+class Sample:
+    """Замер одного взаимодействия"""
+    step: str
+    latency_ms: float = 0.0
+    db_statements: int = 0
+    db_connections: int = 0
+    api_calls: int = 0
+    api_ms: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class ApiCall:
+    method: str
+    params: dict
+    duration_ms: float
+
+
+@dataclass
+class ChatView:
+    """Что пользователь видит в чате: последние сообщения с клавиатурами"""
+    next_message_id: int = 1
+    last_message_id: Optional[int] = None
+    markups: Dict[int, list] = field(default_factory=dict)
+
+
+class FakeRequest(BaseRequest):
+    """Сетевой слой, отвечающий как Bot API, без обращения к сети"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls: List[ApiCall] = []
+        self.chats: Dict[int, ChatView] = {}
+        self.answered: Set[str] = set()
+        self.duplicate_answers = 0
+        self._rng = random.Random(seed)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def chat(self, chat_id: int) -> ChatView:
+        view = self.chats.get(chat_id)
+        if view is None:
+            view = self.chats[chat_id] = ChatView()
+        return view
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+
+        started = time.perf_counter()
+        if self.latency_ms or self.jitter_ms:
+            delay = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+            await asyncio.sleep(max(delay, 0) / 1000)
+        duplicate = api_method == 'answerCallbackQuery' and not self._first_answer(params)
+        result = None if duplicate else self._respond(api_method, params)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        self.calls.append(ApiCall(api_method, params, duration_ms))
+        sample = current_sample.get()
+        if sample is not None:
+            sample.api_calls += 1
+            sample.api_ms += duration_ms
+        if duplicate:
+            if sample is not None:
+                sample.error = DUPLICATE_ANSWER_ERROR
+            return 400, json.dumps({'ok': False, 'error_code': 400, 'description': DUPLICATE_ANSWER_ERROR}).encode()
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def _first_answer(self, params) -> bool:
+        query_id = str(params.get('callback_query_id'))
+        if query_id in self.answered:
+            self.duplicate_answers += 1
+            return False
+        self.answered.add(query_id)
+        return True
+
+    def _message(self, chat_id, message_id, params):
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'group', 'title': 'Bench'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+        if 'reply_markup' in params:
+            message['reply_markup'] = params['reply_markup']
+        return message
+
+    def _remember(self, chat_id, message_id, params):
+        view = self.chat(chat_id)
+        view.last_message_id = message_id
+        markup = params.get('reply_markup')
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        view.markups[message_id] = (markup or {}).get('inline_keyboard', [])
+
+    def _respond(self, api_method, params):
+        if api_method == 'getMe':
+            return BOT_USER
+        if api_method in ('sendMessage', 'sendDocument'):
+            chat_id = int(params['chat_id'])
+            view = self.chat(chat_id)
+            message_id = view.next_message_id
+            view.next_message_id += 1
+            self._remember(chat_id, message_id, params)
+            return self._message(chat_id, message_id, params)
+        if api_method in ('editMessageText', 'editMessageReplyMarkup'):
+            if 'inline_message_id' in params:
+                return True
+            chat_id = int(params['chat_id'])
+            message_id = int(params['message_id'])
+            self._remember(chat_id, message_id, params)
+            return self._message(chat_id, message_id, params)
+        if api_method == 'getUpdates':
+            return []
+        # answerCallbackQuery, deleteMessage, setMyCommands, answerInlineQuery ...
+        return True
+
+
+class UpdateFactory:
+    """Построение Update-объектов так, как их присылает Telegram"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+        self._query_ids = itertools.count(1)
+
+    @staticmethod
+    def user(user_id: int, username: str) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': username, 'username': username}
+
+    def message(self, chat_id: int, message_id: int, user: dict, text: str) -> Update:
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'group', 'title': 'Bench'},
+            'from': user,
+            'text': text,
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return Update.de_json({'update_id': next(self._update_ids), 'message': message}, self.bot)
+
+    def callback(self, chat_id: int, message_id: int, user: dict, data: str) -> Update:
+        query = {
+            'id': str(next(self._query_ids)),
+            'from': user,
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'group', 'title': 'Bench'},
+                'from': BOT_USER,
+                'text': '',
+            },
+        }
+        return Update.de_json({'update_id': next(self._update_ids), 'callback_query': query}, self.bot)
@@ -0,0 +1,279 @@
+"""
+Сквозной бенчмарк обработчиков через настоящий Application и фейковый Bot API
+
+Запуск:
+    python -m benchmarks.handler_bench --sessions 50 --concurrency 10 --api-latency-ms 40
+    python -m benchmarks.handler_bench --scenario benchmarks/scenarios/wizard_text.json --history 100000
+"""
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from telegram.ext import Application
+
+from database import db
+from benchmarks.datagen import populate
+from benchmarks.db_bench import _git_commit, _percentile
+from benchmarks.fake_bot import FakeRequest, UpdateFactory, Sample, current_sample, BOT_TOKEN
+from config import PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME
+from database.tenants import tenants
+from database.users import users
+from database.catalog import catalog
+from services.jobs import jobs
+from state.base import get_backend, set_backend
+from state.memory import InProcessBackend
+from state.resp import RespBackend
+from state.server import StateServer
+
+
+REPORT_VERSION = 1
+DEFAULT_SCENARIO = os.path.join(os.path.dirname(__file__), 'scenarios', 'lifecycle.json')
+
+
+def instrument_db():
+    """Подсчет соединений и SQL-выражений на текущее взаимодействие"""
+    original = db.get_connection
+
+    def trace(statement):
+        sample = current_sample.get()
+        if sample is not None:
+            sample.db_statements += 1
+
+    def counting_connection():
+        conn = original()
+        conn.set_trace_callback(trace)
+        sample = current_sample.get()
+        if sample is not None:
+            sample.db_connections += 1
+        return conn
+
+    db.get_connection = counting_connection
+    return original
+
+
+async def build_application(request: FakeRequest) -> Application:
+    """Application с обработчиками из bot.py и фейковым сетевым слоем"""
+    from bot import register_handlers
+
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(request)
+        .get_updates_request(request)
+        .updater(None)
+        .build()
+    )
+    register_handlers(application)
+    await application.initialize()
+    return application
+
+
+class StepError(Exception):
+    """Шаг сценария не может быть выполнен (например, нет кнопки)"""
+
+
+class Session:
+    """Один чат со своей парой игроков, проигрывающий сценарий
+
+    У каждого чата своя пара (как у групп после /pair): списки пари и статистика
+    одного чата не видят пари соседних сессий.
+    """
+
+    def __init__(self, index: int, application: Application, request: FakeRequest, factory: UpdateFactory):
+        self.application = application
+        self.request = request
+        self.factory = factory
+        self.chat_id = -1_000_000 - index
+        maker_username = f"{PLAYER_INZAAA_USERNAME}_{index}"
+        taker_username = f"{PLAYER_TROOLZ_USERNAME}_{index}"
+        self.actors = {
+            'maker': factory.user(1_000_000 + index, maker_username),
+            'taker': factory.user(2_000_000 + index, taker_username),
+        }
+        tenants.save(self.chat_id, f"bench {index}", maker_username, taker_username)
+        self._user_message_ids = iter(range(1_000_000, 2_000_000))
+
+    def _find_button(self, pattern: str):
+        view = self.request.chat(self.chat_id)
+        if view.last_message_id is None:
+            raise StepError(f"нет сообщения для нажатия '{pattern}'")
+        for row in view.markups.get(view.last_message_id, []):
+            for button in row:
+                if fnmatch.fnmatchcase(button.get('text', ''), pattern) or \
+                        fnmatch.fnmatchcase(button.get('callback_data', ''), pattern):
+                    return view.last_message_id, button['callback_data']
+        raise StepError(f"кнопка '{pattern}' не найдена")
+
+    def build_update(self, step: dict):
+        user = self.actors[step.get('actor', 'maker')]
+        if 'click' in step:
+            message_id, data = self._find_button(step['click'])
+            return f"click:{step['click']}", self.factory.callback(self.chat_id, message_id, user, data)
+        text = step.get('command') or step.get('text')
+        kind = 'command' if 'command' in step else 'text'
+        return f"{kind}:{text}", self.factory.message(self.chat_id, next(self._user_message_ids), user, text)
+
+    async def run(self, steps, samples):
+        for step in steps:
+            try:
+                name, update = self.build_update(step)
+            except StepError as e:
+                samples.append(Sample(step=str(step), error=str(e)))
+                return
+            sample = Sample(step=name)
+            token = current_sample.set(sample)
+            started = time.perf_counter()
+            try:
+                # Тот же путь, что и у Application.start(): через update_processor
+                await self.application.update_processor.process_update(
+                    update, self.application.process_update(update)
+                )
+            except Exception as e:  # noqa: BLE001 — ошибка становится частью отчета
+                sample.error = repr(e)
+            finally:
+                sample.latency_ms = (time.perf_counter() - started) * 1000
+                current_sample.reset(token)
+            samples.append(sample)
+
+
+def summarize(samples):
+    """Сводка по шагам: p50/p99 задержки, DB и API вызовы на взаимодействие"""
+    by_step = defaultdict(list)
+    for sample in samples:
+        by_step[sample.step].append(sample)
+
+    rows = []
+    for step, items in by_step.items():
+        ok = [s for s in items if s.error is None]
+        latencies = [s.latency_ms for s in ok] or [0.0]
+        rows.append({
+            'step': step,
+            'count': len(items),
+            'errors': len(items) - len(ok),
+            'p50_ms': round(_percentile(latencies, 50), 3),
+            'p99_ms': round(_percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'db_statements': round(statistics.mean(s.db_statements for s in ok), 2) if ok else 0,
+            'db_connections': round(statistics.mean(s.db_connections for s in ok), 2) if ok else 0,
+            'api_calls': round(statistics.mean(s.api_calls for s in ok), 2) if ok else 0,
+            'api_ms': round(statistics.mean(s.api_ms for s in ok), 3) if ok else 0,
+        })
+    return rows
+
+
+async def run_benchmark(steps, sessions, concurrency, latency_ms, jitter_ms, seed, state='memory'):
+    # Сессии визарда: в памяти или в локальном RESP-хранилище (сетевой путь без Redis)
+    server = None
+    if state == 'resp':
+        server = StateServer(port=0)
+        await server.start()
+        set_backend(RespBackend(server.host, server.port, 'bench'))
+    else:
+        set_backend(InProcessBackend())
+
+    # Реестры процесса могли остаться от другой базы
+    tenants.invalidate()
+    users.invalidate()
+    catalog.invalidate()
+
+    request = FakeRequest(latency_ms=latency_ms, jitter_ms=jitter_ms, seed=seed)
+    application = await build_application(request)
+    factory = UpdateFactory(application.bot)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def worker(index):
+        async with semaphore:
+            await Session(index, application, request, factory).run(steps, samples)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(i) for i in range(sessions)))
+    finally:
+        await application.shutdown()
+        await jobs.shutdown()
+        await get_backend().close()
+        if server is not None:
+            await server.stop()
+    elapsed = time.perf_counter() - started
+    return samples, elapsed, len(request.calls)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк обработчиков с фейковым Bot API')
+    parser.add_argument('--scenario', default=DEFAULT_SCENARIO, help='JSON со сценарием нажатий')
+    parser.add_argument('--sessions', type=int, default=20, help='Количество чатов, проигрывающих сценарий')
+    parser.add_argument('--concurrency', type=int, default=5, help='Одновременно активных чатов')
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help='Задержка ответа Bot API')
+    parser.add_argument('--api-jitter-ms', type=float, default=0.0, help='Разброс задержки Bot API')
+    parser.add_argument('--history', type=int, default=0, help='Сгенерировать N пари истории перед замером')
+    parser.add_argument('--state', choices=('memory', 'resp'), default='memory',
+                        help='Хранилище сессий: в памяти или локальный RESP-сервер')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_handlers.json', help='Файл JSON-отчета')
+    args = parser.parse_args(argv)
+
+    with open(args.scenario, encoding='utf-8') as f:
+        scenario = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix='betbot-handlers-')
+    original_path = db.DB_PATH
+    db.DB_PATH = os.path.join(workdir, 'bench.db')
+    original_connection = instrument_db()
+    try:
+        db.init_db()
+        if args.history:
+            conn = sqlite3.connect(db.DB_PATH)
+            populate(conn, args.history, seed=args.seed)
+            conn.close()
+        samples, elapsed, total_calls = asyncio.run(run_benchmark(
+            scenario['steps'], args.sessions, args.concurrency,
+            args.api_latency_ms, args.api_jitter_ms, args.seed, args.state
+        ))
+    finally:
+        db.get_connection = original_connection
+        db.DB_PATH = original_path
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rows = summarize(samples)
+    report = {
+        'version': REPORT_VERSION,
+        'suite': 'handlers',
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(),
+        'scenario': scenario.get('name'),
+        'sessions': args.sessions,
+        'concurrency': args.concurrency,
+        'api_latency_ms': args.api_latency_ms,
+        'api_jitter_ms': args.api_jitter_ms,
+        'history': args.history,
+        'state': args.state,
+        'elapsed_s': round(elapsed, 3),
+        'interactions': len(samples),
+        'throughput_per_s': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'api_calls_total': total_calls,
+        'results': rows,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for row in rows:
+        print(f"{row['step'][:40]:<40} n={row['count']:<5} err={row['errors']:<3} "
+              f"p50 {row['p50_ms']:>8.2f} мс  p99 {row['p99_ms']:>8.2f} мс  "
+              f"sql {row['db_statements']:>5}  api {row['api_calls']:>4}")
+    print(f"{len(samples)} взаимодействий за {elapsed:.2f} с "
+          f"({report['throughput_per_s']}/с), отчет: {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Стоимость отрисовки клавиатур по экранам
+
+Для каждого экрана сравниваются сборка разметки так, как это делалось до реестра
+handlers/keyboards.py (новые InlineKeyboardButton при каждом показе), и получение ее из
+реестра: готовая статическая разметка или разметка шаблона из кэша. Для шаблонов отдельно
+показан штамп без кэша (первый показ пари), для всех экранов — время с сериализацией в JSON,
+которую PTB выполняет перед отправкой. Код возврата 1 — разметка реестра отличается от прежней.
+
+Запуск:
+    python -m benchmarks.keyboard_bench --number 20000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from database import db
+from database.catalog import catalog
+from handlers import keyboards
+from models.catalog import KIND_PLAYER, KIND_BET_NAME
+from services.callbacks import encode
+from services.pricing import PERCENT_CHOICES
+
+
+BET_ID = 1234
+PLAYER_A, PLAYER_B = 'rapha', 'cYphER'
+ODDS_A, ODDS_B = '1.82', '2.22'
+
+
+def legacy_main_menu():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("➕ Создать пари", callback_data=encode('menu', 'create_bet')),
+         InlineKeyboardButton("📌 Актуальные пари", callback_data=encode('menu', 'active_bets'))],
+        [InlineKeyboardButton("🗓 Пари за сутки", callback_data=encode('menu', 'bets_24h')),
+         InlineKeyboardButton("📊 Статистика", callback_data=encode('menu', 'statistics'))],
+        [InlineKeyboardButton("♻️ Сброс статистики", callback_data=encode('menu', 'reset_stats'))],
+        [InlineKeyboardButton("🐕 Пнуть пса", callback_data=encode('menu', 'kick_dog'))],
+    ])
+
+
+def legacy_statistics():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("Сегодня", callback_data=encode('stats', 'today')),
+         InlineKeyboardButton("7 дней", callback_data=encode('stats', '7d'))],
+        [InlineKeyboardButton("30 дней", callback_data=encode('stats', '30d')),
+         InlineKeyboardButton("Все время", callback_data=encode('stats', 'all'))],
+        [InlineKeyboardButton("🔙 Главное меню", callback_data=encode('menu', 'back'))],
+    ])
+
+
+def legacy_bet_names():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(item.name, callback_data=encode('bn', item.id))] for item in catalog.items(KIND_BET_NAME)
+    ])
+
+
+def legacy_players(selected_player=None):
+    players = catalog.items(KIND_PLAYER)
+    keyboard = []
+    for i in range(0, len(players), 2):
+        row = []
+        for item in players[i:i + 2]:
+            label = f"✅ {item.name}" if item.name == selected_player else item.name
+            row.append(InlineKeyboardButton(label, callback_data=encode('pl', item.id)))
+        keyboard.append(row)
+    return InlineKeyboardMarkup(keyboard)
+
+
+def legacy_odds(selected_player=None):
+    labelA = f"✅ {PLAYER_A}" if selected_player == 'A' else PLAYER_A
+    labelB = f"✅ {PLAYER_B}" if selected_player == 'B' else PLAYER_B
+    keyboard = [[InlineKeyboardButton(labelA, callback_data=encode('op', BET_ID, 'A')),
+                 InlineKeyboardButton(labelB, callback_data=encode('op', BET_ID, 'B'))]]
+    for i in range(0, len(PERCENT_CHOICES), 5):
+        keyboard.append([InlineKeyboardButton(f"{pct}%", callback_data=encode('opct', BET_ID, pct))
+                         for pct in PERCENT_CHOICES[i:i + 5]])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def legacy_stakes():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("500 ₽", callback_data=encode('stake', BET_ID, 500)),
+         InlineKeyboardButton("1000 ₽", callback_data=encode('stake', BET_ID, 1000))],
+        [InlineKeyboardButton("1500 ₽", callback_data=encode('stake', BET_ID, 1500)),
+         InlineKeyboardButton("2000 ₽", callback_data=encode('stake', BET_ID, 2000))],
+    ])
+
+
+def legacy_open_bet():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"🟢 За {PLAYER_A} ({ODDS_A})", callback_data=encode('side', BET_ID, 'A'))],
+        [InlineKeyboardButton(f"🔵 За {PLAYER_B} ({ODDS_B})", callback_data=encode('side', BET_ID, 'B'))],
+        [InlineKeyboardButton("✏️ Изменить", callback_data=encode('edit', BET_ID)),
+         InlineKeyboardButton("🗑 Отменить", callback_data=encode('cancel', BET_ID))],
+    ])
+
+
+OPEN_BET_PARAMS = {'bet_id': BET_ID, 'playerA': PLAYER_A, 'playerB': PLAYER_B, 'oddsA': ODDS_A, 'oddsB': ODDS_B}
+
+# Экран -> (сборка как раньше, получение из реестра, штамп шаблона без кэша или None для статических)
+SCREENS = {
+    'Главное меню': (legacy_main_menu, lambda: keyboards.MAIN_MENU_KEYBOARD, None),
+    'Статистика': (legacy_statistics, lambda: keyboards.STATISTICS_KEYBOARD, None),
+    'Шаг 0: названия': (legacy_bet_names, keyboards.bet_name_keyboard, None),
+    'Шаг 1: игроки': (lambda: legacy_players('fog'), lambda: keyboards.player_keyboard('fog'), None),
+    'Шаг 2: проценты': (
+        lambda: legacy_odds('A'),
+        lambda: keyboards.odds_keyboard(BET_ID, PLAYER_A, PLAYER_B, 'A'),
+        lambda: InlineKeyboardMarkup(
+            keyboards.ODDS_PLAYERS_TEMPLATE._stamp(
+                {'bet_id': BET_ID, 'labelA': f"✅ {PLAYER_A}", 'labelB': PLAYER_B}).inline_keyboard
+            + keyboards.ODDS_PERCENT_TEMPLATE._stamp({'bet_id': BET_ID}).inline_keyboard
+        ),
+    ),
+    'Шаг 3: суммы': (
+        legacy_stakes,
+        lambda: keyboards.stake_keyboard(BET_ID),
+        lambda: keyboards.STAKE_TEMPLATE._stamp({'bet_id': BET_ID}),
+    ),
+    'Карточка пари': (
+        legacy_open_bet,
+        lambda: keyboards.OPEN_BET_TEMPLATE.render(**OPEN_BET_PARAMS),
+        lambda: keyboards.OPEN_BET_TEMPLATE._stamp(OPEN_BET_PARAMS),
+    ),
+}
+
+
+def _per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Стоимость отрисовки клавиатур по экранам')
+    parser.add_argument('--number', type=int, default=20000, help='Отрисовок каждого экрана в замере')
+    args = parser.parse_args(argv)
+
+    # Клавиатуры шагов 0 и 1 строятся по каталогу: начальный каталог во временной базе
+    workdir = tempfile.mkdtemp(prefix='betbot-keyboards-')
+    original_path = db.DB_PATH
+    db.DB_PATH = os.path.join(workdir, 'bench.db')
+    try:
+        db.init_db()
+        catalog.invalidate()
+        catalog.load()
+        return run_screens(args.number)
+    finally:
+        db.DB_PATH = original_path
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_screens(number: int) -> int:
+    status = 0
+    print(f"{'Экран':<20} {'было, мкс':>10} {'стало, мкс':>11} {'штамп, мкс':>11} {'было+JSON':>10} {'стало+JSON':>11}")
+    for screen, (legacy, registry, cold) in SCREENS.items():
+        if legacy().to_dict() != registry().to_dict() or (cold and cold().to_dict() != legacy().to_dict()):
+            print(f"{screen}: разметка реестра отличается от прежней", file=sys.stderr)
+            status = 1
+        before = _per_call_us(legacy, number)
+        after = _per_call_us(registry, number)
+        before_json = _per_call_us(lambda: json.dumps(legacy().to_dict()), number // 4 or 1)
+        after_json = _per_call_us(lambda: json.dumps(registry().to_dict()), number // 4 or 1)
+        stamp = f"{_per_call_us(cold, number):11.2f}" if cold else f"{'—':>11}"
+        print(f"{screen:<20} {before:10.2f} {after:11.2f} {stamp} {before_json:10.2f} {after_json:11.2f}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Стресс-тест блокировок пари: одновременные нажатия «Результат» по одним и тем же пари
+
+Каждое пари получает --clicks нажатий от обоих игроков одновременно (asyncio.gather поверх
+process_update, как при параллельной обработке обновлений). Проверяется, что каждое пари
+рассчитано ровно один раз (одно событие settled, две записи ledger), а по времени видно,
+что разные пари обрабатываются параллельно, а нажатия по одному пари — по очереди.
+
+Затем проверяется путь таймаута: по --timeout-bets пари блокировку держит «другой
+обработчик» дольше таймаута, и каждое нажатие «Результат» / «Отменить» / смена результата
+должно получить ровно один ответ — всплывающее «⏳» (повторный answerCallbackQuery фейковый
+API отклоняет, как Telegram), а пари — остаться нетронутым.
+
+Запуск:
+    python -m benchmarks.lock_bench --bets 200 --clicks 4 --api-latency-ms 20
+    python -m benchmarks.lock_bench --bets 1 --clicks 50 --api-latency-ms 20
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from database import db
+from database.tenants import tenants
+from database.users import users
+from database.catalog import catalog
+from benchmarks.db_bench import MAKERS, _insert_bet
+from benchmarks.fake_bot import FakeRequest, UpdateFactory
+from benchmarks.handler_bench import build_application
+from models.bet import STATUS_OPEN, STATUS_TAKEN, STATUS_FINISHED
+from models.bet_event import EVENT_SETTLED
+from services.callbacks import encode
+from state.base import set_backend
+from state.locks import LOCK_ACQUISITIONS, bet_locks
+from state.memory import InProcessBackend
+
+
+CHAT_ID = -100777
+
+
+async def run_stress(bet_ids, clicks: int, latency_ms: float, seed: int):
+    set_backend(InProcessBackend())
+    tenants.invalidate()
+    users.invalidate()
+    catalog.invalidate()
+    application = await build_application(FakeRequest(latency_ms=latency_ms, seed=seed))
+    factory = UpdateFactory(application.bot)
+
+    updates = []
+    for message_id, bet_id in enumerate(bet_ids, 1):
+        for click in range(clicks):
+            user_id, username = MAKERS[click % 2]
+            data = encode('result', bet_id, 'AB'[click % 2])
+            updates.append(factory.callback(CHAT_ID, message_id, factory.user(user_id, username), data))
+    random.Random(seed).shuffle(updates)
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(
+            *(application.process_update(update) for update in updates), return_exceptions=True
+        )
+    finally:
+        await application.shutdown()
+    elapsed = time.perf_counter() - started
+    errors = sum(isinstance(result, Exception) for result in results)
+    return elapsed, len(updates), errors
+
+
+async def run_timeouts(bet_ids, hold_s: float):
+    """Нажатия по пари, блокировку которых держат дольше таймаута: (нажатий, ответов «⏳», повторных ответов)"""
+    set_backend(InProcessBackend())
+    request = FakeRequest()
+    application = await build_application(request)
+    factory = UpdateFactory(application.bot)
+    user_id, username = MAKERS[0]
+    actions = [('result', 'A'), ('cancel',), ('chresult', 'B')]
+
+    updates = []
+    for message_id, bet_id in enumerate(bet_ids, 1):
+        action, *args = actions[message_id % len(actions)]
+        updates.append(factory.callback(CHAT_ID, message_id, factory.user(user_id, username), encode(action, bet_id, *args)))
+
+    holders_ready = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold_all():
+        async with contextlib.AsyncExitStack() as stack:
+            for bet_id in bet_ids:
+                await stack.enter_async_context(bet_locks.hold(bet_id))
+            holders_ready.set()
+            await release.wait()
+
+    timeout = bet_locks.timeout
+    bet_locks.timeout = hold_s / 2
+    holder = asyncio.create_task(hold_all())
+    try:
+        await holders_ready.wait()
+        await asyncio.gather(*(application.process_update(update) for update in updates))
+    finally:
+        release.set()
+        await holder
+        bet_locks.timeout = timeout
+        await application.shutdown()
+    answers = [call for call in request.calls if call.method == 'answerCallbackQuery']
+    busy = sum(1 for call in answers if str(call.params.get('text', '')).startswith('⏳'))
+    return len(updates), busy, request.duplicate_answers
+
+
+def check_invariants(bet_ids) -> int:
+    """Число пари, рассчитанных не ровно один раз"""
+    conn = sqlite3.connect(db.DB_PATH)
+    placeholders = ', '.join('?' * len(bet_ids))
+    settled = dict(conn.execute(
+        f"SELECT bet_id, COUNT(*) FROM bet_events WHERE type = ? AND bet_id IN ({placeholders}) GROUP BY bet_id",
+        (EVENT_SETTLED, *bet_ids)
+    ).fetchall())
+    ledger = dict(conn.execute(
+        f"SELECT bet_id, COUNT(*) FROM ledger WHERE bet_id IN ({placeholders}) GROUP BY bet_id", bet_ids
+    ).fetchall())
+    conn.close()
+    return sum(1 for bet_id in bet_ids if settled.get(bet_id) != 1 or ledger.get(bet_id) != 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Стресс-тест блокировок пари')
+    parser.add_argument('--bets', type=int, default=100, help='Пари, по которым нажимают одновременно')
+    parser.add_argument('--clicks', type=int, default=4, help='Одновременных нажатий на каждое пари')
+    parser.add_argument('--api-latency-ms', type=float, default=20.0, help='Задержка ответа Bot API')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timeout-bets', type=int, default=30, help='Пари для проверки таймаута блокировки')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='betbot-locks-')
+    original_path = db.DB_PATH
+    db.DB_PATH = os.path.join(workdir, 'bench.db')
+    try:
+        db.init_db()
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.row_factory = sqlite3.Row
+        bet_ids = [_insert_bet(conn, STATUS_TAKEN, 'A') for _ in range(args.bets)]
+        # Для таймаута: результат — у принятых, отмена — у открытых, смена результата — у завершенных
+        statuses = (STATUS_TAKEN, STATUS_OPEN, STATUS_FINISHED)
+        timeout_ids = [_insert_bet(conn, statuses[i % 3], 'A') for i in range(1, args.timeout_bets + 1)]
+        conn.close()
+
+        before = {result: LOCK_ACQUISITIONS.value('bet', result) for result in ('free', 'contended', 'timeout')}
+        elapsed, clicks, errors = asyncio.run(run_stress(bet_ids, args.clicks, args.api_latency_ms, args.seed))
+        broken = check_invariants(bet_ids)
+        snapshot = [db.get_bet(bet_id).to_dict() for bet_id in timeout_ids]
+        timeout_clicks, busy, duplicates = asyncio.run(run_timeouts(timeout_ids, hold_s=0.2))
+        touched = sum(db.get_bet(bet_id).to_dict() != before for bet_id, before in zip(timeout_ids, snapshot))
+    finally:
+        db.DB_PATH = original_path
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    counts = {result: int(LOCK_ACQUISITIONS.value('bet', result) - value) for result, value in before.items()}
+    print(f"{clicks} нажатий по {args.bets} пари за {elapsed:.2f} с ({clicks / elapsed:.0f}/с), ошибок {errors}")
+    print(f"Блокировки: свободно {counts['free']}, с ожиданием {counts['contended']}, "
+          f"не дождались {counts['timeout']}; осталось ключей {bet_locks.active}")
+    # Нижняя граница при полной сериализации одного пари: clicks ответов Bot API подряд
+    print(f"Нажатия одного пари по очереди: не меньше {args.clicks * args.api_latency_ms / 1000:.2f} с")
+    print(f"Пари, рассчитанных не ровно один раз: {broken}")
+    print(f"Таймаут блокировки: {timeout_clicks} нажатий, ответов «⏳» {busy}, повторных ответов {duplicates}, "
+          f"измененных пари {touched}")
+    timeout_broken = busy != timeout_clicks or duplicates or touched
+    return 1 if broken or errors or timeout_broken else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
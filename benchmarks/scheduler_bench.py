@@ -0,0 +1,154 @@
+"""
+Пропускная способность обработки обновлений при смешанном трафике
+
+Обновления кладутся в update_queue запущенного Application сразу пачкой, как их отдает
+getUpdates: визарды создания пари (текстом, пять сообщений подряд от одного пользователя —
+порядок обязателен) вперемешку с /start и экраном статистики от других пользователей.
+Для каждого UPDATE_WORKERS из --workers печатаются время, обновлений в секунду, задержка
+от постановки в очередь до конца обработки и число визардов, дошедших до публикации пари
+(при нарушении порядка визард ломается).
+
+Запуск:
+    python -m benchmarks.scheduler_bench --workers 1,8,32 --wizards 50 --readers 100 --api-latency-ms 30
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from telegram.ext import Application
+
+from database import db
+from database.tenants import tenants
+from database.users import users
+from database.catalog import catalog
+from benchmarks.db_bench import _percentile
+from benchmarks.fake_bot import FakeRequest, UpdateFactory, BOT_TOKEN
+from benchmarks.handler_bench import Session
+from services.scheduler import FairUpdateProcessor
+from state.base import set_backend
+from state.memory import InProcessBackend
+
+
+WIZARD_STEPS = [
+    {'actor': 'maker', 'command': '/create_match'},
+    {'actor': 'maker', 'text': 'Финал'},
+    {'actor': 'maker', 'text': 'rapha vs cYphER'},
+    {'actor': 'maker', 'text': 'rapha 55'},
+    {'actor': 'maker', 'text': '1500'},
+]
+READER_STEPS = [
+    {'actor': 'taker', 'command': '/start'},
+    {'actor': 'taker', 'click': 'stats_today'},
+]
+
+
+async def run_traffic(workers: int, wizards: int, readers: int, latency_ms: float, seed: int):
+    from bot import register_handlers
+
+    set_backend(InProcessBackend())
+    tenants.invalidate()
+    users.invalidate()
+    catalog.invalidate()
+    request = FakeRequest(latency_ms=latency_ms, seed=seed)
+    builder = Application.builder().token(BOT_TOKEN).request(request).updater(None)
+    if workers > 1:
+        builder = builder.concurrent_updates(FairUpdateProcessor(workers))
+    application = builder.build()
+    register_handlers(application)
+
+    # Время окончания обработки каждого обновления
+    finished = {}
+    process_update = application.process_update
+
+    async def timed_process_update(update):
+        try:
+            await process_update(update)
+        finally:
+            finished[update.update_id] = time.perf_counter()
+
+    application.process_update = timed_process_update
+
+    factory = UpdateFactory(application.bot)
+    streams = []
+    for index in range(wizards):
+        session = Session(index, application, request, factory)
+        streams.append([session.build_update(step)[1] for step in WIZARD_STEPS])
+    for index in range(readers):
+        session = Session(wizards + index, application, request, factory)
+        updates = []
+        for step in READER_STEPS:
+            if 'click' in step:
+                updates.append(factory.callback(session.chat_id, 1, session.actors['taker'], step['click']))
+            else:
+                updates.append(session.build_update(step)[1])
+        streams.append(updates)
+
+    # Перемешивание между пользователями с сохранением порядка внутри каждого
+    rng = random.Random(seed)
+    order = [index for index, stream in enumerate(streams) for _ in stream]
+    rng.shuffle(order)
+    positions = [0] * len(streams)
+    updates = []
+    for index in order:
+        updates.append(streams[index][positions[index]])
+        positions[index] += 1
+
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        for update in updates:
+            application.update_queue.put_nowait(update)
+        await application.update_queue.join()
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    latencies = [(finished[update.update_id] - started) * 1000 for update in updates if update.update_id in finished]
+    return elapsed, len(updates), latencies
+
+
+def count_published(wizards: int) -> int:
+    conn = sqlite3.connect(db.DB_PATH)
+    count = conn.execute("SELECT COUNT(*) FROM bets WHERE status = 'OPEN' AND stake = 1500").fetchone()[0]
+    conn.close()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Пропускная способность обработки обновлений')
+    parser.add_argument('--workers', default='1,8,32', help='Значения UPDATE_WORKERS через запятую')
+    parser.add_argument('--wizards', type=int, default=50, help='Пользователей, создающих пари')
+    parser.add_argument('--readers', type=int, default=100, help='Пользователей, открывающих меню')
+    parser.add_argument('--api-latency-ms', type=float, default=30.0, help='Задержка ответа Bot API')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    status = 0
+    for workers in (int(value) for value in args.workers.split(',')):
+        workdir = tempfile.mkdtemp(prefix='betbot-scheduler-')
+        original_path = db.DB_PATH
+        db.DB_PATH = os.path.join(workdir, 'bench.db')
+        try:
+            db.init_db()
+            elapsed, count, latencies = asyncio.run(run_traffic(
+                workers, args.wizards, args.readers, args.api_latency_ms, args.seed
+            ))
+            published = count_published(args.wizards)
+        finally:
+            db.DB_PATH = original_path
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"workers={workers:<4} {count} обновлений за {elapsed:6.2f} с ({count / elapsed:7.1f}/с)  "
+              f"p50 {_percentile(latencies, 50):8.1f} мс  p99 {_percentile(latencies, 99):8.1f} мс  "
+              f"визардов завершено {published}/{args.wizards}")
+        if published != args.wizards:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,73 +1,264 @@
 """
 Основной файл Telegram бота для пари между двумя игроками
 """
+import argparse
+import asyncio
 import logging
+import os
+import signal
+import sys
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, ChosenInlineResultHandler, InlineQueryHandler,
+    TypeHandler, filters, ContextTypes
+)
 from handlers.start import start_handler
+from handlers.admin import perf_handler, profile_handler, pair_handler, backup_handler, catalog_handler
+from handlers.export import export_handler
+from handlers.importer import import_handler, IMPORT_CAPTION_PATTERN
+from handlers.journal import undo_handler, audit_handler
+from handlers.inline import inline_query_handler, chosen_inline_result_handler
 from handlers.bet_handlers import (
     create_bet_handler,
     bet_wizard_handler,
-    callback_handler
+    callback_handler,
+    render_live_views
 )
 from database.db import init_db
-
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from database.users import users, track_user
+from database.catalog import catalog, catalog_reload_job
+from config import (
+    METRICS_HOST, METRICS_PORT, LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, PROFILE_DIR, WORKERS, UPDATE_WORKERS,
+    BACKUP_INTERVAL, REMINDER_INTERVAL, DIGEST_TIME, DIGEST_WEEKDAY, CATALOG_RELOAD_INTERVAL, STATE_BACKEND
 )
+from state.base import get_backend
+from services.jobs import jobs
+from services.live_cards import live_cards
+from services.lifecycle import Lifecycle
+from services.scheduler import FairUpdateProcessor
+from monitoring.instrumentation import instrument_application
+from monitoring.telegram_api import InstrumentedRequest
+from monitoring.http import MetricsServer
+from monitoring.log import setup_logging, parse_levels
+from monitoring.profiler import RuntimeProfiler, format_result
+from monitoring.startup import startup
+
 logger = logging.getLogger(__name__)
 
+# Длительность профилирования по сигналу SIGUSR1
+SIGNAL_PROFILE_SECONDS = 30
+
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик ошибок"""
-    logger.error(f"Exception while handling an update: {context.error}", exc_info=context.error)
+    logger.error("Exception while handling an update: %s", context.error, exc_info=context.error)
 
 
-async def post_init(application: Application) -> None:
-    """Инициализация после запуска бота"""
-    # Устанавливаем команды бота для меню
-    from telegram import BotCommand
-    commands = [
-        BotCommand("start", "Главное меню"),
-        BotCommand("create_match", "Создать пари"),
-    ]
+async def set_commands(application: Application, commands) -> None:
     await application.bot.set_my_commands(commands)
     logger.info("Команды бота установлены")
 
 
-def main():
-    """Главная функция для запуска бота"""
-    # Инициализация базы данных
-    init_db()
+async def post_init(application: Application) -> None:
+    """Инициализация после запуска бота"""
+    # Номер рабочего процесса при шардировании (None — единственный процесс)
+    worker = application.bot_data.get('worker')
     
-    # Получение токена из переменной окружения
-    import os
-    from dotenv import load_dotenv
+    # Устанавливаем команды бота для меню (один раз на весь бот); запрос к API идет
+    # в фоне и не задерживает начало приема обновлений
+    if not worker:
+        from telegram import BotCommand
+        commands = [
+            BotCommand("start", "Главное меню"),
+            BotCommand("create_match", "Создать пари"),
+            BotCommand("pair", "Пара игроков чата"),
+            BotCommand("export", "Выгрузка пари и ledger"),
+            BotCommand("import", "Импорт истории пари из файла"),
+            BotCommand("undo", "Отменить последнее действие"),
+            BotCommand("audit", "Журнал пари"),
+        ]
+        application.create_task(set_commands(application, commands))
     
-    load_dotenv()
-    TOKEN = os.getenv('BOT_TOKEN')
+    # Реестр пользователей и каталог загружаются заранее, а не на первом обновлении
+    users.load()
+    catalog.load()
     
-    if not TOKEN:
-        raise ValueError("BOT_TOKEN не найден! Создайте файл .env с BOT_TOKEN=your_token")
+    # Каталог перечитывается в каждом процессе: у каждого своя копия в памяти
+    if CATALOG_RELOAD_INTERVAL and application.job_queue:
+        application.job_queue.run_repeating(
+            catalog_reload_job, CATALOG_RELOAD_INTERVAL, first=CATALOG_RELOAD_INTERVAL, name='catalog_reload'
+        )
     
-    # Создание приложения
-    application = Application.builder().token(TOKEN).post_init(post_init).build()
+    # Резервные копии по расписанию (в одном процессе: база общая)
+    if not worker and BACKUP_INTERVAL and application.job_queue:
+        from services.backup import backup_job
+        application.job_queue.run_repeating(backup_job, BACKUP_INTERVAL, first=BACKUP_INTERVAL, name='backup')
+    
+    # Напоминания об активных пари и отмена по сроку (тоже в одном процессе)
+    if not worker and REMINDER_INTERVAL and application.job_queue:
+        from services.reminders import reminder_job
+        application.job_queue.run_repeating(reminder_job, REMINDER_INTERVAL, first=60, name='reminders')
+    
+    # Сводки в группы по местному времени (тоже в одном процессе)
+    if not worker and DIGEST_TIME and application.job_queue:
+        from datetime import datetime, time
+        from services.digest import daily_digest_job, weekly_digest_job
+        hour, minute = (int(part) for part in DIGEST_TIME.split(':'))
+        at = time(hour, minute, tzinfo=datetime.now().astimezone().tzinfo)
+        application.job_queue.run_daily(daily_digest_job, at, name='digest_daily')
+        if DIGEST_WEEKDAY >= 0:
+            application.job_queue.run_daily(weekly_digest_job, at, days=(DIGEST_WEEKDAY,), name='digest_weekly')
+    
+    # Эндпоинт метрик (у каждого рабочего процесса свой порт: METRICS_PORT + номер)
+    if METRICS_PORT:
+        server = MetricsServer(METRICS_HOST, METRICS_PORT + (worker or 0))
+        await server.start()
+        application.bot_data['metrics_server'] = server
+    
+    # kill -USR1 <pid> включает (или досрочно завершает) профилирование
+    profiler = application.bot_data.get('profiler')
+    if profiler and hasattr(signal, 'SIGUSR1'):
+        def on_signal():
+            result = profiler.toggle(SIGNAL_PROFILE_SECONDS)
+            if result:
+                logger.info("%s", format_result(result))
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, on_signal)
     
-    # Регистрация обработчиков
+    logger.info("Бот готов к обработке обновлений через %.2f с после старта процесса", startup.mark('ready'))
+
+
+async def post_shutdown(application: Application) -> None:
+    """Освобождение ресурсов при остановке бота"""
+    server = application.bot_data.pop('metrics_server', None)
+    if server:
+        await server.stop()
+    await jobs.shutdown()
+    catalog.flush()
+    await get_backend().close()
+
+
+def register_handlers(application: Application) -> None:
+    """Регистрация обработчиков (используется также бенчмарками)"""
     application.add_handler(CommandHandler("start", start_handler))
     application.add_handler(CommandHandler("create_match", create_bet_handler))  # Для совместимости
     application.add_handler(CallbackQueryHandler(callback_handler))
+    application.add_handler(InlineQueryHandler(inline_query_handler))
+    application.add_handler(ChosenInlineResultHandler(chosen_inline_result_handler))
+    application.add_handler(CommandHandler("perf", perf_handler))
+    application.add_handler(CommandHandler("profile", profile_handler))
+    application.add_handler(CommandHandler("backup", backup_handler))
+    application.add_handler(CommandHandler("pair", pair_handler))
+    application.add_handler(CommandHandler("catalog", catalog_handler))
+    application.add_handler(CommandHandler("export", export_handler))
+    application.add_handler(CommandHandler("import", import_handler))
+    application.add_handler(CommandHandler("undo", undo_handler))
+    application.add_handler(CommandHandler("audit", audit_handler))
+    # Файл с подписью /import (подпись документа CommandHandler не видит)
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(IMPORT_CAPTION_PATTERN), import_handler
+    ))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bet_wizard_handler))
     
     # Обработчик ошибок
     application.add_error_handler(error_handler)
     
-    # Запуск бота
+    # Живые карточки перерисовываются теми же шаблонами, что и карточки обработчиков
+    live_cards.set_renderer(render_live_views)
+    
+    # Таймеры и счетчики на каждом обработчике
+    instrument_application(application)
+    
+    # Учет пользователей до всех обработчиков; добавляется после instrument_application,
+    # чтобы не давать отдельного маршрута и строки access-лога на каждое обновление
+    application.add_handler(TypeHandler(Update, track_user), group=-1)
+    
+    # Профилировщик по запросу (пока выключен, не добавляет работы)
+    application.bot_data['profiler'] = RuntimeProfiler(application, PROFILE_DIR)
+
+
+def build_application(token: str, updater: bool = True) -> Application:
+    """Приложение с обработчиками; без updater — для рабочего процесса, которому обновления раздает мастер"""
+    builder = (
+        Application.builder()
+        .token(token)
+        .request(InstrumentedRequest())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if not updater:
+        builder = builder.updater(None)
+    # Разные пользователи — параллельно, один пользователь — по порядку
+    if UPDATE_WORKERS > 1:
+        builder = builder.concurrent_updates(FairUpdateProcessor(UPDATE_WORKERS))
+    application = builder.build()
+    register_handlers(application)
+    return application
+
+
+def check_startup(application: Application, timeout: float) -> int:
+    """--check-startup: запуск до первого обновления (или timeout секунд), отчет по этапам"""
+    startup.watch_first_update(application, stop=True)
+    application.job_queue.run_once(
+        lambda context: context.application.stop_running(), timeout, name='check_startup'
+    )
+    Lifecycle(application).run()
+    
+    print(startup.report())
+    if startup.elapsed('first_update') is None:
+        print(f"Обновлений за {timeout:.0f} с не было: отправьте боту сообщение во время проверки")
+    over = startup.over_budget()
+    for phase, elapsed in over.items():
+        print(f"Превышен бюджет этапа {phase}: {elapsed:.3f} с")
+    return 1 if over else 0
+
+
+def main(argv=None):
+    """Главная функция для запуска бота"""
+    parser = argparse.ArgumentParser(description="Telegram-бот для пари")
+    parser.add_argument('--check-startup', action='store_true',
+                        help='Запустить бота до первого обновления и вывести время этапов запуска')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='Сколько ждать первого обновления в --check-startup, секунд')
+    args = parser.parse_args(argv)
+    startup.mark('imports')
+    
+    # Настройка логирования (запись в поток выполняется фоновым слушателем)
+    setup_logging(LOG_LEVEL, parse_levels(LOG_LEVELS), LOG_FORMAT)
+    
+    # Токен проверяется до работы с базой (.env уже загружен в config.py)
+    TOKEN = os.getenv('BOT_TOKEN')
+    
+    if not TOKEN:
+        raise ValueError("BOT_TOKEN не найден! Создайте файл .env с BOT_TOKEN=your_token")
+    
+    # Рабочие процессы видят общие блокировки, карточки и данные кнопок только через сетевое
+    # хранилище: inline-обновления раздаются по пользователю, а не по чату пари
+    if WORKERS > 1 and not STATE_BACKEND.startswith('resp://'):
+        raise ValueError("WORKERS больше 1 требует общего хранилища: STATE_BACKEND=resp://host:port")
+    
+    # Инициализация базы данных (при актуальной схеме — без миграций)
+    init_db()
+    startup.mark('init_db')
+    
+    # Несколько рабочих процессов: обновления раздаются по chat_id
+    if WORKERS > 1:
+        from services.sharding import ShardMaster
+        logger.info("Бот запущен в режиме шардирования (%d процессов)", WORKERS)
+        ShardMaster(TOKEN, WORKERS).run()
+        return
+    
+    # Создание приложения
+    application = build_application(TOKEN)
+    startup.mark('application')
+    
+    if args.check_startup:
+        return check_startup(application, args.timeout)
+    
+    # Запуск бота; по SIGTERM принятые обновления дорабатываются, состояние сохраняется
+    startup.watch_first_update(application)
     logger.info("Бот запущен!")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    Lifecycle(application).run()
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -12,9 +12,113 @@ load_dotenv()
 PLAYER_INZAAA_USERNAME = "Inzaaa"
 PLAYER_TROOLZ_USERNAME = "TROOLZ"
 
+# Каталог проекта: относительные пути ниже отсчитываются от него, а не от текущего каталога
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# База данных SQLite (общая для всех рабочих процессов)
+DB_PATH = os.path.join(BASE_DIR, os.getenv('DB_PATH', 'bets.db'))
+# Ожидание блокировки записи другим процессом, мс
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+# Хранилище сессий, кэшей и блокировок: memory:// или resp://host:port[/prefix]
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory://')
+# Время жизни незавершенной сессии визарда, секунд
+SESSION_TTL = int(os.getenv('SESSION_TTL', '86400'))
+
+# Плавная остановка: сколько секунд дорабатывать принятые обновления и очередь исходящих
+# (TimeoutStopSec в systemd должен быть больше) и как часто сохранять сессии и смещение getUpdates
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '20'))
+STATE_FLUSH_INTERVAL = int(os.getenv('STATE_FLUSH_INTERVAL', '60'))
+
+# Обновлений, обрабатываемых одновременно в одном процессе (обновления одного пользователя —
+# всегда по очереди); 1 — строго последовательная обработка
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '8'))
+
+# Число рабочих процессов; больше 1 — обновления распределяются по chat_id
+WORKERS = int(os.getenv('WORKERS', '1'))
+
+# Процессы пула фоновых заданий (отчеты за длинные периоды) и время жизни их результатов, секунд
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_CACHE_TTL = int(os.getenv('JOB_CACHE_TTL', '3600'))
+
+# Каталог временных файлов /export и /import (файл удаляется после отправки или импорта)
+EXPORT_DIR = os.path.join(BASE_DIR, os.getenv('EXPORT_DIR', 'exports'))
+
+# Резервные копии базы: каталог, период снятия по расписанию (секунд, 0 — выключено),
+# сколько последних копий хранить и сжимать ли их gzip
+BACKUP_DIR = os.path.join(BASE_DIR, os.getenv('BACKUP_DIR', 'backups'))
+BACKUP_INTERVAL = int(os.getenv('BACKUP_INTERVAL', '21600'))
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+BACKUP_COMPRESS = os.getenv('BACKUP_COMPRESS', 'true').lower() == 'true'
+
+# Напоминания об активных пари: период проверки (секунд, 0 — выключено), через сколько часов
+# после создания напомнить о непринятом (OPEN) и нерассчитанном (TAKEN) пари и через сколько
+# отменить его по сроку (0 — не отменять)
+REMINDER_INTERVAL = int(os.getenv('REMINDER_INTERVAL', '900'))
+OPEN_REMIND_HOURS = float(os.getenv('OPEN_REMIND_HOURS', '12'))
+TAKEN_REMIND_HOURS = float(os.getenv('TAKEN_REMIND_HOURS', '24'))
+OPEN_EXPIRE_HOURS = float(os.getenv('OPEN_EXPIRE_HOURS', '72'))
+# Принятые пари (ставки уже сделаны) по сроку не отменяются, пока это не включено явно:
+# отмену по сроку нельзя вернуть через /undo
+TAKEN_EXPIRE_HOURS = float(os.getenv('TAKEN_EXPIRE_HOURS', '0'))
+
+# Сводки в группы: время ежедневной (ЧЧ:ММ по местному времени, пусто — выключено), день
+# еженедельной (0 — воскресенье, ... 6 — суббота, как в JobQueue; -1 — выключено) и время
+# жизни снимков статистики, которые сводки оставляют для экранов «Статистика», секунд
+DIGEST_TIME = os.getenv('DIGEST_TIME', '23:55')
+DIGEST_WEEKDAY = int(os.getenv('DIGEST_WEEKDAY', '0'))
+DIGEST_SNAPSHOT_TTL = int(os.getenv('DIGEST_SNAPSHOT_TTL', '3600'))
+
+# Коэффициенты: маржа (овер-раунд), процентов сверх 100% суммарной вероятности (0 — честные
+# коэффициенты 100 / процент), и формат показа: decimal (1.82), fractional (9/11) или american (-122)
+ODDS_MARGIN = float(os.getenv('ODDS_MARGIN', '0'))
+ODDS_FORMAT = os.getenv('ODDS_FORMAT', 'decimal').lower()
+
+# Как часто перечитывать каталог игроков и названий пари (правки /catalog из других процессов,
+# порядок кнопок по частоте выбора), секунд; 0 — только при запуске и после /catalog
+CATALOG_RELOAD_INTERVAL = int(os.getenv('CATALOG_RELOAD_INTERVAL', '300'))
+
+# Данные кнопок длиннее 64 байт хранятся на сервере, в кнопке — только ссылка: сколько последних
+# записей держать в памяти процесса и сколько секунд хранить в хранилище состояния
+CALLBACK_PAYLOAD_CACHE = int(os.getenv('CALLBACK_PAYLOAD_CACHE', '1024'))
+CALLBACK_PAYLOAD_TTL = int(os.getenv('CALLBACK_PAYLOAD_TTL', str(30 * 86400)))
+
+# Inline-режим (@bot в любом чате): сколько секунд Telegram показывает пользователю прежний ответ
+# без запроса к боту и сколько хранится список пари пользователя в хранилище состояния
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '10'))
+INLINE_SNAPSHOT_TTL = int(os.getenv('INLINE_SNAPSHOT_TTL', '600'))
+
+# Живые карточки: сколько секунд помнить сообщения, показывающие пари (больше срока жизни
+# активного пари), и сколько последних сообщений обновлять для одного пари
+LIVE_CARD_TTL = int(os.getenv('LIVE_CARD_TTL', str(8 * 86400)))
+LIVE_CARD_MAX_VIEWS = int(os.getenv('LIVE_CARD_MAX_VIEWS', '10'))
+
 # Тестовый режим - разрешает одному пользователю быть и maker, и taker
 TEST_MODE = os.getenv('TEST_MODE', 'false').lower() == 'true'
 
+# Администраторы (служебные команды /perf и т.п.), через запятую
+ADMIN_USERNAMES = [
+    name.strip().lstrip('@')
+    for name in os.getenv('ADMIN_USERNAMES', f"{PLAYER_INZAAA_USERNAME},{PLAYER_TROOLZ_USERNAME}").split(',')
+    if name.strip()
+]
+
+# Множества в нижнем регистре для проверок за O(1)
+_DEFAULT_PLAYER_KEYS = frozenset((PLAYER_INZAAA_USERNAME.lower(), PLAYER_TROOLZ_USERNAME.lower()))
+_ADMIN_KEYS = frozenset(name.lower() for name in ADMIN_USERNAMES)
+
+# Эндпоинт метрик Prometheus (0 — выключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Каталог для профилей cProfile (/profile, сигнал SIGUSR1)
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# Логирование: общий уровень, уровни по модулям и формат (json или text)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.getenv('LOG_LEVELS', 'httpx=WARNING,betbot.access=INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+
 # Статусы пари
 STATUS_DRAFT = "DRAFT"
 STATUS_OPEN = "OPEN"
@@ -23,14 +127,17 @@ STATUS_FINISHED = "FINISHED"
 STATUS_CANCELED = "CANCELED"
 
 
-def is_allowed_player(username: str) -> bool:
-    """Проверяет, является ли пользователь одним из разрешенных игроков"""
-    username_lower = username.lower() if username else ""
-    return username_lower in [PLAYER_INZAAA_USERNAME.lower(), PLAYER_TROOLZ_USERNAME.lower()]
+def is_allowed_player(username: str, tenant=None) -> bool:
+    """Проверяет, является ли пользователь одним из игроков пары (по умолчанию — фиксированной)"""
+    if tenant is not None:
+        return tenant.is_player(username)
+    return bool(username) and username.lower() in _DEFAULT_PLAYER_KEYS
 
 
-def get_other_player(username: str) -> Optional[str]:
-    """Возвращает username второго игрока"""
+def get_other_player(username: str, tenant=None) -> Optional[str]:
+    """Возвращает username второго игрока пары"""
+    if tenant is not None:
+        return tenant.other_player(username)
     username_lower = username.lower() if username else ""
     if username_lower == PLAYER_INZAAA_USERNAME.lower():
         return PLAYER_TROOLZ_USERNAME
@@ -47,3 +154,8 @@ def get_taker_user_id(maker_username: str, inzaaa_id: int, troolz_id: int) -> Op
     elif maker_lower == PLAYER_TROOLZ_USERNAME.lower():
         return inzaaa_id
     return None
+
+
+def is_admin(username: str) -> bool:
+    """Проверяет, есть ли у пользователя доступ к служебным командам"""
+    return bool(username) and username.lower() in _ADMIN_KEYS
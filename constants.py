@@ -2,12 +2,13 @@
 Константы для бота
 """
 
-# Список игроков для быстрого выбора
+# Начальный список игроков для быстрого выбора: при создании базы переносится в таблицу
+# catalog, дальше список ведется командой /catalog (database/catalog.py)
 PLAYERS = [
     "ash", "AGENT", "cYphER", "rapha", "pavel", "k1llsen", "Spart1e",
     "baksteen", "prox1mo", "SV", "swex", "cherepoff", "RAISY", "fog",
     "fire_bot", "ARSENY"
 ]
 
-# Готовые названия пари
+# Начальные готовые названия пари (тоже переносятся в catalog)
 BET_NAMES = ["BO1", "BO3", "BO5"]
@@ -0,0 +1,165 @@
+"""
+Каталог игроков и названий пари в памяти: порядок по частоте выбора, поиск, ID -> имя
+
+Таблица catalog читается целиком (она небольшая) при запуске, после изменения командой
+/catalog и раз в CATALOG_RELOAD_INTERVAL секунд — так правки из другого процесса и накопленная
+частота выбора доходят до кнопок без перезапуска. Между перечитываниями порядок кнопок не
+меняется, даже если частота уже изменилась: клавиатура не прыгает под пальцем. Выборы
+копятся в памяти и записываются в базу перед перечитыванием и при остановке, а не при
+создании каждого пари.
+"""
+import difflib
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+from database.db import get_catalog, save_catalog_item, deactivate_catalog_item, add_catalog_uses
+from models.catalog import CatalogItem, CATALOG_KINDS, KIND_PLAYER, KIND_BET_NAME
+
+
+# Порог похожести для исправления опечаток (difflib.SequenceMatcher.ratio)
+FUZZY_CUTOFF = 0.75
+# Сколько вариантов показывать в результатах поиска
+SEARCH_LIMIT = 8
+
+
+class CatalogRegistry:
+    """Элементы каталога по ID (все) и по имени без учета регистра (в списке)
+
+    version меняется, только когда меняется видимый список (состав или порядок), — по ней
+    handlers/keyboards.py пересобирает готовые клавиатуры.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[int, CatalogItem] = {}
+        self._by_key: Dict[Tuple[str, str], CatalogItem] = {}
+        self._ordered: Dict[str, Tuple[CatalogItem, ...]] = {kind: () for kind in CATALOG_KINDS}
+        self._keys: Dict[str, List[str]] = {kind: [] for kind in CATALOG_KINDS}
+        # ID -> выборы, еще не записанные в базу
+        self._pending: Dict[int, int] = {}
+        self.version = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Записать накопленные выборы и перечитать каталог из базы"""
+        self.flush()
+        items = get_catalog()
+        by_id = {item.id: item for item in items}
+        by_key = {(item.kind, item.name_key): item for item in items if item.active}
+        ordered = {
+            kind: tuple(sorted(
+                (item for item in items if item.kind == kind and item.active),
+                key=lambda item: (-item.uses, item.position)
+            ))
+            for kind in CATALOG_KINDS
+        }
+        with self._lock:
+            changed = any(
+                [(item.id, item.name) for item in ordered[kind]] !=
+                [(item.id, item.name) for item in self._ordered[kind]]
+                for kind in CATALOG_KINDS
+            )
+            self._by_id = by_id
+            self._by_key = by_key
+            self._ordered = ordered
+            self._keys = {kind: [item.name_key for item in ordered[kind]] for kind in CATALOG_KINDS}
+            if changed or not self._loaded:
+                self.version += 1
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def items(self, kind: str) -> Tuple[CatalogItem, ...]:
+        """Список для кнопок: сначала чаще выбираемые"""
+        self._ensure_loaded()
+        return self._ordered[kind]
+
+    def get(self, item_id: int) -> Optional[CatalogItem]:
+        """Элемент по ID за O(1), включая удаленные из списка"""
+        self._ensure_loaded()
+        return self._by_id.get(item_id)
+
+    def find(self, kind: str, name: Optional[str]) -> Optional[CatalogItem]:
+        """Элемент списка по имени без учета регистра"""
+        if not name:
+            return None
+        self._ensure_loaded()
+        return self._by_key.get((kind, name.lower()))
+
+    def search(self, kind: str, text: str, limit: int = SEARCH_LIMIT) -> List[CatalogItem]:
+        """Элементы, чье имя начинается с text, затем похожие на text (опечатки)"""
+        key = text.strip().lower()
+        if not key:
+            return []
+        items = self.items(kind)
+        found = [item for item in items if item.name_key.startswith(key)]
+        if len(found) < limit:
+            seen = {item.id for item in found}
+            close = difflib.get_close_matches(key, self._keys[kind], n=limit, cutoff=FUZZY_CUTOFF)
+            found += [item for item in (self._by_key[(kind, name)] for name in close) if item.id not in seen]
+        return found[:limit]
+
+    def resolve(self, kind: str, text: str) -> str:
+        """Имя из списка для введенного текста (без учета регистра), иначе сам текст
+
+        Похожие имена (начало имени, опечатки) не подставляются: новое имя, близкое к
+        имеющемуся ("swix" при "swex"), остается как введено, а похожие предлагает search().
+        """
+        text = text.strip()
+        item = self.find(kind, text)
+        return item.name if item is not None else text
+
+    def name_for(self, kind: str, ref: Union[int, str]) -> Optional[str]:
+        """Имя по полю кнопки каталога: ID элемента или само имя (кнопки, отправленные до каталога)
+
+        None — элемента с таким ID нет.
+        """
+        if isinstance(ref, str):
+            return ref
+        item = self.get(ref)
+        return item.name if item is not None and item.kind == kind else None
+
+    def record_bet(self, bet_name: Optional[str], playerA: str, playerB: str):
+        """Учет выбора при создании пари (порядок кнопок изменится при следующем перечитывании)"""
+        chosen = [self.find(KIND_BET_NAME, bet_name), self.find(KIND_PLAYER, playerA), self.find(KIND_PLAYER, playerB)]
+        with self._lock:
+            for item in chosen:
+                if item is not None:
+                    item.uses += 1
+                    self._pending[item.id] = self._pending.get(item.id, 0) + 1
+
+    def flush(self):
+        """Записать накопленные выборы в базу"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        add_catalog_uses(pending)
+
+    def add(self, kind: str, name: str) -> CatalogItem:
+        item = save_catalog_item(kind, name)
+        self.load()
+        return item
+
+    def remove(self, kind: str, name: str) -> bool:
+        removed = deactivate_catalog_item(kind, name)
+        if removed:
+            self.load()
+        return removed
+
+    def invalidate(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_key.clear()
+            self._ordered = {kind: () for kind in CATALOG_KINDS}
+            self._keys = {kind: [] for kind in CATALOG_KINDS}
+            self._pending.clear()
+            self._loaded = False
+
+
+catalog = CatalogRegistry()
+
+
+async def catalog_reload_job(context):
+    """Задача JobQueue: перечитать каталог (правки других процессов и частота выбора)"""
+    catalog.load()
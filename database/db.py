@@ -1,27 +1,61 @@
 """
 Модуль для работы с базой данных SQLite
 """
+import json
+import logging
 import sqlite3
-from typing import List, Optional, Tuple
-from models.bet import Bet, LedgerEntry
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from models.bet import Bet, LedgerEntry, STATUS_FINISHED
+from models.bet_event import (
+    BetEvent, BET_FIELDS, UNDOABLE_EVENTS, EVENT_CREATED, EVENT_NAMED, EVENT_ODDS_SET, EVENT_STAKE_SET,
+    EVENT_TAKER_SET, EVENT_TAKEN, EVENT_SETTLED, EVENT_RESULT_CHANGED, EVENT_CANCELED, EVENT_EXPIRED, EVENT_UNDONE,
+    EVENT_LEDGER_RESET, effective_events, ledger_cleared, project
+)
+from models.catalog import CatalogItem, KIND_PLAYER, KIND_BET_NAME
+from models.tenant import Tenant, DEFAULT_TENANT_ID
+from models.user import User
 from datetime import datetime, timedelta
+from monitoring.instrumentation import db_timed, trace_statement
+from config import DB_PATH, SQLITE_BUSY_TIMEOUT_MS, TEST_MODE, PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME
+from constants import PLAYERS, BET_NAMES
 
 
-DB_PATH = 'bets.db'
+logger = logging.getLogger(__name__)
+
+# Версия схемы (PRAGMA user_version): увеличивается при каждом изменении таблиц, миграций
+# или индексов в init_db, иначе существующие базы пропустят миграцию
+SCHEMA_VERSION = 4
 
 
 def get_connection():
     """Получение соединения с базой данных"""
-    conn = sqlite3.connect(DB_PATH)
+    # timeout — busy timeout SQLite: запись другим процессом ожидается, а не падает с "database is locked"
+    conn = sqlite3.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    # В режиме WAL коммит не ждет fsync (он выполняется при checkpoint); целостность сохраняется
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.set_trace_callback(trace_statement)
     return conn
 
 
+@db_timed
 def init_db():
     """Инициализация базы данных"""
     conn = get_connection()
     cursor = conn.cursor()
     
+    # Быстрый старт: схема уже в актуальной версии — таблицы, миграции и индексы не проверяем
+    cursor.execute('PRAGMA user_version')
+    if cursor.fetchone()[0] == SCHEMA_VERSION:
+        _sync_default_tenant(cursor)
+        conn.commit()
+        conn.close()
+        logger.info("База данных готова (схема %d)", SCHEMA_VERSION)
+        return
+    
+    # WAL: читатели не блокируют писателя, несколько процессов работают с одним файлом
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Таблица пари
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS bets (
@@ -51,7 +85,7 @@ def init_db():
     columns = [column[1] for column in cursor.fetchall()]
     if 'bet_name' not in columns:
         cursor.execute('ALTER TABLE bets ADD COLUMN bet_name TEXT')
-        print("Добавлена колонка bet_name в таблицу bets")
+        logger.info("Добавлена колонка bet_name в таблицу bets")
     
     # Таблица ledger для учета балансов
     cursor.execute('''
@@ -66,18 +100,204 @@ def init_db():
         )
     ''')
     
+    # Таблица пар игроков (тенантов): чат -> пара
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tenants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER UNIQUE,
+            title TEXT,
+            player1_username TEXT NOT NULL,
+            player2_username TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    
+    _sync_default_tenant(cursor)
+    
+    # Миграция: привязка пари и ledger к паре игроков
+    for table in ('bets', 'ledger'):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if 'tenant_id' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN tenant_id INTEGER NOT NULL DEFAULT {DEFAULT_TENANT_ID}')
+            logger.info("Добавлена колонка tenant_id в таблицу %s", table)
+    
+    # Миграция: чат пари и время напоминания о нем (services/reminders.py)
+    cursor.execute("PRAGMA table_info(bets)")
+    columns = [column[1] for column in cursor.fetchall()]
+    for column in ('chat_id INTEGER', 'reminded_at TEXT'):
+        if column.split()[0] not in columns:
+            cursor.execute(f'ALTER TABLE bets ADD COLUMN {column}')
+            logger.info("Добавлена колонка %s в таблицу bets", column.split()[0])
+    
+    # Таблица пользователей: user_id -> текущий username
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            username_lower TEXT,
+            first_name TEXT,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users(username_lower)')
+    
+    # Миграция: пользователи, известные по истории, до первого обновления от них
+    cursor.execute('SELECT 1 FROM users LIMIT 1')
+    if cursor.fetchone() is None:
+        _backfill_users(cursor)
+    
+    # Журнал событий пари: только добавление, пишется в одной транзакции с изменением пари
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bet_events'")
+    events_exist = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bet_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bet_id INTEGER NOT NULL,
+            tenant_id INTEGER NOT NULL DEFAULT 1,
+            type TEXT NOT NULL,
+            data TEXT,
+            user_id INTEGER,
+            ref_event_id INTEGER,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (bet_id) REFERENCES bets(id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bet_events_bet ON bet_events(bet_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bet_events_user ON bet_events(user_id, id)')
+    if not events_exist:
+        _backfill_bet_events(cursor)
+    
+    # Состояние процесса бота между перезапусками: смещение getUpdates, сессии, необработанные обновления
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    
+    # Каталог игроков и названий пари для кнопок визарда; при создании заполняется из constants.py
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'catalog'")
+    catalog_exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            name_lower TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            uses INTEGER NOT NULL DEFAULT 0,
+            active INTEGER NOT NULL DEFAULT 1,
+            updated_at TEXT NOT NULL,
+            UNIQUE (kind, name_lower)
+        )
+    ''')
+    if not catalog_exists:
+        _seed_catalog(cursor)
+    
     # Добавляем индексы для быстрого поиска
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bets_status ON bets(status)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bets_maker ON bets(maker_user_id)')
+    # (status, created_at): активные пари по возрасту для напоминаний и отмены по сроку
+    cursor.execute('DROP INDEX IF EXISTS idx_bets_status')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bets_status_created ON bets(status, created_at)')
+    # (maker_user_id, status) и (taker_username, status): активные пари пользователя для inline-режима
+    cursor.execute('DROP INDEX IF EXISTS idx_bets_maker')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bets_maker_status ON bets(maker_user_id, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bets_taker_status ON bets(taker_username COLLATE NOCASE, status)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_bets_taker ON bets(taker_user_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_ledger_user ON ledger(user_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_ledger_created ON ledger(created_at)')
+    # Индексы в разрезе пары: выборки одной пары не зависят от размера остальных
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bets_tenant_status ON bets(tenant_id, status, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bets_tenant_finished ON bets(tenant_id, status, finished_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ledger_tenant_user ON ledger(tenant_id, user_id, created_at)')
     
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
     conn.commit()
     conn.close()
-    print("База данных инициализирована")
+    logger.info("База данных инициализирована (схема %d)", SCHEMA_VERSION)
 
 
+def _sync_default_tenant(cursor):
+    """Пара по умолчанию всегда совпадает с фиксированными игроками из config.py"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO tenants (id, chat_id, title, player1_username, player2_username, created_at)
+        VALUES (?, NULL, 'default', ?, ?, ?)
+    ''', (DEFAULT_TENANT_ID, PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME, datetime.now().isoformat()))
+    cursor.execute(
+        'UPDATE tenants SET player1_username = ?, player2_username = ? WHERE id = ?',
+        (PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME, DEFAULT_TENANT_ID)
+    )
+
+
+def _seed_catalog(cursor):
+    """Начальный каталог: игроки и названия пари из constants.py в исходном порядке"""
+    now = datetime.now().isoformat()
+    for kind, names in ((KIND_PLAYER, PLAYERS), (KIND_BET_NAME, BET_NAMES)):
+        cursor.executemany('''
+            INSERT OR IGNORE INTO catalog (kind, name, name_lower, position, updated_at) VALUES (?, ?, ?, ?, ?)
+        ''', [(kind, name, name.lower(), position, now) for position, name in enumerate(names)])
+    logger.info("Каталог заполнен: %d игроков, %d названий пари", len(PLAYERS), len(BET_NAMES))
+
+
+def _backfill_bet_events(cursor, first_id: int = 1):
+    """Журнал для пари, созданных до его появления (с ID от first_id): одно событие created со всеми полями"""
+    fields = ', '.join(f"'{column}', {column}" for column in BET_FIELDS)
+    cursor.execute(f'''
+        INSERT INTO bet_events (bet_id, tenant_id, type, data, user_id, created_at)
+        SELECT id, tenant_id, '{EVENT_CREATED}', json_object({fields}), maker_user_id, created_at
+        FROM bets WHERE id >= ? ORDER BY id
+    ''', (first_id,))
+    if cursor.rowcount > 0:
+        logger.info("Журнал событий заполнен по текущему состоянию: %d пари", cursor.rowcount)
+
+
+def _bet_snapshot(bet: Bet) -> dict:
+    """Все поля пари для события created"""
+    data = bet.to_dict()
+    return {field: data[field] for field in BET_FIELDS}
+
+
+def _append_event(cursor, bet_id: int, event_type: str, data: dict, user_id: Optional[int] = None,
+                  ref_event_id: Optional[int] = None):
+    """Запись события в журнал (в транзакции вызывающей функции; пара берется из bets)"""
+    cursor.execute('''
+        INSERT INTO bet_events (bet_id, tenant_id, type, data, user_id, ref_event_id, created_at)
+        SELECT id, tenant_id, ?, ?, ?, ?, ? FROM bets WHERE id = ?
+    ''', (event_type, json.dumps(data, ensure_ascii=False), user_id, ref_event_id,
+          datetime.now().isoformat(), bet_id))
+
+
+def _backfill_users(cursor):
+    """Заполнение users по ledger и bets: последний username каждого user_id"""
+    # При MAX() в агрегате SQLite берет остальные колонки из строки с максимумом
+    cursor.execute('''
+        INSERT INTO users (user_id, username, username_lower, first_name, first_seen, last_seen)
+        SELECT user_id, username, LOWER(username), NULL, MIN(created_at), MAX(created_at)
+        FROM (
+            SELECT user_id, username, created_at FROM ledger
+            UNION ALL
+            SELECT maker_user_id, maker_username, created_at FROM bets
+            UNION ALL
+            SELECT taker_user_id, taker_username, created_at FROM bets WHERE taker_user_id IS NOT NULL
+        )
+        GROUP BY user_id
+    ''')
+    if cursor.rowcount <= 0:
+        return
+    logger.info("Таблица users заполнена по истории: %d пользователей", cursor.rowcount)
+    # Username мог перейти к другому пользователю: остается у последнего замеченного
+    cursor.execute('''
+        UPDATE users SET username = NULL, username_lower = NULL
+        WHERE EXISTS (
+            SELECT 1 FROM users AS newer
+            WHERE newer.username_lower = users.username_lower
+              AND newer.user_id != users.user_id AND newer.last_seen > users.last_seen
+        )
+    ''')
+
+
+@db_timed
 def create_bet(bet: Bet) -> int:
     """Создание нового пари"""
     conn = get_connection()
@@ -86,57 +306,67 @@ def create_bet(bet: Bet) -> int:
     cursor.execute('''
         INSERT INTO bets 
         (maker_user_id, maker_username, taker_user_id, taker_username, bet_name, playerA_name, playerB_name,
-         oddsA, oddsB, stake, status, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+         oddsA, oddsB, stake, status, created_at, tenant_id, chat_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         bet.maker_user_id, bet.maker_username, bet.taker_user_id, bet.taker_username, bet.bet_name,
         bet.playerA_name, bet.playerB_name, bet.oddsA, bet.oddsB, bet.stake,
-        bet.status, bet.created_at.isoformat()
+        bet.status, bet.created_at.isoformat(), bet.tenant_id, bet.chat_id
     ))
     
     bet_id = cursor.lastrowid
+    _append_event(cursor, bet_id, EVENT_CREATED, _bet_snapshot(bet), bet.maker_user_id)
     conn.commit()
     conn.close()
     return bet_id
 
 
+@db_timed
 def update_bet_step2(bet_id: int, oddsA: float, oddsB: float):
     """Обновление коэффициентов (шаг 2)"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('UPDATE bets SET oddsA = ?, oddsB = ? WHERE id = ?', (oddsA, oddsB, bet_id))
+    _append_event(cursor, bet_id, EVENT_ODDS_SET, {'oddsA': oddsA, 'oddsB': oddsB})
     conn.commit()
     conn.close()
 
 
+@db_timed
 def update_bet_name(bet_id: int, bet_name: str):
     """Обновление названия пари"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('UPDATE bets SET bet_name = ? WHERE id = ?', (bet_name, bet_id))
+    _append_event(cursor, bet_id, EVENT_NAMED, {'bet_name': bet_name})
     conn.commit()
     conn.close()
 
 
+@db_timed
 def update_bet_step3(bet_id: int, stake: float):
     """Обновление суммы и публикация пари (шаг 3)"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    # Получаем maker username для определения taker
-    cursor.execute('SELECT maker_username FROM bets WHERE id = ?', (bet_id,))
+    # Получаем maker username и пару игроков для определения taker
+    cursor.execute('''
+        SELECT b.maker_username, t.*
+        FROM bets b JOIN tenants t ON t.id = b.tenant_id
+        WHERE b.id = ?
+    ''', (bet_id,))
     row = cursor.fetchone()
     if not row:
         conn.close()
         return
     
-    maker_username = row[0]
-    from config import get_other_player, TEST_MODE
+    maker_username = row['maker_username']
+    tenant = Tenant.from_dict(dict(row))
     # В тестовом режиме taker = maker (для тестирования на одном аккаунте)
     if TEST_MODE:
         taker_username = maker_username
     else:
-        taker_username = get_other_player(maker_username)
+        taker_username = tenant.other_player(maker_username)
     
     # taker_user_id установится при принятии пари
     
@@ -145,20 +375,35 @@ def update_bet_step3(bet_id: int, stake: float):
         SET stake = ?, status = 'OPEN', taker_username = ?
         WHERE id = ?
     ''', (stake, taker_username, bet_id))
+    _append_event(cursor, bet_id, EVENT_STAKE_SET, {'stake': stake, 'status': 'OPEN', 'taker_username': taker_username})
     
     conn.commit()
     conn.close()
 
 
+@db_timed
+def update_bet_stake(bet_id: int, stake: float):
+    """Обновление суммы уже опубликованного пари (редактирование)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE bets SET stake = ? WHERE id = ?', (stake, bet_id))
+    _append_event(cursor, bet_id, EVENT_STAKE_SET, {'stake': stake})
+    conn.commit()
+    conn.close()
+
+
+@db_timed
 def update_taker_user_id(bet_id: int, taker_user_id: int):
     """Обновление taker_user_id (вызывается при принятии пари)"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('UPDATE bets SET taker_user_id = ? WHERE id = ?', (taker_user_id, bet_id))
+    _append_event(cursor, bet_id, EVENT_TAKER_SET, {'taker_user_id': taker_user_id}, taker_user_id)
     conn.commit()
     conn.close()
 
 
+@db_timed
 def get_bet(bet_id: int) -> Optional[Bet]:
     """Получение пари по ID"""
     conn = get_connection()
@@ -172,37 +417,89 @@ def get_bet(bet_id: int) -> Optional[Bet]:
     return None
 
 
-def get_active_bets() -> List[Bet]:
-    """Получение активных пари (OPEN и TAKEN)"""
+@db_timed
+def get_active_bets(tenant_id: Optional[int] = None) -> List[Bet]:
+    """Получение активных пари (OPEN и TAKEN), при указании пары — только ее"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM bets 
-        WHERE status IN ('OPEN', 'TAKEN') 
-        ORDER BY created_at DESC
-    ''')
+    if tenant_id is None:
+        cursor.execute('''
+            SELECT * FROM bets 
+            WHERE status IN ('OPEN', 'TAKEN') 
+            ORDER BY created_at DESC
+        ''')
+    else:
+        cursor.execute('''
+            SELECT * FROM bets 
+            WHERE tenant_id = ? AND status IN ('OPEN', 'TAKEN') 
+            ORDER BY created_at DESC
+        ''', (tenant_id,))
     rows = cursor.fetchall()
     conn.close()
     return [Bet.from_dict(dict(row)) for row in rows]
 
 
-def get_bets_last_24h() -> List[Bet]:
+@db_timed
+def get_bets_last_24h(tenant_id: Optional[int] = None) -> List[Bet]:
     """Получение завершенных пари за последние 24 часа"""
     conn = get_connection()
     cursor = conn.cursor()
     cutoff = (datetime.now() - timedelta(days=1)).isoformat()
-    cursor.execute('''
-        SELECT * FROM bets 
-        WHERE status = 'FINISHED' AND finished_at >= ?
-        ORDER BY finished_at DESC
-    ''', (cutoff,))
+    if tenant_id is None:
+        cursor.execute('''
+            SELECT * FROM bets 
+            WHERE status = 'FINISHED' AND finished_at >= ?
+            ORDER BY finished_at DESC
+        ''', (cutoff,))
+    else:
+        cursor.execute('''
+            SELECT * FROM bets 
+            WHERE tenant_id = ? AND status = 'FINISHED' AND finished_at >= ?
+            ORDER BY finished_at DESC
+        ''', (tenant_id, cutoff))
+    rows = cursor.fetchall()
+    conn.close()
+    return [Bet.from_dict(dict(row)) for row in rows]
+
+
+@db_timed
+def get_user_bets(user_id: int, username: Optional[str], statuses: Iterable[str] = ('OPEN', 'TAKEN')) -> List[Bet]:
+    """Пари, где пользователь создатель (по user_id) или второй игрок (по username), новые первыми
+    
+    Обе половины запроса идут по индексам idx_bets_maker_status и idx_bets_taker_status.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    statuses = list(statuses)
+    marks = ', '.join('?' * len(statuses))
+    cursor.execute(f'''
+        SELECT * FROM bets WHERE maker_user_id = ? AND status IN ({marks})
+        UNION
+        SELECT * FROM bets WHERE taker_username = ? COLLATE NOCASE AND status IN ({marks})
+        ORDER BY created_at DESC
+    ''', (user_id, *statuses, username or '', *statuses))
     rows = cursor.fetchall()
     conn.close()
     return [Bet.from_dict(dict(row)) for row in rows]
 
 
-def take_bet(bet_id: int, taker_user_id: int, taker_side: str):
-    """Принятие пари (выбор стороны)"""
+@db_timed
+def get_digest_chats(since: datetime) -> List[Tuple[int, int]]:
+    """Групповые чаты (chat_id, tenant_id), где с since создавались пари, — адресаты сводок"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT DISTINCT chat_id, tenant_id FROM bets
+        WHERE chat_id < 0 AND created_at >= ?
+    ''', (since.isoformat(),))
+    rows = cursor.fetchall()
+    conn.close()
+    return [(row[0], row[1]) for row in rows]
+
+
+@db_timed
+def take_bet(bet_id: int, taker_user_id: int, taker_side: str) -> bool:
+    """Принятие пари (выбор стороны); False — пари уже не открыто (отменено по сроку и т.п.)"""
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -210,22 +507,35 @@ def take_bet(bet_id: int, taker_user_id: int, taker_side: str):
     row = cursor.fetchone()
     if not row:
         conn.close()
-        return
+        return False
     
     taker_username = row[0]
     
+    # Статус проверяется в самом UPDATE: между проверкой в обработчике и записью пари могли
+    # отменить по сроку (services/reminders.py) — такое пари не принимается
     cursor.execute('''
         UPDATE bets 
         SET taker_user_id = ?, taker_side = ?, status = 'TAKEN'
-        WHERE id = ?
+        WHERE id = ? AND status = 'OPEN'
     ''', (taker_user_id, taker_side, bet_id))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        conn.close()
+        return False
+    _append_event(cursor, bet_id, EVENT_TAKEN,
+                  {'taker_user_id': taker_user_id, 'taker_side': taker_side, 'status': 'TAKEN'}, taker_user_id)
     
     conn.commit()
     conn.close()
+    return True
+
 
+@db_timed
+def set_bet_result(bet_id: int, result: str, user_id: Optional[int] = None) -> bool:
+    """Установка результата и расчет выигрышей (user_id — кто установил, для журнала)
 
-def set_bet_result(bet_id: int, result: str):
-    """Установка результата и расчет выигрышей"""
+    False — пари не в статусе TAKEN (например, отменено по сроку после проверки в обработчике).
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -233,58 +543,55 @@ def set_bet_result(bet_id: int, result: str):
     row = cursor.fetchone()
     if not row:
         conn.close()
-        return
+        return False
     
     bet = Bet.from_dict(dict(row))
     
     if not bet.taker_side or not bet.stake:
         conn.close()
-        return
+        return False
     
     # Формула расчета согласно ТЗ
-    S = bet.stake
-    O = bet.oddsA if bet.taker_side == 'A' else bet.oddsB
-    
-    maker_win = 0.0
-    taker_win = 0.0
-    
-    if result == 'VOID':
-        maker_win = 0.0
-        taker_win = 0.0
-    elif result == bet.taker_side:
-        # Taker выиграл
-        taker_win = S * (O - 1)
-        maker_win = -S * (O - 1)
-    else:
-        # Taker проиграл
-        taker_win = -S
-        maker_win = S
+    maker_win, taker_win = bet.payout(result)
     
     finished_at = datetime.now()
     
     cursor.execute('''
         UPDATE bets 
         SET result = ?, maker_win = ?, taker_win = ?, status = 'FINISHED', finished_at = ?
-        WHERE id = ?
+        WHERE id = ? AND status = 'TAKEN'
     ''', (result, maker_win, taker_win, finished_at.isoformat(), bet_id))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        conn.close()
+        return False
+    _append_event(cursor, bet_id, EVENT_SETTLED, {
+        'result': result, 'maker_win': maker_win, 'taker_win': taker_win,
+        'status': 'FINISHED', 'finished_at': finished_at.isoformat()
+    }, user_id)
     
     # Создаем записи в ledger
     cursor.execute('''
-        INSERT INTO ledger (bet_id, user_id, username, amount, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (bet_id, bet.maker_user_id, bet.maker_username, maker_win, finished_at.isoformat()))
+        INSERT INTO ledger (bet_id, user_id, username, amount, created_at, tenant_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (bet_id, bet.maker_user_id, bet.maker_username, maker_win, finished_at.isoformat(), bet.tenant_id))
     
     cursor.execute('''
-        INSERT INTO ledger (bet_id, user_id, username, amount, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (bet_id, bet.taker_user_id, bet.taker_username, taker_win, finished_at.isoformat()))
+        INSERT INTO ledger (bet_id, user_id, username, amount, created_at, tenant_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (bet_id, bet.taker_user_id, bet.taker_username, taker_win, finished_at.isoformat(), bet.tenant_id))
     
     conn.commit()
     conn.close()
+    return True
 
 
-def change_bet_result(bet_id: int, new_result: str):
-    """Изменение результата пари с пересчетом статистики"""
+@db_timed
+def change_bet_result(bet_id: int, new_result: str, user_id: Optional[int] = None) -> bool:
+    """Изменение результата пари с пересчетом статистики (прежний результат остается в журнале)
+
+    False — пари не завершено (например, /undo вернуло его в TAKEN).
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -292,122 +599,320 @@ def change_bet_result(bet_id: int, new_result: str):
     row = cursor.fetchone()
     if not row:
         conn.close()
-        return
+        return False
     
     bet = Bet.from_dict(dict(row))
     
     if not bet.taker_side or not bet.stake:
         conn.close()
-        return
-    
-    # Удаляем старые ledger записи для этого пари
-    cursor.execute('DELETE FROM ledger WHERE bet_id = ?', (bet_id,))
+        return False
     
     # Пересчитываем выигрыши
-    S = bet.stake
-    O = bet.oddsA if bet.taker_side == 'A' else bet.oddsB
-    
-    maker_win = 0.0
-    taker_win = 0.0
-    
-    if new_result == 'VOID':
-        maker_win = 0.0
-        taker_win = 0.0
-    elif new_result == bet.taker_side:
-        taker_win = S * (O - 1)
-        maker_win = -S * (O - 1)
-    else:
-        taker_win = -S
-        maker_win = S
+    maker_win, taker_win = bet.payout(new_result)
     
     finished_at = datetime.now()
     
     cursor.execute('''
         UPDATE bets 
         SET result = ?, maker_win = ?, taker_win = ?, finished_at = ?
-        WHERE id = ?
+        WHERE id = ? AND status = 'FINISHED'
     ''', (new_result, maker_win, taker_win, finished_at.isoformat(), bet_id))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        conn.close()
+        return False
+    
+    # Удаляем старые ledger записи для этого пари
+    cursor.execute('DELETE FROM ledger WHERE bet_id = ?', (bet_id,))
+    _append_event(cursor, bet_id, EVENT_RESULT_CHANGED, {
+        'result': new_result, 'maker_win': maker_win, 'taker_win': taker_win,
+        'finished_at': finished_at.isoformat()
+    }, user_id)
     
     # Создаем новые записи в ledger
     cursor.execute('''
-        INSERT INTO ledger (bet_id, user_id, username, amount, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (bet_id, bet.maker_user_id, bet.maker_username, maker_win, finished_at.isoformat()))
+        INSERT INTO ledger (bet_id, user_id, username, amount, created_at, tenant_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (bet_id, bet.maker_user_id, bet.maker_username, maker_win, finished_at.isoformat(), bet.tenant_id))
     
     cursor.execute('''
-        INSERT INTO ledger (bet_id, user_id, username, amount, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (bet_id, bet.taker_user_id, bet.taker_username, taker_win, finished_at.isoformat()))
+        INSERT INTO ledger (bet_id, user_id, username, amount, created_at, tenant_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (bet_id, bet.taker_user_id, bet.taker_username, taker_win, finished_at.isoformat(), bet.tenant_id))
     
     conn.commit()
     conn.close()
+    return True
 
 
-def cancel_bet(bet_id: int):
-    """Отмена пари"""
+@db_timed
+def cancel_bet(bet_id: int, user_id: Optional[int] = None) -> bool:
+    """Отмена открытого пари; False — пари уже не открыто"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("UPDATE bets SET status = 'CANCELED' WHERE id = ?", (bet_id,))
+    cursor.execute("UPDATE bets SET status = 'CANCELED' WHERE id = ? AND status = 'OPEN'", (bet_id,))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        conn.close()
+        return False
+    _append_event(cursor, bet_id, EVENT_CANCELED, {'status': 'CANCELED'}, user_id)
     conn.commit()
     conn.close()
+    return True
+
+
+@db_timed
+def get_bets_to_remind(status: str, created_before: datetime) -> List[Bet]:
+    """Пари в статусе status, созданные раньше created_before, о которых еще не напоминали
+
+    Выборка идет по индексу (status, created_at): старые пари отменяются по сроку, поэтому
+    диапазон остается небольшим.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM bets
+        WHERE status = ? AND created_at < ? AND reminded_at IS NULL
+        ORDER BY created_at
+    ''', (status, created_before.isoformat()))
+    rows = cursor.fetchall()
+    conn.close()
+    return [Bet.from_dict(dict(row)) for row in rows]
+
+
+@db_timed
+def mark_bets_reminded(bet_ids: List[int]):
+    """Отметка о напоминании: повторно о пари не напоминают"""
+    if not bet_ids:
+        return
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+    cursor.executemany('UPDATE bets SET reminded_at = ? WHERE id = ?', [(now, bet_id) for bet_id in bet_ids])
+    conn.commit()
+    conn.close()
+
+
+@db_timed
+def expire_bets(status: str, created_before: datetime) -> List[Bet]:
+    """Отмена пари в статусе status, созданных раньше created_before, одной транзакцией
+
+    Каждое отмененное пари получает событие expired в журнале. Возвращает пари до отмены.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            SELECT * FROM bets WHERE status = ? AND created_at < ? ORDER BY created_at
+        ''', (status, created_before.isoformat()))
+        bets = [Bet.from_dict(dict(row)) for row in cursor.fetchall()]
+        cursor.executemany(
+            "UPDATE bets SET status = 'CANCELED' WHERE id = ?", [(bet.id,) for bet in bets]
+        )
+        for bet in bets:
+            _append_event(cursor, bet.id, EVENT_EXPIRED, {'status': 'CANCELED'})
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return bets
+
+
+@db_timed
+def import_bets(bets: List[Bet]) -> List[int]:
+    """Пакетная вставка готовых пари и их записей ledger одной транзакцией (executemany)
+
+    Выигрыши завершенных пари берутся из bet.maker_win / bet.taker_win. ID назначаются
+    подряд после последнего выданного: транзакция сразу берет блокировку записи, поэтому
+    другой процесс не вставит пари между чтением последнего ID и вставкой.
+    """
+    if not bets:
+        return []
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            SELECT MAX(
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'bets'), 0),
+                COALESCE((SELECT MAX(id) FROM bets), 0)
+            )
+        ''')
+        first_id = cursor.fetchone()[0] + 1
+        bet_ids = list(range(first_id, first_id + len(bets)))
+        
+        cursor.executemany('''
+            INSERT INTO bets
+            (id, maker_user_id, maker_username, taker_user_id, taker_username, bet_name, playerA_name, playerB_name,
+             oddsA, oddsB, stake, status, taker_side, result, created_at, finished_at, maker_win, taker_win, tenant_id)
+            VALUES (:id, :maker_user_id, :maker_username, :taker_user_id, :taker_username, :bet_name,
+                    :playerA_name, :playerB_name, :oddsA, :oddsB, :stake, :status, :taker_side, :result,
+                    :created_at, :finished_at, :maker_win, :taker_win, :tenant_id)
+        ''', [dict(bet.to_dict(), id=bet_id) for bet_id, bet in zip(bet_ids, bets)])
+        
+        ledger_rows = []
+        for bet_id, bet in zip(bet_ids, bets):
+            if bet.status != STATUS_FINISHED:
+                continue
+            finished_at = bet.finished_at.isoformat()
+            ledger_rows.append((bet_id, bet.maker_user_id, bet.maker_username, bet.maker_win, finished_at, bet.tenant_id))
+            ledger_rows.append((bet_id, bet.taker_user_id, bet.taker_username, bet.taker_win, finished_at, bet.tenant_id))
+        cursor.executemany('''
+            INSERT INTO ledger (bet_id, user_id, username, amount, created_at, tenant_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ledger_rows)
+        
+        # Журнал: импортированное пари — одно событие created с итоговыми полями
+        now = datetime.now().isoformat()
+        cursor.executemany('''
+            INSERT INTO bet_events (bet_id, tenant_id, type, data, user_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (bet_id, bet.tenant_id, EVENT_CREATED, json.dumps(_bet_snapshot(bet), ensure_ascii=False), None, now)
+            for bet_id, bet in zip(bet_ids, bets)
+        ])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return bet_ids
+
+
+@db_timed
+def get_bet_events(bet_id: int) -> List[BetEvent]:
+    """Журнал пари по порядку (индекс bet_id, id)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM bet_events WHERE bet_id = ? ORDER BY id', (bet_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [BetEvent.from_dict(dict(row)) for row in rows]
+
+
+def _undo_target(cursor, user_id: int, tenant_id: int, bet_id: Optional[int] = None) -> Optional[BetEvent]:
+    """Последнее неотмененное действие пользователя в паре (при указании bet_id — по этому пари)"""
+    bet_filter = ' AND e.bet_id = ?' if bet_id is not None else ''
+    cursor.execute(f'''
+        SELECT * FROM bet_events AS e
+        WHERE e.user_id = ? AND e.tenant_id = ? AND e.type IN ({", ".join("?" * len(UNDOABLE_EVENTS))}){bet_filter}
+          AND NOT EXISTS (
+              SELECT 1 FROM bet_events AS u
+              WHERE u.bet_id = e.bet_id AND u.type = ? AND u.ref_event_id = e.id
+          )
+        ORDER BY e.id DESC LIMIT 1
+    ''', (user_id, tenant_id, *sorted(UNDOABLE_EVENTS), *([bet_id] if bet_id is not None else []), EVENT_UNDONE))
+    row = cursor.fetchone()
+    return BetEvent.from_dict(dict(row)) if row else None
+
+
+@db_timed
+def get_undo_target(user_id: int, tenant_id: int) -> Optional[BetEvent]:
+    """Действие, которое отменит /undo (чтобы взять блокировку его пари до отмены)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    target = _undo_target(cursor, user_id, tenant_id)
+    conn.close()
+    return target
+
+
+@db_timed
+def undo_last_action(user_id: int, tenant_id: int, bet_id: Optional[int] = None) -> Tuple[Optional[BetEvent], Optional[Bet]]:
+    """Отмена последнего действия пользователя в паре (принятие, результат, смена результата, отмена)
+
+    Действие отменяется, только если после него пари не менялось. Отмена — событие undone в
+    журнале; пари и его записи ledger пересчитываются из оставшихся событий в той же транзакции.
+    bet_id ограничивает поиск действием по этому пари (его блокировку держит вызывающий).
+    Возвращает (отмененное событие, пари после отмены) или (None, None), если отменять нечего;
+    (событие, None) — действие есть, но после него пари уже менялось.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        target = _undo_target(cursor, user_id, tenant_id, bet_id)
+        if target is None:
+            conn.rollback()
+            return None, None
+        
+        cursor.execute('SELECT * FROM bet_events WHERE bet_id = ? ORDER BY id', (target.bet_id,))
+        events = effective_events(BetEvent.from_dict(dict(row)) for row in cursor.fetchall())
+        if events[-1].id != target.id:
+            conn.rollback()
+            return target, None
+        
+        remaining = events[:-1]
+        state = project(remaining)
+        if not state:
+            # Пари без события created (вставлено в обход журнала) восстановить не из чего
+            conn.rollback()
+            return target, None
+        _append_event(cursor, target.bet_id, EVENT_UNDONE, {}, user_id, ref_event_id=target.id)
+        columns = [field for field in BET_FIELDS if field in state]
+        cursor.execute(
+            f'UPDATE bets SET {", ".join(f"{field} = ?" for field in columns)} WHERE id = ?',
+            [state[field] for field in columns] + [target.bet_id]
+        )
+        # Ledger — тоже проекция: записи есть только у завершенного пари, расчет которого
+        # не удален сбросом статистики
+        cursor.execute('DELETE FROM ledger WHERE bet_id = ?', (target.bet_id,))
+        cursor.execute('SELECT * FROM bets WHERE id = ?', (target.bet_id,))
+        bet = Bet.from_dict(dict(cursor.fetchone()))
+        if bet.status == STATUS_FINISHED and not ledger_cleared(remaining):
+            cursor.executemany('''
+                INSERT INTO ledger (bet_id, user_id, username, amount, created_at, tenant_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (bet.id, bet.maker_user_id, bet.maker_username, bet.maker_win, bet.finished_at.isoformat(), bet.tenant_id),
+                (bet.id, bet.taker_user_id, bet.taker_username, bet.taker_win, bet.finished_at.isoformat(), bet.tenant_id),
+            ])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return target, bet
 
 
-def get_user_statistics(user_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> dict:
-    """Получение статистики пользователя за период"""
+@db_timed
+def get_user_statistics(user_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                        tenant_id: Optional[int] = None) -> dict:
+    """Получение статистики пользователя за период (при указании пары — только по ней)"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    query = 'SELECT SUM(amount) as total_balance FROM ledger WHERE user_id = ?'
+    # Общие условия для всех запросов
+    where = 'user_id = ?'
     params = [user_id]
-    
+    if tenant_id is not None:
+        where = 'tenant_id = ? AND ' + where
+        params.insert(0, tenant_id)
     if start_date:
-        query += ' AND created_at >= ?'
+        where += ' AND created_at >= ?'
         params.append(start_date.isoformat())
     if end_date:
-        query += ' AND created_at <= ?'
+        where += ' AND created_at <= ?'
         params.append(end_date.isoformat())
     
-    cursor.execute(query, params)
+    cursor.execute(f'SELECT SUM(amount) as total_balance FROM ledger WHERE {where}', params)
     row = cursor.fetchone()
     total_balance = row[0] or 0.0
     
     # Подсчет пари (уникальных bet_id)
-    query_bets = 'SELECT COUNT(DISTINCT bet_id) FROM ledger WHERE user_id = ?'
-    params_bets = [user_id]
-    if start_date:
-        query_bets += ' AND created_at >= ?'
-        params_bets.append(start_date.isoformat())
-    if end_date:
-        query_bets += ' AND created_at <= ?'
-        params_bets.append(end_date.isoformat())
-    
-    cursor.execute(query_bets, params_bets)
+    cursor.execute(f'SELECT COUNT(DISTINCT bet_id) FROM ledger WHERE {where}', params)
     total_bets = cursor.fetchone()[0] or 0
     
     # Победы (amount > 0)
-    query_wins = 'SELECT COUNT(*) FROM ledger WHERE user_id = ? AND amount > 0'
-    params_wins = [user_id]
-    if start_date:
-        query_wins += ' AND created_at >= ?'
-        params_wins.append(start_date.isoformat())
-    if end_date:
-        query_wins += ' AND created_at <= ?'
-        params_wins.append(end_date.isoformat())
-    
-    cursor.execute(query_wins, params_wins)
+    cursor.execute(f'SELECT COUNT(*) FROM ledger WHERE {where} AND amount > 0', params)
     wins = cursor.fetchone()[0] or 0
     
     # Поражения (amount < 0)
-    query_losses = 'SELECT COUNT(*) FROM ledger WHERE user_id = ? AND amount < 0'
-    params_losses = [user_id]
-    if start_date:
-        query_losses += ' AND created_at >= ?'
-        params_losses.append(start_date.isoformat())
-    if end_date:
-        query_losses += ' AND created_at <= ?'
-        params_losses.append(end_date.isoformat())
-    
-    cursor.execute(query_losses, params_losses)
+    cursor.execute(f'SELECT COUNT(*) FROM ledger WHERE {where} AND amount < 0', params)
     losses = cursor.fetchone()[0] or 0
     
     conn.close()
@@ -420,66 +925,35 @@ def get_user_statistics(user_id: int, start_date: Optional[datetime] = None, end
     }
 
 
-def get_all_statistics(start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> dict:
-    """Получение общей статистики для обоих игроков"""
-    from config import PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME
-    
-    # Получаем ID игроков из ledger (более надежный источник)
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Получаем уникальные user_id и username из ledger с приоритетом последним записям
-    cursor.execute('''
-        SELECT user_id, username 
-        FROM ledger 
-        WHERE username IN (?, ?)
-        GROUP BY username
-        ORDER BY MAX(created_at) DESC
-    ''', (PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME))
-    
-    users = {}
-    for row in cursor.fetchall():
-        username = row[1]
-        user_id = row[0]
-        if username and username not in users:
-            users[username] = user_id
-    
-    # Если не нашли в ledger, ищем в bets
-    if len(users) < 2:
-        # Сначала ищем как maker
-        cursor.execute('''
-            SELECT DISTINCT maker_user_id, maker_username 
-            FROM bets 
-            WHERE maker_username IN (?, ?)
-        ''', (PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME))
-        
-        for row in cursor.fetchall():
-            username = row[1]
-            user_id = row[0]
-            if username and username not in users:
-                users[username] = user_id
-        
-        # Потом ищем как taker
-        cursor.execute('''
-            SELECT DISTINCT taker_user_id, taker_username 
-            FROM bets 
-            WHERE taker_username IN (?, ?) AND taker_user_id IS NOT NULL
-        ''', (PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME))
-        
-        for row in cursor.fetchall():
-            username = row[1]
-            user_id = row[0]
-            if username and username not in users:
-                users[username] = user_id
+@db_timed
+def get_all_statistics(start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                       tenant_id: int = DEFAULT_TENANT_ID, user_ids: Optional[Dict[str, int]] = None,
+                       progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """Получение общей статистики для обоих игроков пары
+
+    user_ids — готовое соответствие username (в нижнем регистре) -> user_id, например из реестра
+    пользователей; игроки, которых в нем нет (реестр другого рабочего процесса мог их еще
+    не видеть), и все игроки без него ищутся в таблице users. progress(готово, всего)
+    вызывается перед расчетом каждого игрока (ход фонового задания).
+    """
+    tenant = get_tenant(tenant_id)
+    player1, player2 = tenant.players if tenant else (None, None)
     
-    conn.close()
+    # ID игроков по таблице users (индекс по username), без сканирования истории
+    user_ids = dict(user_ids or {})
+    missing = [username for username in (player1, player2) if username and username.lower() not in user_ids]
+    if missing:
+        user_ids.update(find_user_ids(missing))
+    users = {username: user_ids.get(username.lower()) for username in (player1, player2) if username}
     
     stats = {}
-    for username, user_id in users.items():
+    for done, (username, user_id) in enumerate(users.items()):
+        if progress is not None:
+            progress(done, len(users))
         if user_id:
-            stats[username] = get_user_statistics(user_id, start_date, end_date)
+            stats[username] = get_user_statistics(user_id, start_date, end_date, tenant_id)
         else:
-            # Если user_id не найден, возвращаем нулевую статистику
+            # Игрока нет в таблице users (ни разу не писал боту): записей ledger у него нет
             stats[username] = {
                 'total_balance': 0.0,
                 'total_bets': 0,
@@ -487,19 +961,335 @@ def get_all_statistics(start_date: Optional[datetime] = None, end_date: Optional
                 'losses': 0
             }
     
-    # Убеждаемся, что оба игрока присутствуют
-    if PLAYER_INZAAA_USERNAME not in stats:
-        stats[PLAYER_INZAAA_USERNAME] = {'total_balance': 0.0, 'total_bets': 0, 'wins': 0, 'losses': 0}
-    if PLAYER_TROOLZ_USERNAME not in stats:
-        stats[PLAYER_TROOLZ_USERNAME] = {'total_balance': 0.0, 'total_bets': 0, 'wins': 0, 'losses': 0}
-    
     return stats
 
 
-def reset_statistics():
-    """Сброс статистики (очистка ledger)"""
+@db_timed
+def get_data_version() -> str:
+    """Версия данных пари и статистики: меняется при любом изменении bets и ledger
+
+    Любое изменение пари (и удаление его записей ledger) добавляет событие в bet_events,
+    любая вставка в ledger увеличивает его счетчик AUTOINCREMENT, reset_statistics
+    увеличивает этот счетчик явно. Поэтому достаточно двух счетчиков из sqlite_sequence —
+    без подсчета строк.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, seq FROM sqlite_sequence WHERE name IN ('bet_events', 'ledger')")
+    seq = dict(cursor.fetchall())
+    conn.close()
+    return f"{seq.get('bet_events', 0)}:{seq.get('ledger', 0)}"
+
+
+@db_timed
+def reset_statistics(tenant_id: Optional[int] = None, user_id: Optional[int] = None):
+    """Сброс статистики (очистка ledger), при указании пары — только ее
+
+    Каждое пари с удаленными записями получает событие ledger_reset: /undo не возвращает
+    сброшенный расчет в статистику, а действия до сброса считаются уже не последними.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    tenant_filter = ' WHERE tenant_id = ?' if tenant_id is not None else ''
+    tenant_params = (tenant_id,) if tenant_id is not None else ()
+    cursor.execute(f'''
+        INSERT INTO bet_events (bet_id, tenant_id, type, data, user_id, ref_event_id, created_at)
+        SELECT bets.id, bets.tenant_id, ?, '{{}}', ?, NULL, ?
+        FROM bets WHERE bets.id IN (SELECT DISTINCT bet_id FROM ledger{tenant_filter})
+    ''', (EVENT_LEDGER_RESET, user_id, datetime.now().isoformat(), *tenant_params))
+    cursor.execute(f'DELETE FROM ledger{tenant_filter}', tenant_params)
+    # Удаление без вставки не меняет счетчик ledger: сдвигаем его, чтобы сменилась версия данных
+    cursor.execute("UPDATE sqlite_sequence SET seq = seq + 1 WHERE name = 'ledger'")
+    conn.commit()
+    conn.close()
+
+
+@db_timed
+def get_bot_state(key: str) -> Optional[str]:
+    """Сохраненное значение состояния процесса бота (bot_state)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT value FROM bot_state WHERE key = ?', (key,))
+    row = cursor.fetchone()
+    conn.close()
+    return row['value'] if row else None
+
+
+@db_timed
+def save_bot_state(values: Dict[str, Optional[str]]):
+    """Запись нескольких значений bot_state одной транзакцией; None удаляет ключ"""
+    now = datetime.now().isoformat()
+    conn = get_connection()
+    cursor = conn.cursor()
+    for key, value in values.items():
+        if value is None:
+            cursor.execute('DELETE FROM bot_state WHERE key = ?', (key,))
+        else:
+            cursor.execute('''
+                INSERT INTO bot_state (key, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            ''', (key, value, now))
+    conn.commit()
+    conn.close()
+
+
+def checkpoint_wal() -> Tuple[int, int]:
+    """Перенос WAL в основной файл базы и усечение WAL (при остановке бота)
+
+    Возвращает (страниц в WAL, перенесено страниц); при активных читателях перенос неполный.
+    """
+    conn = get_connection()
+    try:
+        busy, log_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+    finally:
+        conn.close()
+    return log_pages, checkpointed
+
+
+@db_timed
+def get_tenant(tenant_id: int) -> Optional[Tenant]:
+    """Получение пары игроков по ID"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM tenants WHERE id = ?', (tenant_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return Tenant.from_dict(dict(row)) if row else None
+
+
+@db_timed
+def get_tenant_by_chat(chat_id: int) -> Optional[Tenant]:
+    """Получение пары игроков, привязанной к чату"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM tenants WHERE chat_id = ?', (chat_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return Tenant.from_dict(dict(row)) if row else None
+
+
+@db_timed
+def save_tenant(chat_id: int, title: Optional[str], player1_username: str, player2_username: str) -> Tenant:
+    """Создание пары игроков для чата или обновление названия и порядка игроков той же пары
+
+    Если у чата уже есть пара с другими игроками, она отвязывается от чата (chat_id = NULL)
+    и сохраняет свои пари и ledger, а чат получает новую пару с пустой историей.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT * FROM tenants WHERE chat_id = ?', (chat_id,))
+        row = cursor.fetchone()
+        if row is not None:
+            current = Tenant.from_dict(dict(row))
+            if not (current.is_player(player1_username) and current.is_player(player2_username)):
+                cursor.execute('UPDATE tenants SET chat_id = NULL WHERE id = ?', (row['id'],))
+        cursor.execute('''
+            INSERT INTO tenants (chat_id, title, player1_username, player2_username, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                title = excluded.title,
+                player1_username = excluded.player1_username,
+                player2_username = excluded.player2_username
+        ''', (chat_id, title, player1_username, player2_username, datetime.now().isoformat()))
+        cursor.execute('SELECT * FROM tenants WHERE chat_id = ?', (chat_id,))
+        row = cursor.fetchone()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return Tenant.from_dict(dict(row))
+
+
+@db_timed
+def save_user(user_id: int, username: Optional[str], first_name: Optional[str]) -> User:
+    """Запись пользователя (или смены его username); username у прежнего владельца освобождается"""
+    now = datetime.now().isoformat()
+    username_lower = username.lower() if username else None
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM ledger')
+    if username_lower:
+        cursor.execute(
+            'UPDATE users SET username = NULL, username_lower = NULL WHERE username_lower = ? AND user_id != ?',
+            (username_lower, user_id)
+        )
+    cursor.execute('''
+        INSERT INTO users (user_id, username, username_lower, first_name, first_seen, last_seen)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            username = excluded.username,
+            username_lower = excluded.username_lower,
+            first_name = excluded.first_name,
+            last_seen = excluded.last_seen
+    ''', (user_id, username, username_lower, first_name, now, now))
     conn.commit()
+    cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+    row = cursor.fetchone()
     conn.close()
+    return User.from_dict(dict(row))
+
+
+@db_timed
+def get_users() -> List[User]:
+    """Все известные пользователи"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM users')
+    rows = cursor.fetchall()
+    conn.close()
+    return [User.from_dict(dict(row)) for row in rows]
+
+
+@db_timed
+def find_user_ids(usernames: Iterable[str]) -> Dict[str, int]:
+    """Соответствие username (в нижнем регистре) -> user_id для известных пользователей"""
+    keys = [username.lower() for username in usernames if username]
+    if not keys:
+        return {}
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f'SELECT username_lower, user_id FROM users WHERE username_lower IN ({", ".join("?" * len(keys))})',
+        keys
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    return {row[0]: row[1] for row in rows}
+
+
+@db_timed
+def get_catalog() -> List[CatalogItem]:
+    """Весь каталог, включая удаленные из списка элементы"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM catalog')
+    rows = cursor.fetchall()
+    conn.close()
+    return [CatalogItem.from_dict(dict(row)) for row in rows]
+
+
+@db_timed
+def save_catalog_item(kind: str, name: str) -> CatalogItem:
+    """Добавление элемента в конец списка (или возврат удаленного, с прежним ID и частотой)"""
+    now = datetime.now().isoformat()
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO catalog (kind, name, name_lower, position, updated_at)
+        VALUES (?, ?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM catalog WHERE kind = ?), ?)
+        ON CONFLICT(kind, name_lower) DO UPDATE SET
+            name = excluded.name,
+            active = 1,
+            updated_at = excluded.updated_at
+    ''', (kind, name, name.lower(), kind, now))
+    conn.commit()
+    cursor.execute('SELECT * FROM catalog WHERE kind = ? AND name_lower = ?', (kind, name.lower()))
+    row = cursor.fetchone()
+    conn.close()
+    return CatalogItem.from_dict(dict(row))
+
+
+@db_timed
+def deactivate_catalog_item(kind: str, name: str) -> bool:
+    """Удаление элемента из списка (строка остается: по ID из старых кнопок находится имя)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'UPDATE catalog SET active = 0, updated_at = ? WHERE kind = ? AND name_lower = ? AND active = 1',
+        (datetime.now().isoformat(), kind, name.lower())
+    )
+    changed = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return changed
+
+
+@db_timed
+def add_catalog_uses(counts: Dict[int, int]):
+    """Прибавление числа выборов элементов каталога: ID -> сколько раз выбран"""
+    if not counts:
+        return
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('UPDATE catalog SET uses = uses + ? WHERE id = ?', [(count, item_id) for item_id, count in counts.items()])
+    conn.commit()
+    conn.close()
+
+
+# Выгружаемые таблицы: колонка времени для фильтра по периоду и колонки username для фильтра по игроку
+EXPORT_TABLES = {
+    'bets': ('created_at', ('maker_username', 'taker_username')),
+    'ledger': ('created_at', ('username',)),
+}
+
+
+def _export_filter(table: str, start_date: Optional[datetime], end_date: Optional[datetime],
+                   tenant_id: Optional[int], username: Optional[str]) -> Tuple[str, list]:
+    time_column, user_columns = EXPORT_TABLES[table]
+    conditions = []
+    params = []
+    if tenant_id is not None:
+        conditions.append('tenant_id = ?')
+        params.append(tenant_id)
+    if start_date:
+        conditions.append(f'{time_column} >= ?')
+        params.append(start_date.isoformat())
+    if end_date:
+        conditions.append(f'{time_column} <= ?')
+        params.append(end_date.isoformat())
+    if username:
+        conditions.append('(' + ' OR '.join(f'{column} = ? COLLATE NOCASE' for column in user_columns) + ')')
+        params.extend([username] * len(user_columns))
+    return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+
+@db_timed
+def get_export_columns(table: str) -> List[Tuple[str, str]]:
+    """Колонки выгружаемой таблицы: [(имя, объявленный тип SQLite)]"""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Таблица {table} не выгружается")
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'PRAGMA table_info({table})')
+    columns = [(row['name'], row['type'].upper()) for row in cursor.fetchall()]
+    conn.close()
+    return columns
+
+
+@db_timed
+def count_export_rows(table: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                      tenant_id: Optional[int] = None, username: Optional[str] = None) -> int:
+    """Число строк выгрузки (для хода выполнения)"""
+    where, params = _export_filter(table, start_date, end_date, tenant_id, username)
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT COUNT(*) FROM {table}{where}', params)
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
+def iter_export_rows(table: str, columns: List[str], start_date: Optional[datetime] = None,
+                     end_date: Optional[datetime] = None, tenant_id: Optional[int] = None,
+                     username: Optional[str] = None, chunk_size: int = 1000) -> Iterator[List[tuple]]:
+    """Строки таблицы порциями по chunk_size (fetchmany): в памяти не больше одной порции
+
+    Генератор держит соединение открытым, пока его читают, поэтому db_timed к нему не применяется.
+    """
+    where, params = _export_filter(table, start_date, end_date, tenant_id, username)
+    conn = get_connection()
+    # Кортежи вместо sqlite3.Row: их сразу принимают csv.writer и построчная запись
+    conn.row_factory = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {", ".join(columns)} FROM {table}{where} ORDER BY id', params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
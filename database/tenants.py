@@ -0,0 +1,65 @@
+"""
+Кэш пар игроков (тенантов): чат -> пара без запроса к БД на каждое обновление
+"""
+import threading
+from typing import Dict, Optional
+
+from database.db import get_tenant, get_tenant_by_chat, save_tenant
+from models.tenant import Tenant, DEFAULT_TENANT_ID
+
+
+class TenantRegistry:
+    """Кэш пар по ID и по chat_id; чаты без своей пары получают пару по умолчанию"""
+
+    def __init__(self):
+        self._by_id: Dict[int, Tenant] = {}
+        self._by_chat: Dict[int, Tenant] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id: int) -> Optional[Tenant]:
+        tenant = self._by_id.get(tenant_id)
+        if tenant is None:
+            tenant = get_tenant(tenant_id)
+            if tenant is not None:
+                with self._lock:
+                    self._by_id[tenant_id] = tenant
+        return tenant
+
+    def default(self) -> Tenant:
+        return self.get(DEFAULT_TENANT_ID)
+
+    def for_chat(self, chat_id: Optional[int]) -> Tenant:
+        """Пара чата; None (inline-режим и т.п.) — пара по умолчанию"""
+        if chat_id is None:
+            return self.default()
+        tenant = self._by_chat.get(chat_id)
+        if tenant is None:
+            tenant = get_tenant_by_chat(chat_id) or self.default()
+            with self._lock:
+                self._by_chat[chat_id] = tenant
+        return tenant
+
+    def save(self, chat_id: int, title: Optional[str], player1_username: str, player2_username: str) -> Tenant:
+        """Пара для чата; прежняя пара с другими игроками отвязывается от чата (database/db.py)"""
+        tenant = save_tenant(chat_id, title, player1_username, player2_username)
+        with self._lock:
+            previous = self._by_chat.get(chat_id)
+            if previous is not None and previous.id != tenant.id:
+                self._by_id.pop(previous.id, None)
+            self._by_id[tenant.id] = tenant
+            self._by_chat[chat_id] = tenant
+        return tenant
+
+    def invalidate(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_chat.clear()
+
+
+tenants = TenantRegistry()
+
+
+def tenant_for_update(update) -> Tenant:
+    """Пара игроков для чата, из которого пришло обновление"""
+    chat = update.effective_chat
+    return tenants.for_chat(chat.id if chat else None)
@@ -0,0 +1,92 @@
+"""
+Реестр пользователей в памяти: user_id <-> username без запросов к БД на каждое обновление
+
+Пользователь записывается в таблицу users при первом появлении в любом обновлении
+и при смене username; в остальных случаях обновление обходится проверкой словаря.
+"""
+import threading
+from typing import Dict, Iterable, Optional
+
+from database.db import get_users, save_user
+from models.user import User
+
+
+class UserRegistry:
+    """Индексы пользователей по ID и по username (без учета регистра)"""
+
+    def __init__(self):
+        self._by_id: Dict[int, User] = {}
+        self._by_username: Dict[str, int] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Загрузка всех известных пользователей (таблица небольшая)"""
+        with self._lock:
+            self._by_id.clear()
+            self._by_username.clear()
+            for user in get_users():
+                self._index(user)
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def _index(self, user: User):
+        previous = self._by_id.get(user.user_id)
+        if previous is not None and previous.username_key and previous.username_key != user.username_key:
+            self._by_username.pop(previous.username_key, None)
+        self._by_id[user.user_id] = user
+        if user.username_key:
+            self._by_username[user.username_key] = user.user_id
+
+    def observe(self, user_id: int, username: Optional[str], first_name: Optional[str]) -> bool:
+        """Учет пользователя из обновления; True, если пришлось записать его в БД"""
+        self._ensure_loaded()
+        known = self._by_id.get(user_id)
+        if known is not None and known.username == username and known.first_name == first_name:
+            return False
+
+        user = save_user(user_id, username, first_name)
+        with self._lock:
+            # Username перешел к этому пользователю: у прежнего владельца он больше не действует
+            owner_id = self._by_username.get(user.username_key) if user.username_key else None
+            if owner_id is not None and owner_id != user_id:
+                owner = self._by_id[owner_id]
+                self._by_id[owner_id] = User(owner.user_id, None, owner.first_name, owner.first_seen, owner.last_seen)
+            self._index(user)
+        return True
+
+    def get(self, user_id: int) -> Optional[User]:
+        self._ensure_loaded()
+        return self._by_id.get(user_id)
+
+    def user_id(self, username: Optional[str]) -> Optional[int]:
+        """ID пользователя по username (с @ или без, без учета регистра)"""
+        if not username:
+            return None
+        self._ensure_loaded()
+        return self._by_username.get(username.lstrip('@').lower())
+
+    def user_ids(self, usernames: Iterable[str]) -> Dict[str, int]:
+        """Соответствие username (в нижнем регистре) -> user_id для известных пользователей"""
+        self._ensure_loaded()
+        keys = (username.lower() for username in usernames if username)
+        return {key: self._by_username[key] for key in keys if key in self._by_username}
+
+    def invalidate(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_username.clear()
+            self._loaded = False
+
+
+users = UserRegistry()
+
+
+async def track_user(update, context) -> None:
+    """TypeHandler (группа -1): учет отправителя каждого обновления до основных обработчиков"""
+    user = update.effective_user
+    if user is not None and not user.is_bot:
+        users.observe(user.id, user.username, user.first_name)
@@ -0,0 +1,181 @@
+"""
+Служебные команды администратора
+"""
+from telegram import Update
+from telegram.ext import ContextTypes
+from config import is_admin
+from database.catalog import catalog
+from database.tenants import tenants, tenant_for_update
+from models.catalog import KIND_PLAYER, KIND_BET_NAME
+from monitoring.metrics import REGISTRY
+from monitoring.profiler import format_result
+
+
+PERF_TOP = 10
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+# Вид каталога в аргументах /catalog
+CATALOG_KIND_ARGS = {'player': KIND_PLAYER, 'name': KIND_BET_NAME}
+CATALOG_USAGE = "Использование: /catalog [add|remove] [player|name] <имя>"
+
+
+async def perf_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /perf — самые медленные маршруты"""
+    user = update.effective_user
+    if not is_admin(user.username):
+        await update.message.reply_text("❌ Команда доступна только администраторам")
+        return
+
+    routes = sorted(REGISTRY.routes(), key=lambda item: item[1].percentile(95), reverse=True)
+    if not routes:
+        await update.message.reply_text("⏱ Пока нет данных о маршрутах")
+        return
+
+    text = "⏱ *Самые медленные маршруты (p95)*\n\n"
+    for route, stats in routes[:PERF_TOP]:
+        text += (
+            f"`{route}` — p50 {stats.percentile(50) * 1000:.0f} мс, "
+            f"p95 {stats.percentile(95) * 1000:.0f} мс, max {stats.max_s * 1000:.0f} мс\n"
+            f"   вызовов: {stats.count}, ошибок: {stats.errors}, "
+            f"SQL: {stats.mean_statements():.1f}, API: {stats.mean_api_calls():.1f}\n"
+        )
+
+    await update.message.reply_text(text, parse_mode='Markdown')
+
+
+async def profile_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /profile [N] [sec|upd] | stop"""
+    user = update.effective_user
+    if not is_admin(user.username):
+        await update.message.reply_text("❌ Команда доступна только администраторам")
+        return
+
+    profiler = context.application.bot_data.get('profiler')
+    if profiler is None:
+        await update.message.reply_text("❌ Профилировщик не подключен")
+        return
+
+    args = context.args or []
+    if args and args[0].lower() == 'stop':
+        result = profiler.stop()
+        if result is None:
+            await update.message.reply_text("Профилирование не запущено")
+        else:
+            await update.message.reply_text(format_result(result))
+        return
+
+    try:
+        amount = int(args[0]) if args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await update.message.reply_text("Использование: /profile [N] [sec|upd] или /profile stop")
+        return
+    by_updates = len(args) > 1 and args[1].lower().startswith('upd')
+
+    if amount <= 0 or (not by_updates and amount > PROFILE_MAX_SECONDS):
+        await update.message.reply_text(f"❌ N должно быть от 1 до {PROFILE_MAX_SECONDS} секунд")
+        return
+
+    started = profiler.start(
+        seconds=None if by_updates else amount,
+        updates=amount if by_updates else None,
+        notify_chat_id=update.effective_chat.id
+    )
+    if not started:
+        await update.message.reply_text("⚠️ Профилирование уже запущено. /profile stop — остановить")
+        return
+
+    unit = "обновлений" if by_updates else "секунд"
+    await update.message.reply_text(f"🔬 Профилирование запущено на {amount} {unit}")
+
+
+async def pair_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /pair @игрок1 @игрок2 — своя пара игроков для чата"""
+    user = update.effective_user
+    chat = update.effective_chat
+    args = [arg.lstrip('@') for arg in (context.args or [])]
+
+    if not args:
+        player1, player2 = tenant_for_update(update).players
+        await update.message.reply_text(
+            f"👥 Пара этого чата: @{player1} и @{player2}\n"
+            "Изменить: /pair @игрок1 @игрок2"
+        )
+        return
+
+    if len(args) != 2 or not all(args) or args[0].lower() == args[1].lower():
+        await update.message.reply_text("Использование: /pair @игрок1 @игрок2")
+        return
+
+    # Заменить пару чата может администратор или игрок текущей пары, назначить первую —
+    # администратор или один из игроков новой пары
+    current = tenant_for_update(update)
+    has_pair = current.chat_id == chat.id
+    if has_pair:
+        allowed = is_admin(user.username) or current.is_player(user.username)
+    else:
+        username = (user.username or "").lower()
+        allowed = is_admin(user.username) or username in (args[0].lower(), args[1].lower())
+    if not allowed:
+        await update.message.reply_text(
+            "❌ Сменить пару может администратор или игрок текущей пары" if has_pair
+            else "❌ Пару может назначить администратор или один из игроков"
+        )
+        return
+
+    tenant = tenants.save(chat.id, chat.title, args[0], args[1])
+    text = f"✅ Пара чата: @{tenant.player1_username} и @{tenant.player2_username}"
+    if has_pair and tenant.id != current.id:
+        player1, player2 = current.players
+        text += f"\nПари и статистика прежней пары (@{player1} и @{player2}) остаются за ней и в новую пару не переходят"
+    await update.message.reply_text(text)
+
+
+async def backup_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /backup — внеочередная резервная копия базы"""
+    from services.backup import run_backup, BackupError
+
+    user = update.effective_user
+    if not is_admin(user.username):
+        await update.message.reply_text("❌ Команда доступна только администраторам")
+        return
+
+    message = await update.message.reply_text("💾 Снимаю резервную копию…")
+    try:
+        result = await run_backup()
+    except BackupError as e:
+        await message.edit_text(f"❌ Резервная копия не снята: {e}")
+        return
+    await message.edit_text(f"✅ Резервная копия {result.summary()}")
+
+
+async def catalog_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /catalog [add|remove player|name имя] — игроки и названия пари для кнопок"""
+    user = update.effective_user
+    if not is_admin(user.username):
+        await update.message.reply_text("❌ Команда доступна только администраторам")
+        return
+
+    args = context.args or []
+    if not args:
+        players = ", ".join(f"{item.name} ({item.uses})" for item in catalog.items(KIND_PLAYER))
+        names = ", ".join(f"{item.name} ({item.uses})" for item in catalog.items(KIND_BET_NAME))
+        await update.message.reply_text(
+            f"📇 Игроки (в скобках — сколько раз выбраны):\n{players or '—'}\n\n"
+            f"Названия пари:\n{names or '—'}\n\n{CATALOG_USAGE}"
+        )
+        return
+
+    action = args[0].lower()
+    kind = CATALOG_KIND_ARGS.get(args[1].lower()) if len(args) > 1 else None
+    name = " ".join(args[2:]).strip()
+    if action not in ('add', 'remove') or kind is None or not name:
+        await update.message.reply_text(CATALOG_USAGE)
+        return
+
+    if action == 'add':
+        item = catalog.add(kind, name)
+        await update.message.reply_text(f"✅ Добавлено: {item.name}")
+    elif catalog.remove(kind, name):
+        await update.message.reply_text(f"✅ Удалено из списка: {name}")
+    else:
+        await update.message.reply_text(f"❌ В списке нет: {name}")
@@ -1,22 +1,56 @@
 """
 Обработчики для работы с пари
 """
+import asyncio
+import random
 import re
+from typing import Dict, List, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from database.db import (
-    create_bet, update_bet_step2, update_bet_step3, get_bet, 
-    get_active_bets, get_bets_last_24h, take_bet, set_bet_result,
-    cancel_bet, update_bet_name, change_bet_result
+    create_bet, update_bet_step2, update_bet_step3, update_bet_stake, get_bet, 
+    get_active_bets, take_bet, set_bet_result,
+    cancel_bet, update_bet_name, change_bet_result, reset_statistics
 )
 from models.bet import Bet, STATUS_DRAFT, STATUS_OPEN, STATUS_TAKEN
-from config import is_allowed_player, get_other_player, get_taker_user_id, PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME
-from constants import PLAYERS, BET_NAMES
-from datetime import datetime
+from config import is_admin, is_allowed_player, get_other_player, get_taker_user_id, PLAYER_INZAAA_USERNAME, PLAYER_TROOLZ_USERNAME, SESSION_TTL, TEST_MODE
+from database.tenants import tenants, tenant_for_update
+from database.users import users
+from database.catalog import catalog
+from models.catalog import KIND_PLAYER, KIND_BET_NAME
+from state.locks import bet_locks
+from state.sessions import SessionStore
+from datetime import datetime, timedelta
+from handlers.keyboards import (
+    BACK_TO_MENU_KEYBOARD, MENU_BACK_BUTTON, RESET_CONFIRM_KEYBOARD, STATISTICS_KEYBOARD,
+    CHANGE_RESULT_TEMPLATE, INLINE_TAKEN_TEMPLATE, OPEN_BET_TEMPLATE, RESULT_TEMPLATE, SELECT_SIDE_TEMPLATE,
+    TAKEN_BET_TEMPLATE,
+    bet_name_keyboard, bet_params, card_keyboard, catalog_keyboard, odds_keyboard, player_keyboard, stake_keyboard
+)
+from handlers.start import start_handler
+from services.digest import statistics_snapshot, finished_bets_snapshot
+from services.callbacks import CallbackError, decode as decode_callback, encode as encode_callback
+from services.jobs import jobs
+from services.live_cards import CardView, VIEW_CARD, VIEW_LIST, live_cards, query_view
+from services.pricing import format_odds, percent_for, price_pair
+
+
+# Периоды статистики, которые считаются фоновым заданием (services/jobs.py)
+LONG_STATS_PERIODS = ('30d', 'all')
 
+# Форматы ввода визарда, компилируются один раз: матч "A vs B" или "A B", коэффициент "Имя процент"
+MATCH_VS_RE = re.compile(r'^(.+?)\s+vs\s+(.+?)$', re.IGNORECASE)
+MATCH_SPACE_RE = re.compile(r'^(\S+)\s+(\S+)$')
+PERCENT_RE = re.compile(r'^(.+?)\s+(\d+\.?\d*)$')
+
+STALE_EDIT_TEXT = "❌ Пари уже принято или отменено, изменения не сохранены"
+# Запись не прошла проверку статуса в SQL: пари изменили вне блокировки (отмена по сроку)
+BET_CHANGED_TEXT = "❌ Пари уже изменилось (например, отменено по сроку)"
+SAME_PLAYERS_TEXT = "❌ Игроки матча должны быть разными"
+RESET_FORBIDDEN_TEXT = "❌ Сброс статистики доступен игрокам пары этого чата"
 
 # Хранилище временных данных для визарда
-user_states = {}  # {user_id: {'action': 'step0'|'step1'|'step2'|'step3', 'bet_id': int, 'bet_name': str, 'playerA': str, 'playerB': str, 'oddsA': float, 'oddsB': float, 'message_id': int}}
+user_states = SessionStore('session', ttl=SESSION_TTL)  # {user_id: {'action': 'step0'|'step1'|'step2'|'step3', 'bet_id': int, 'bet_name': str, 'playerA': str, 'playerB': str, 'oddsA': float, 'oddsB': float, 'message_id': int}}
 
 
 def format_money(amount, signed=False):
@@ -26,52 +60,34 @@ def format_money(amount, signed=False):
     return f"{amount:.0f} ₽"
 
 
-def build_player_keyboard(selected_player=None):
-    """Создание клавиатуры выбора игроков с подсветкой выбранного"""
-    keyboard = []
-    for i in range(0, len(PLAYERS), 2):
-        row = []
-        name = PLAYERS[i]
-        label = f"✅ {name}" if name == selected_player else name
-        row.append(InlineKeyboardButton(label, callback_data=f"player_{name}"))
-        if i + 1 < len(PLAYERS):
-            name2 = PLAYERS[i + 1]
-            label2 = f"✅ {name2}" if name2 == selected_player else name2
-            row.append(InlineKeyboardButton(label2, callback_data=f"player_{name2}"))
-        keyboard.append(row)
-    return keyboard
-
+async def save_stake(state: dict, stake: float) -> Optional[Bet]:
+    """Шаг 3: публикация пари или сохранение редактирования под блокировкой пари
 
-def build_odds_keyboard(bet_id, playerA, playerB, selected_player=None):
-    """Клавиатура выбора игрока и процента для шага 2"""
-    keyboard = []
-    
-    # Кнопки выбора игрока
-    labelA = f"✅ {playerA}" if selected_player == 'A' else playerA
-    labelB = f"✅ {playerB}" if selected_player == 'B' else playerB
-    keyboard.append([
-        InlineKeyboardButton(labelA, callback_data=f"op_{bet_id}_A"),
-        InlineKeyboardButton(labelB, callback_data=f"op_{bet_id}_B")
-    ])
-    
-    # Кнопки процентов (шаг 5)
-    percentages = list(range(5, 100, 5))  # 5, 10, 15, ... 95
-    for i in range(0, len(percentages), 5):
-        row = []
-        for pct in percentages[i:i+5]:
-            row.append(InlineKeyboardButton(f"{pct}%", callback_data=f"opct_{bet_id}_{pct}"))
-        keyboard.append(row)
-    
-    return keyboard
+    None — редактируемое пари за это время приняли или отменили, изменения не записаны.
+    """
+    async with bet_locks.hold(state['bet_id']):
+        if state['action'] == 'edit_step3':
+            bet = await asyncio.to_thread(get_bet, state['bet_id'])
+            if bet is None or bet.status != STATUS_OPEN:
+                return None
+            # При редактировании просто обновляем коэффициенты и сумму
+            await asyncio.to_thread(update_bet_step2, state['bet_id'], state['oddsA'], state['oddsB'])
+            await asyncio.to_thread(update_bet_stake, state['bet_id'], stake)
+        else:
+            # При создании публикуем пари
+            await asyncio.to_thread(update_bet_step3, state['bet_id'], stake)
+        return await asyncio.to_thread(get_bet, state['bet_id'])
 
 
 async def create_bet_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик создания пари (шаг 0 - название пари)"""
     user = update.effective_user
+    tenant = tenant_for_update(update)
     
     # Проверка доступа
-    if not is_allowed_player(user.username):
-        text = "❌ В пари могут играть только @Inzaaa и @TROOLZ"
+    if not is_allowed_player(user.username, tenant):
+        player1, player2 = tenant.players
+        text = f"❌ В пари могут играть только @{player1} и @{player2}"
         if update.callback_query:
             await update.callback_query.answer(text, show_alert=True)
             return
@@ -87,8 +103,7 @@ async def create_bet_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             pass
     
     # Создаем кнопки с готовыми названиями
-    keyboard = [[InlineKeyboardButton(name, callback_data=f"betname_{name}")] for name in BET_NAMES]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = bet_name_keyboard()
     
     # Обрабатываем как callback_query или message
     if update.callback_query:
@@ -110,10 +125,10 @@ async def create_bet_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
     
     # Сохраняем состояние
-    user_states[user.id] = {
+    await user_states.set(user.id, {
         'action': 'step0',
         'message_id': msg.message_id
-    }
+    })
 
 
 async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -121,18 +136,19 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user = update.effective_user
     text = update.message.text.strip()
     
-    if user.id not in user_states:
+    state = await user_states.get(user.id)
+    if state is None:
         try:
             await update.message.delete()
         except:
             pass
         return
     
-    state = user_states[user.id]
     
     if state['action'] == 'step0':
-        # Шаг 0: Название пари
-        bet_name = text
+        # Шаг 0: Название пари (готовое из каталога — в его написании)
+        known = catalog.find(KIND_BET_NAME, text)
+        bet_name = known.name if known else text
         
         # Удаляем сообщение пользователя
         try:
@@ -141,8 +157,7 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             pass
         
         # Создаем кнопки с игроками
-        keyboard = build_player_keyboard()
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = player_keyboard()
         
         # Переходим к шагу 1 - выбор матча
         msg = await context.bot.edit_message_text(
@@ -158,22 +173,17 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             reply_markup=reply_markup
         )
         
-        user_states[user.id] = {
+        await user_states.set(user.id, {
             'action': 'step1',
             'bet_name': bet_name,
             'message_id': msg.message_id,
             'selected_playerA': None,  # Для выбора через кнопки
             'selected_playerB': None
-        }
+        })
     
     elif state['action'] == 'step1':
         # Парсим матч - поддерживаем разделители "vs" и пробел
-        match_pattern_vs = r'^(.+?)\s+vs\s+(.+?)$'
-        match_pattern_space = r'^(\S+)\s+(\S+)$'
-        
-        match = re.match(match_pattern_vs, text, re.IGNORECASE)
-        if not match:
-            match = re.match(match_pattern_space, text, re.IGNORECASE)
+        match = MATCH_VS_RE.match(text) or MATCH_SPACE_RE.match(text)
         
         # Удаляем сообщение пользователя
         try:
@@ -182,9 +192,21 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             pass
         
         if not match:
+            # Одно слово — поиск игрока по началу имени и с опечатками
+            found = catalog.search(KIND_PLAYER, text)
+            if found:
+                await context.bot.edit_message_text(
+                    chat_id=update.effective_chat.id,
+                    message_id=state.get('message_id'),
+                    text="🔎 Похожие игроки:\n\n"
+                         "Выбери игрока из кнопок или введи матч: `inz vs troolz`",
+                    parse_mode='Markdown',
+                    reply_markup=catalog_keyboard(found, 2, state.get('selected_playerA'))
+                )
+                return
+            
             # Воссоздаем кнопки с игроками
-            keyboard = build_player_keyboard()
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = player_keyboard()
             
             await context.bot.edit_message_text(
                 chat_id=update.effective_chat.id,
@@ -198,8 +220,40 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             )
             return
         
-        playerA = match.group(1).strip()
-        playerB = match.group(2).strip()
+        # Имена из каталога: исправляется только регистр
+        playerA = catalog.resolve(KIND_PLAYER, match.group(1))
+        playerB = catalog.resolve(KIND_PLAYER, match.group(2))
+        
+        if playerA.lower() == playerB.lower():
+            await context.bot.edit_message_text(
+                chat_id=update.effective_chat.id,
+                message_id=state.get('message_id'),
+                text=f"{SAME_PLAYERS_TEXT}\n\nВведи матч еще раз или выбери игроков из кнопок:",
+                reply_markup=player_keyboard(state.get('selected_playerA'))
+            )
+            return
+        
+        # Имени нет в списке, но есть похожие: предлагаем их кнопками, а тот же матч,
+        # отправленный еще раз, принимается как написан (новый игрок с близким именем)
+        similar = {}
+        for name in (playerA, playerB):
+            if catalog.find(KIND_PLAYER, name) is None:
+                similar.update((item.id, item) for item in catalog.search(KIND_PLAYER, name))
+        if similar and state.get('typed_match') != text.lower():
+            state['typed_match'] = text.lower()
+            if catalog.find(KIND_PLAYER, playerA) is not None:
+                # Первый игрок найден точно: кнопка похожего выбирает второго
+                state['selected_playerA'] = playerA
+            await user_states.set(user.id, state)
+            await context.bot.edit_message_text(
+                chat_id=update.effective_chat.id,
+                message_id=state.get('message_id'),
+                text="🔎 Похожие игроки из списка:\n\n"
+                     "Выбери игроков из кнопок или отправь тот же матч еще раз, "
+                     "чтобы оставить имена как написаны",
+                reply_markup=catalog_keyboard(similar.values(), 2, state.get('selected_playerA'))
+            )
+            return
         
         # Создаем пари в статусе DRAFT
         new_bet = Bet(
@@ -207,7 +261,7 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             maker_user_id=user.id,
             maker_username=user.username or user.first_name,
             taker_user_id=None,
-            taker_username=get_other_player(user.username),
+            taker_username=get_other_player(user.username, tenant_for_update(update)),
             bet_name=state.get('bet_name'),
             playerA_name=playerA,
             playerB_name=playerB,
@@ -217,14 +271,16 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             status=STATUS_DRAFT,
             taker_side=None,
             result=None,
-            created_at=datetime.now()
+            created_at=datetime.now(),
+            tenant_id=tenant_for_update(update).id,
+            chat_id=update.effective_chat.id
         )
         
-        bet_id = create_bet(new_bet)
+        bet_id = await asyncio.to_thread(create_bet, new_bet)
+        catalog.record_bet(state.get('bet_name'), playerA, playerB)
         
         # Клавиатура выбора игрока + процент
-        keyboard = build_odds_keyboard(bet_id, playerA, playerB)
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = odds_keyboard(bet_id, playerA, playerB)
         # Обновляем сообщение для шага 2
         msg = await context.bot.edit_message_text(
             chat_id=update.effective_chat.id,
@@ -238,7 +294,7 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             reply_markup=reply_markup
         )
         
-        user_states[user.id] = {
+        await user_states.set(user.id, {
             'action': 'step2',
             'bet_id': bet_id,
             'bet_name': state.get('bet_name'),
@@ -246,7 +302,7 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             'playerB': playerB,
             'message_id': msg.message_id,
             'selected_odds_player': None
-        }
+        })
     
     elif state['action'] == 'step2' or state['action'] == 'edit_step2':
         # Парсим формат "Имя процент"
@@ -260,12 +316,10 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             pass
         
         # Парсим формат "Имя процент"
-        percent_pattern = r'^(.+?)\s+(\d+\.?\d*)$'
-        match = re.match(percent_pattern, text.strip())
+        match = PERCENT_RE.match(text.strip())
         
         if not match:
-            keyboard = build_odds_keyboard(state['bet_id'], state['playerA'], state['playerB'], state.get('selected_odds_player'))
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = odds_keyboard(state['bet_id'], state['playerA'], state['playerB'], state.get('selected_odds_player'))
             await context.bot.edit_message_text(
                 chat_id=update.effective_chat.id,
                 message_id=state.get('message_id'),
@@ -309,25 +363,14 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 )
                 return
             
-            # Вычисляем коэффициенты: коэф = 100 / процент
-            oddsA = round(100 / percentA, 2)
-            oddsB = round(100 / percentB, 2)
+            # Вычисляем коэффициенты: коэф = 100 / процент (с маржой ODDS_MARGIN)
+            oddsA, oddsB = price_pair(percentA)
             
             # Обновляем коэффициенты
-            update_bet_step2(state['bet_id'], oddsA, oddsB)
+            await asyncio.to_thread(update_bet_step2, state['bet_id'], oddsA, oddsB)
             
             # Создаем клавиатуру с готовыми суммами
-            keyboard = [
-                [
-                    InlineKeyboardButton("500 ₽", callback_data=f"stake_{state['bet_id']}_500"),
-                    InlineKeyboardButton("1000 ₽", callback_data=f"stake_{state['bet_id']}_1000")
-                ],
-                [
-                    InlineKeyboardButton("1500 ₽", callback_data=f"stake_{state['bet_id']}_1500"),
-                    InlineKeyboardButton("2000 ₽", callback_data=f"stake_{state['bet_id']}_2000")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = stake_keyboard(state['bet_id'])
             
             # Обновляем сообщение для шага 3
             msg = await context.bot.edit_message_text(
@@ -337,8 +380,8 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
                      f"Название: {state.get('bet_name')}\n"
                      f"Матч: {state['playerA']} vs {state['playerB']}\n\n"
                      f"Проценты и коэффициенты:\n"
-                     f"{state['playerA']} — {percentA:.0f}% → `{oddsA:.2f}`\n"
-                     f"{state['playerB']} — {percentB:.0f}% → `{oddsB:.2f}`\n\n"
+                     f"{state['playerA']} — {percentA:.0f}% → `{format_odds(oddsA)}`\n"
+                     f"{state['playerB']} — {percentB:.0f}% → `{format_odds(oddsB)}`\n\n"
                      f"Введи сумму ставки (₽) или выбери из кнопок:",
                 parse_mode='Markdown',
                 reply_markup=reply_markup
@@ -347,7 +390,7 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             # Определяем следующий шаг - step3 или edit_step3
             next_action = 'edit_step3' if state['action'] == 'edit_step2' else 'step3'
             
-            user_states[user.id] = {
+            await user_states.set(user.id, {
                 'action': next_action,
                 'bet_id': state['bet_id'],
                 'bet_name': state.get('bet_name'),
@@ -358,7 +401,7 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 'percentA': percentA,
                 'percentB': percentB,
                 'message_id': msg.message_id
-            }
+            })
             
         except ValueError:
             await context.bot.edit_message_text(
@@ -388,42 +431,23 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 )
                 return
             
-            # Обновляем данные в зависимости от режима
-            if state['action'] == 'edit_step3':
-                # При редактировании просто обновляем коэффициенты и сумму
-                update_bet_step2(state['bet_id'], state['oddsA'], state['oddsB'])
-                from database.db import get_connection
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute('UPDATE bets SET stake = ? WHERE id = ?', (stake, state['bet_id']))
-                conn.commit()
-                conn.close()
-            else:
-                # При создании публикуем пари
-                update_bet_step3(state['bet_id'], stake)
-            
-            # Получаем пари для отображения
-            bet = get_bet(state['bet_id'])
+            bet = await save_stake(state, stake)
             
             # Удаляем состояние пользователя
-            del user_states[user.id]
+            await user_states.delete(user.id)
+            
+            if bet is None:
+                await context.bot.edit_message_text(
+                    chat_id=update.effective_chat.id,
+                    message_id=state.get('message_id'),
+                    text=STALE_EDIT_TEXT
+                )
+                return
             
             # Формируем карточку пари
             card_text = format_bet_card(bet)
             
-            keyboard = [
-                [
-                    InlineKeyboardButton(f"🟢 За {bet.playerA_name} ({bet.oddsA:.2f})", callback_data=f"side_{bet.id}_A"),
-                ],
-                [
-                    InlineKeyboardButton(f"🔵 За {bet.playerB_name} ({bet.oddsB:.2f})", callback_data=f"side_{bet.id}_B"),
-                ],
-                [
-                    InlineKeyboardButton("✏️ Изменить", callback_data=f"edit_{bet.id}"),
-                    InlineKeyboardButton("🗑 Отменить", callback_data=f"cancel_{bet.id}")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = OPEN_BET_TEMPLATE.render(**bet_params(bet))
             
             await context.bot.edit_message_text(
                 chat_id=update.effective_chat.id,
@@ -433,6 +457,10 @@ async def bet_wizard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 parse_mode='Markdown'
             )
             
+            # После изменения пари обновляются и другие сообщения с ним
+            view = CardView(VIEW_CARD, update.effective_chat.id, state.get('message_id'), bet_id=bet.id)
+            await live_cards.publish(context.bot, view, bet)
+            
         except ValueError:
             try:
                 await update.message.delete()
@@ -467,9 +495,9 @@ def format_bet_card(bet: Bet) -> str:
             # Показываем кто на какой стороне прямо на кэфах
             playerA_backer = bet.taker_username if bet.taker_side == 'A' else bet.maker_username
             playerB_backer = bet.taker_username if bet.taker_side == 'B' else bet.maker_username
-            text += f"{bet.playerA_name} — `{bet.oddsA:.2f}` ({playerA_backer}) | {bet.playerB_name} — `{bet.oddsB:.2f}` ({playerB_backer})\n"
+            text += f"{bet.playerA_name} — `{format_odds(bet.oddsA)}` ({playerA_backer}) | {bet.playerB_name} — `{format_odds(bet.oddsB)}` ({playerB_backer})\n"
         else:
-            text += f"{bet.playerA_name} — `{bet.oddsA:.2f}` | {bet.playerB_name} — `{bet.oddsB:.2f}`\n"
+            text += f"{bet.playerA_name} — `{format_odds(bet.oddsA)}` | {bet.playerB_name} — `{format_odds(bet.oddsB)}`\n"
     else:
         text += f"{bet.playerA_name} vs {bet.playerB_name}\n"
     
@@ -496,23 +524,42 @@ def format_bet_card(bet: Bet) -> str:
     return text
 
 
+def can_reset_statistics(update: Update) -> bool:
+    """Сбросить статистику пары чата могут ее игроки и администраторы"""
+    username = update.effective_user.username
+    return tenant_for_update(update).is_player(username) or is_admin(username)
+
+
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик callback-запросов"""
     query = update.callback_query
     user = update.effective_user
-    data = query.data
     
-    if data.startswith('betname_'):
-        # Выбор названия пари через кнопку
-        bet_name = data.split('_', 1)[1]
+    # Данные кнопки разбираются один раз (services/callbacks.py), дальше — только поля
+    try:
+        callback = await decode_callback(query.data)
+    except CallbackError:
+        await query.answer("❌ Ошибка формата callback", show_alert=True)
+        return
+    if callback is None:
+        await query.answer("❌ Кнопка устарела, открой меню заново", show_alert=True)
+        return
+    action, args = callback.action, callback.args
+    
+    if action == 'bn':
+        # Выбор названия пари через кнопку (в кнопках, отправленных до каталога, — само название)
+        bet_name = catalog.name_for(KIND_BET_NAME, args[0])
+        if bet_name is None:
+            await query.answer("❌ Название удалено из списка, введи его вручную", show_alert=True)
+            return
         
-        if user.id not in user_states or user_states[user.id]['action'] != 'step0':
+        state = await user_states.get(user.id)
+        if state is None or state['action'] != 'step0':
             await query.answer("❌ Сессия создания пари истекла. Начните заново.", show_alert=True)
             return
         
         # Создаем кнопки с игроками
-        keyboard = build_player_keyboard()
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = player_keyboard()
         
         # Переходим к шагу 1
         await query.edit_message_text(
@@ -526,32 +573,34 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=reply_markup
         )
         
-        user_states[user.id] = {
+        await user_states.set(user.id, {
             'action': 'step1',
             'bet_name': bet_name,
             'message_id': query.message.message_id,
             'selected_playerA': None,
             'selected_playerB': None
-        }
+        })
     
-    elif data.startswith('player_'):
-        # Выбор игрока через кнопку
-        player_name = data.split('_', 1)[1]
+    elif action == 'pl':
+        # Выбор игрока через кнопку (в кнопках, отправленных до каталога, — само имя)
+        player_name = catalog.name_for(KIND_PLAYER, args[0])
+        if player_name is None:
+            await query.answer("❌ Игрок удален из списка, введи имя вручную", show_alert=True)
+            return
         
-        if user.id not in user_states or user_states[user.id]['action'] != 'step1':
+        state = await user_states.get(user.id)
+        if state is None or state['action'] != 'step1':
             await query.answer("❌ Сессия создания пари истекла. Начните заново.", show_alert=True)
             return
         
-        state = user_states[user.id]
-        
         # Если первый игрок еще не выбран
         if state.get('selected_playerA') is None:
             state['selected_playerA'] = player_name
+            await user_states.set(user.id, state)
             await query.answer(f"Выбран первый игрок: {player_name}")
             
             # Обновляем сообщение — подсвечиваем выбранного игрока
-            keyboard = build_player_keyboard(selected_player=player_name)
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = player_keyboard(selected_player=player_name)
             
             await query.edit_message_text(
                 f"Шаг 1/4 — Матч\n\n"
@@ -562,6 +611,8 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=reply_markup
             )
         # Если первый игрок уже выбран, выбираем второго
+        elif state['selected_playerA'].lower() == player_name.lower():
+            await query.answer(SAME_PLAYERS_TEXT, show_alert=True)
         else:
             await query.answer()
             playerA = state['selected_playerA']
@@ -573,7 +624,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 maker_user_id=user.id,
                 maker_username=user.username or user.first_name,
                 taker_user_id=None,
-                taker_username=get_other_player(user.username),
+                taker_username=get_other_player(user.username, tenant_for_update(update)),
                 bet_name=state.get('bet_name'),
                 playerA_name=playerA,
                 playerB_name=playerB,
@@ -583,14 +634,16 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 status=STATUS_DRAFT,
                 taker_side=None,
                 result=None,
-                created_at=datetime.now()
+                created_at=datetime.now(),
+                tenant_id=tenant_for_update(update).id,
+                chat_id=update.effective_chat.id
             )
             
-            bet_id = create_bet(new_bet)
+            bet_id = await asyncio.to_thread(create_bet, new_bet)
+            catalog.record_bet(state.get('bet_name'), playerA, playerB)
             
             # Клавиатура выбора игрока + процент
-            keyboard = build_odds_keyboard(bet_id, playerA, playerB)
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = odds_keyboard(bet_id, playerA, playerB)
             # Переходим к шагу 2
             msg = await query.edit_message_text(
                 f"Шаг 2/4 — Проценты и коэффициенты\n\n"
@@ -602,7 +655,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=reply_markup
             )
             
-            user_states[user.id] = {
+            await user_states.set(user.id, {
                 'action': 'step2',
                 'bet_id': bet_id,
                 'bet_name': state.get('bet_name'),
@@ -610,12 +663,19 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 'playerB': playerB,
                 'message_id': msg.message_id,
                 'selected_odds_player': None
-            }
+            })
     
-    elif data.startswith('menu_'):
+    elif action == 'menu':
         # Обработка меню
+        menu_action = args[0]
+        if menu_action == 'reset_stats' and not can_reset_statistics(update):
+            await query.answer(RESET_FORBIDDEN_TEXT, show_alert=True)
+            return
         await query.answer()
-        menu_action = data.split('_', 1)[1]
+        
+        # Сообщение уходит с карточки или списка пари (пинок пса отправляет новое сообщение)
+        if menu_action != 'kick_dog':
+            await live_cards.release(query_view(query).key)
         
         if menu_action == 'create_bet':
             await create_bet_handler(update, context)
@@ -630,97 +690,82 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif menu_action == 'kick_dog':
             await handle_kick_dog(update, context)
         elif menu_action == 'back':
-            from handlers.start import start_handler
             await start_handler(update, context)
     
-    elif data.startswith('take_'):
+    elif action == 'take':
         # Принятие пари
-        bet_id = int(data.split('_')[1])
-        await handle_take_bet(update, context, bet_id)
+        await handle_take_bet(update, context, args[0])
     
-    elif data.startswith('side_'):
-        # Выбор стороны        
-        parts = data.split('_')
-        
-        # Формат: side_{bet_id}_{side}
-        if len(parts) >= 3:
-            bet_id = int(parts[1])
-            side = parts[2]  # 'A' или 'B'
-        else:
-            await query.answer("❌ Ошибка формата callback", show_alert=True)
-            return
-        
-        try:
-            await handle_select_side(update, context, bet_id, side)
-        except Exception as e:
-            raise
+    elif action == 'side':
+        # Выбор стороны: ID пари, 'A' или 'B'
+        bet_id, side = args
+        await handle_select_side(update, context, bet_id, side)
     
-    elif data.startswith('result_menu_'):
+    elif action == 'result_menu':
         # Меню выбора результата
         await query.answer()
-        bet_id = int(data.split('_')[2])
-        await show_result_menu(update, context, bet_id)
+        await show_result_menu(update, context, args[0])
     
-    elif data.startswith('result_'):
-        # Проставление результата
-        await query.answer()
-        parts = data.split('_')
-        bet_id = int(parts[1])
-        result = parts[2]  # 'A', 'B', 'VOID'
+    elif action == 'result':
+        # Проставление результата: ID пари, 'A', 'B' или 'VOID'
+        # (обработчики под блокировкой пари отвечают на нажатие сами, ровно один раз)
+        bet_id, result = args
         await handle_set_result(update, context, bet_id, result)
     
-    elif data.startswith('noop_'):
+    elif action == 'noop':
         # Кнопка-заголовок, ничего не делает
         await query.answer()
         return
     
-    elif data == 'reset_confirm':
-        # Подтверждение сброса статистики
+    elif action == 'reset_confirm':
+        # Подтверждение сброса статистики: только игроки пары чата или администратор
+        if not can_reset_statistics(update):
+            await query.answer(RESET_FORBIDDEN_TEXT, show_alert=True)
+            return
         await query.answer()
-        from database.db import reset_statistics
-        reset_statistics()
+        await asyncio.to_thread(reset_statistics, tenant_for_update(update).id, user.id)
         await query.edit_message_text(
             "✅ Статистика успешно сброшена!\n\n"
             "Период начинается с текущей даты."
         )
     
-    elif data.startswith('stats_'):
+    elif action == 'jobcancel':
+        # Отмена фонового задания его автором
+        if jobs.cancel(args[0], user.id):
+            await query.answer("Задание отменяется")
+        else:
+            await query.answer("Задание уже завершено", show_alert=True)
+    
+    elif action == 'stats':
         # Фильтр статистики по периоду
         await query.answer()
-        period = data.split('_')[1]
-        await show_statistics_by_period(update, context, period)
+        await show_statistics_by_period(update, context, args[0])
     
-    elif data.startswith('cancel_'):
+    elif action == 'cancel':
         # Отмена пари
-        await query.answer()
-        bet_id = int(data.split('_')[1])
-        await handle_cancel_bet(update, context, bet_id)
+        await handle_cancel_bet(update, context, args[0])
     
-    elif data.startswith('stake_'):
+    elif action == 'stake':
         # Выбор готовой суммы ставки
         await query.answer()
-        parts = data.split('_')
-        bet_id = int(parts[1])
-        stake = float(parts[2])
-        await handle_stake_selection(update, context, bet_id, stake)
+        bet_id, stake = args
+        await handle_stake_selection(update, context, bet_id, float(stake))
     
-    elif data.startswith('op_'):
+    elif action == 'op':
         # Выбор игрока для процента на шаге 2
         await query.answer()
-        parts = data.split('_')
-        bet_id = int(parts[1])
-        side = parts[2]  # 'A' or 'B'
+        bet_id, side = args  # 'A' or 'B'
         
-        if user.id not in user_states or user_states[user.id]['action'] not in ('step2', 'edit_step2'):
+        state = await user_states.get(user.id)
+        if state is None or state['action'] not in ('step2', 'edit_step2'):
             await query.answer("❌ Сессия создания пари истекла", show_alert=True)
             return
         
-        state = user_states[user.id]
         state['selected_odds_player'] = side
+        await user_states.set(user.id, state)
         
         # Перестраиваем клавиатуру с подсветкой выбранного игрока
-        keyboard = build_odds_keyboard(bet_id, state['playerA'], state['playerB'], selected_player=side)
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = odds_keyboard(bet_id, state['playerA'], state['playerB'], selected_player=side)
         
         selected_name = state['playerA'] if side == 'A' else state['playerB']
         
@@ -734,18 +779,15 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=reply_markup
         )
     
-    elif data.startswith('opct_'):
+    elif action == 'opct':
         # Выбор процента для выбранного игрока на шаге 2
-        parts = data.split('_')
-        bet_id = int(parts[1])
-        pct = int(parts[2])
+        bet_id, pct = args
         
-        if user.id not in user_states or user_states[user.id]['action'] not in ('step2', 'edit_step2'):
+        state = await user_states.get(user.id)
+        if state is None or state['action'] not in ('step2', 'edit_step2'):
             await query.answer("❌ Сессия создания пари истекла", show_alert=True)
             return
         
-        state = user_states[user.id]
-        
         if not state.get('selected_odds_player'):
             await query.answer("⚠️ Сначала выбери игрока!", show_alert=True)
             return
@@ -761,30 +803,19 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             percentB = pct
             percentA = 100 - pct
         
-        oddsA = round(100 / percentA, 2)
-        oddsB = round(100 / percentB, 2)
+        oddsA, oddsB = price_pair(percentA)
         
         # Обновляем в БД
-        update_bet_step2(state['bet_id'], oddsA, oddsB)
+        await asyncio.to_thread(update_bet_step2, state['bet_id'], oddsA, oddsB)
         
         # Клавиатура шага 3
-        keyboard = [
-            [
-                InlineKeyboardButton("500 ₽", callback_data=f"stake_{state['bet_id']}_500"),
-                InlineKeyboardButton("1000 ₽", callback_data=f"stake_{state['bet_id']}_1000")
-            ],
-            [
-                InlineKeyboardButton("1500 ₽", callback_data=f"stake_{state['bet_id']}_1500"),
-                InlineKeyboardButton("2000 ₽", callback_data=f"stake_{state['bet_id']}_2000")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = stake_keyboard(state['bet_id'])
         
         msg = await query.edit_message_text(
             f"Шаг 3/4 — Сумма ставки\n\n"
             f"Название: {state.get('bet_name')}\n"
-            f"{state['playerA']} — {percentA:.0f}% → `{oddsA:.2f}`\n"
-            f"{state['playerB']} — {percentB:.0f}% → `{oddsB:.2f}`\n\n"
+            f"{state['playerA']} — {percentA:.0f}% → `{format_odds(oddsA)}`\n"
+            f"{state['playerB']} — {percentB:.0f}% → `{format_odds(oddsB)}`\n\n"
             f"Введи сумму ставки (₽) или выбери из кнопок:",
             parse_mode='Markdown',
             reply_markup=reply_markup
@@ -792,7 +823,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         next_action = 'edit_step3' if state['action'] == 'edit_step2' else 'step3'
         
-        user_states[user.id] = {
+        await user_states.set(user.id, {
             'action': next_action,
             'bet_id': state['bet_id'],
             'bet_name': state.get('bet_name'),
@@ -803,26 +834,21 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'percentA': percentA,
             'percentB': percentB,
             'message_id': msg.message_id
-        }
+        })
     
-    elif data.startswith('chresult_menu_'):
+    elif action == 'chresult_menu':
         # Меню изменения результата
         await query.answer()
-        bet_id = int(data.split('_')[2])
-        await show_change_result_menu(update, context, bet_id)
+        await show_change_result_menu(update, context, args[0])
     
-    elif data.startswith('chresult_'):
+    elif action == 'chresult':
         # Изменение результата
-        await query.answer()
-        parts = data.split('_')
-        bet_id = int(parts[1])
-        new_result = parts[2]
+        bet_id, new_result = args
         await handle_change_result(update, context, bet_id, new_result)
     
-    elif data.startswith('edit_'):
+    elif action == 'edit':
         # Редактирование пари
-        bet_id = int(data.split('_')[1])
-        await handle_edit_bet(update, context, bet_id)
+        await handle_edit_bet(update, context, args[0])
 
 
 async def handle_take_bet(update: Update, context: ContextTypes.DEFAULT_TYPE, bet_id: int):
@@ -830,18 +856,17 @@ async def handle_take_bet(update: Update, context: ContextTypes.DEFAULT_TYPE, be
     query = update.callback_query
     user = update.effective_user
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     if not bet:
         await query.edit_message_text("❌ Пари не найдено!")
         return
     
     # Проверка доступа
-    if not is_allowed_player(user.username):
+    if not is_allowed_player(user.username, tenants.get(bet.tenant_id)):
         await query.answer("❌ Выбор стороны доступен только второму игроку", show_alert=True)
         return
     
     # Проверка, что пользователь - taker
-    from config import TEST_MODE
     if not TEST_MODE and (not user.username or user.username.lower() != bet.taker_username.lower()):
         await query.answer("❌ Выбор стороны доступен только второму игроку", show_alert=True)
         return
@@ -851,46 +876,32 @@ async def handle_take_bet(update: Update, context: ContextTypes.DEFAULT_TYPE, be
         return
     
     # Показываем кнопки выбора стороны
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                f"🟢 За {bet.playerA_name} ({bet.oddsA:.2f})",
-                callback_data=f"side_{bet_id}_A"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                f"🔵 За {bet.playerB_name} ({bet.oddsB:.2f})",
-                callback_data=f"side_{bet_id}_B"
-            )
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = SELECT_SIDE_TEMPLATE.render(**bet_params(bet))
     
     await query.edit_message_text(
         f"Выбери сторону для ставки:\n\n"
         f"*{bet.playerA_name}* vs *{bet.playerB_name}*\n"
-        f"Коэффициенты: `{bet.oddsA:.2f}` / `{bet.oddsB:.2f}`\n"
+        f"Коэффициенты: `{format_odds(bet.oddsA)}` / `{format_odds(bet.oddsB)}`\n"
         f"Сумма: {format_money(bet.stake)}",
         reply_markup=reply_markup,
         parse_mode='Markdown'
     )
 
 
+@bet_locks.locked
 async def handle_select_side(update: Update, context: ContextTypes.DEFAULT_TYPE, bet_id: int, side: str):
     """Обработка выбора стороны"""
     query = update.callback_query
     user = update.effective_user
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     if not bet:
+        await query.answer()
         await query.edit_message_text("❌ Пари не найдено!")
         return
     
     # Проверка доступа
     # В тестовом режиме разрешаем maker также быть taker
-    from config import TEST_MODE
     if not TEST_MODE and (not user.username or user.username.lower() != bet.taker_username.lower()):
         await query.answer("❌ Выбор стороны доступен только второму игроку", show_alert=True)
         return
@@ -900,32 +911,29 @@ async def handle_select_side(update: Update, context: ContextTypes.DEFAULT_TYPE,
         await query.answer("❌ Пари уже принято или отменено", show_alert=True)
         return
     
-    # Принимаем пари
-    from database.db import update_taker_user_id
-    update_taker_user_id(bet_id, user.id)
-    take_bet(bet_id, user.id, side)
+    # Принимаем пари (take_bet записывает и taker_user_id)
+    if not await asyncio.to_thread(take_bet, bet_id, user.id, side):
+        await query.answer(BET_CHANGED_TEXT, show_alert=True)
+        return
     
     # Обновляем пари
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     
     # Формируем карточку
     card_text = format_bet_card(bet)
     
-    keyboard = [
-        [
-            InlineKeyboardButton("🏁 Указать результат", callback_data=f"result_menu_{bet_id}"),
-        ],
-        [
-            InlineKeyboardButton("📌 В актуальные", callback_data="menu_active_bets")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Карточка из inline-режима (в чужом чате) — без перехода к спискам бота
+    template = INLINE_TAKEN_TEMPLATE if query.inline_message_id else TAKEN_BET_TEMPLATE
+    reply_markup = template.render(bet_id=bet_id)
     
+    await query.answer()
     try:
         await query.edit_message_text(card_text, reply_markup=reply_markup, parse_mode='Markdown')
     except Exception as e:
         raise
+    
+    # Остальные сообщения с этим пари (карточки в других чатах, списки) — одной пачкой правок
+    await live_cards.publish(context.bot, query_view(query, bet_id=bet_id), bet)
 
 
 async def show_result_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, bet_id: int):
@@ -933,13 +941,13 @@ async def show_result_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, b
     query = update.callback_query
     user = update.effective_user
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     if not bet:
         await query.edit_message_text("❌ Пари не найдено!")
         return
     
     # Проверка доступа
-    if not is_allowed_player(user.username):
+    if not is_allowed_player(user.username, tenants.get(bet.tenant_id)):
         await query.answer("❌ Только игроки могут проставлять результат", show_alert=True)
         return
     
@@ -947,19 +955,7 @@ async def show_result_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, b
         await query.answer("❌ Пари еще не принято", show_alert=True)
         return
     
-    keyboard = [
-        [
-            InlineKeyboardButton(f"🏆 Победил {bet.playerA_name}", callback_data=f"result_{bet_id}_A")
-        ],
-        [
-            InlineKeyboardButton(f"🏆 Победил {bet.playerB_name}", callback_data=f"result_{bet_id}_B")
-        ],
-        [
-            InlineKeyboardButton("🚫 VOID (отмена матча)", callback_data=f"result_{bet_id}_VOID")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)    
+    reply_markup = RESULT_TEMPLATE.render(bet_id=bet_id, playerA=bet.playerA_name, playerB=bet.playerB_name)
     # Экранируем специальные markdown-символы в именах
     def escape_markdown(text):
         """Экранирует специальные символы для Markdown"""
@@ -984,18 +980,20 @@ async def show_result_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, b
         raise
 
 
+@bet_locks.locked
 async def handle_set_result(update: Update, context: ContextTypes.DEFAULT_TYPE, bet_id: int, result: str):
     """Обработка проставления результата"""
     query = update.callback_query
     user = update.effective_user
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     if not bet:
+        await query.answer()
         await query.edit_message_text("❌ Пари не найдено!")
         return
     
     # Проверка доступа
-    if not is_allowed_player(user.username):
+    if not is_allowed_player(user.username, tenants.get(bet.tenant_id)):
         await query.answer("❌ Только игроки могут проставлять результат", show_alert=True)
         return
     
@@ -1004,21 +1002,64 @@ async def handle_set_result(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
     
     # Устанавливаем результат
-    set_bet_result(bet_id, result)
+    if not await asyncio.to_thread(set_bet_result, bet_id, result, user.id):
+        await query.answer(BET_CHANGED_TEXT, show_alert=True)
+        return
     
     # Обновляем пари
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     
     # Формируем карточку
     card_text = format_bet_card(bet)
     
+    await query.answer()
     await query.edit_message_text(card_text, parse_mode='Markdown')
+    await live_cards.publish(context.bot, query_view(query, bet_id=bet_id), bet)
+
+
+def format_statistics(stats: dict, period_text: str, start_date=None, now=None) -> str:
+    """Текст экрана статистики"""
+    text = f"📊 *Статистика*\n\n"
+    text += f"Период: {period_text}\n\n"
+    
+    if start_date:
+        text += f"С {start_date.strftime('%d.%m.%Y')} по {now.strftime('%d.%m.%Y')}\n\n"
+    
+    for username, user_stats in stats.items():
+        text += f"*{username}*\n"
+        text += f"Баланс: {format_money(user_stats['total_balance'], signed=True)}\n"
+        text += f"Пари: {user_stats['total_bets']}\n"
+        text += f"Победы: {user_stats['wins']} | Поражения: {user_stats['losses']}\n\n"
+    
+    return text
+
+
+async def show_statistics_job(update: Update, context: ContextTypes.DEFAULT_TYPE, period_text: str,
+                              start_date=None, now=None):
+    """Статистика за длинный период: расчет в пуле процессов с ходом выполнения в сообщении"""
+    tenant = tenant_for_update(update)
+    params = {
+        'tenant_id': tenant.id,
+        # Начало периода с точностью до минуты: повторные запросы попадают в кэш заданий
+        'start': start_date.replace(second=0, microsecond=0).isoformat() if start_date else None,
+        'user_ids': users.user_ids(tenant.players),
+    }
+    job = await jobs.submit('statistics', params, f"Статистика: {period_text}", update.effective_user.id)
+    
+    if update.callback_query:
+        message = update.callback_query.message
+    else:
+        message = await update.message.reply_text(f"⏳ Статистика: {period_text}")
+    
+    def render(stats):
+        text = format_statistics(stats, period_text, start_date, now)
+        return text, STATISTICS_KEYBOARD
+    
+    await jobs.present(job, context.bot, message.chat_id, message.message_id, render, STATISTICS_KEYBOARD.inline_keyboard)
 
 
 async def show_statistics_by_period(update: Update, context: ContextTypes.DEFAULT_TYPE, period: str):
     """Показ статистики за период"""
-    from database.db import get_all_statistics
-    from datetime import datetime, timedelta
     
     now = datetime.now()
     start_date = None
@@ -1035,35 +1076,15 @@ async def show_statistics_by_period(update: Update, context: ContextTypes.DEFAUL
     else:
         period_text = "Все время"
     
-    stats = get_all_statistics(start_date, now)
-    
-    text = f"📊 *Статистика*\n\n"
-    text += f"Период: {period_text}\n\n"
-    
-    if start_date:
-        text += f"С {start_date.strftime('%d.%m.%Y')} по {now.strftime('%d.%m.%Y')}\n\n"
-    
-    for username, user_stats in stats.items():
-        text += f"*{username}*\n"
-        text += f"Баланс: {format_money(user_stats['total_balance'], signed=True)}\n"
-        text += f"Пари: {user_stats['total_bets']}\n"
-        text += f"Победы: {user_stats['wins']} | Поражения: {user_stats['losses']}\n\n"
+    if period in LONG_STATS_PERIODS:
+        await show_statistics_job(update, context, period_text, start_date, now)
+        return
     
-    keyboard = [
-        [
-            InlineKeyboardButton("Сегодня", callback_data="stats_today"),
-            InlineKeyboardButton("7 дней", callback_data="stats_7d")
-        ],
-        [
-            InlineKeyboardButton("30 дней", callback_data="stats_30d"),
-            InlineKeyboardButton("Все время", callback_data="stats_all")
-        ],
-        [
-            InlineKeyboardButton("🔙 Главное меню", callback_data="menu_back")
-        ]
-    ]
+    # Снимок сводки или прошлого расчета, пока данные не менялись
+    stats, start_date, as_of = await statistics_snapshot(tenant_for_update(update), period, now)
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    text = format_statistics(stats, period_text, start_date, as_of)
+    reply_markup = STATISTICS_KEYBOARD
     
     await update.callback_query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
 
@@ -1073,7 +1094,7 @@ async def handle_edit_bet(update: Update, context: ContextTypes.DEFAULT_TYPE, be
     query = update.callback_query
     user = update.effective_user
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     if not bet:
         await query.edit_message_text("❌ Пари не найдено!")
         return
@@ -1090,7 +1111,7 @@ async def handle_edit_bet(update: Update, context: ContextTypes.DEFAULT_TYPE, be
     
     # Начинаем визард редактирования с шага 2 (коэффициенты)
     # Сохраняем состояние для редактирования
-    user_states[user.id] = {
+    await user_states.set(user.id, {
         'action': 'edit_step2',
         'bet_id': bet_id,
         'bet_name': bet.bet_name,
@@ -1098,26 +1119,28 @@ async def handle_edit_bet(update: Update, context: ContextTypes.DEFAULT_TYPE, be
         'playerB': bet.playerB_name,
         'message_id': query.message.message_id,
         'selected_odds_player': None
-    }
+    })
+    
+    # Сообщение становится визардом: правки карточки его больше не трогают
+    await live_cards.release(query_view(query).key)
     
     # Показываем шаг 2 - редактирование коэффициентов
     bet_name_text = f"Название: {bet.bet_name}\n" if bet.bet_name else ""
     
     # Вычисляем текущие проценты из коэффициентов (обратная формула)
-    current_percentA = round(100 / bet.oddsA, 1) if bet.oddsA else 50
-    current_percentB = round(100 / bet.oddsB, 1) if bet.oddsB else 50
+    current_percentA = percent_for(bet.oddsA)
+    current_percentB = percent_for(bet.oddsB)
     
     # Кнопки выбора игрока + процент
-    keyboard = build_odds_keyboard(bet_id, bet.playerA_name, bet.playerB_name)
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = odds_keyboard(bet_id, bet.playerA_name, bet.playerB_name)
     
     await query.edit_message_text(
         f"✏️ Редактирование пари #{bet_id}\n\n"
         f"{bet_name_text}"
         f"Матч: {bet.playerA_name} vs {bet.playerB_name}\n\n"
         f"Текущие значения:\n"
-        f"{bet.playerA_name} — {current_percentA:.0f}% → `{bet.oddsA:.2f}`\n"
-        f"{bet.playerB_name} — {current_percentB:.0f}% → `{bet.oddsB:.2f}`\n\n"
+        f"{bet.playerA_name} — {current_percentA:.0f}% → `{format_odds(bet.oddsA)}`\n"
+        f"{bet.playerB_name} — {current_percentB:.0f}% → `{format_odds(bet.oddsB)}`\n\n"
         f"Выбери игрока и процент или введи вручную: `{bet.playerA_name} 60`",
         parse_mode='Markdown',
         reply_markup=reply_markup
@@ -1130,12 +1153,11 @@ async def handle_stake_selection(update: Update, context: ContextTypes.DEFAULT_T
     user = update.effective_user
     
     # Проверяем, что у пользователя есть активное состояние
-    if user.id not in user_states:
+    state = await user_states.get(user.id)
+    if state is None:
         await query.answer("❌ Сессия создания пари истекла. Начните заново.", show_alert=True)
         return
     
-    state = user_states[user.id]
-    
     # Проверяем, что мы на правильном шаге
     if state['action'] not in ['step3', 'edit_step3']:
         await query.answer("❌ Ошибка: неверный шаг", show_alert=True)
@@ -1146,58 +1168,37 @@ async def handle_stake_selection(update: Update, context: ContextTypes.DEFAULT_T
         await query.answer("❌ Ошибка: несоответствие ID пари", show_alert=True)
         return
     
-    # Обновляем данные в зависимости от режима
-    if state['action'] == 'edit_step3':
-        # При редактировании просто обновляем коэффициенты и сумму
-        update_bet_step2(state['bet_id'], state['oddsA'], state['oddsB'])
-        from database.db import get_connection
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE bets SET stake = ? WHERE id = ?', (stake, state['bet_id']))
-        conn.commit()
-        conn.close()
-    else:
-        # При создании публикуем пари
-        update_bet_step3(state['bet_id'], stake)
-    
-    # Получаем пари для отображения
-    bet = get_bet(state['bet_id'])
+    bet = await save_stake(state, stake)
     
     # Удаляем состояние пользователя
-    del user_states[user.id]
+    await user_states.delete(user.id)
+    
+    if bet is None:
+        await query.edit_message_text(STALE_EDIT_TEXT)
+        return
     
     # Формируем карточку пари
     card_text = format_bet_card(bet)
     
-    keyboard = [
-        [
-            InlineKeyboardButton(f"🟢 За {bet.playerA_name} ({bet.oddsA:.2f})", callback_data=f"side_{bet.id}_A"),
-        ],
-        [
-            InlineKeyboardButton(f"🔵 За {bet.playerB_name} ({bet.oddsB:.2f})", callback_data=f"side_{bet.id}_B"),
-        ],
-        [
-            InlineKeyboardButton("✏️ Изменить", callback_data=f"edit_{bet.id}"),
-            InlineKeyboardButton("🗑 Отменить", callback_data=f"cancel_{bet.id}")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = OPEN_BET_TEMPLATE.render(**bet_params(bet))
     
     await query.edit_message_text(
         text=card_text,
         reply_markup=reply_markup,
         parse_mode='Markdown'
     )
+    await live_cards.publish(context.bot, query_view(query, bet_id=bet.id), bet)
 
 
+@bet_locks.locked
 async def handle_cancel_bet(update: Update, context: ContextTypes.DEFAULT_TYPE, bet_id: int):
     """Обработка отмены пари"""
     query = update.callback_query
     user = update.effective_user
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     if not bet:
+        await query.answer()
         await query.edit_message_text("❌ Пари не найдено!")
         return
     
@@ -1211,32 +1212,28 @@ async def handle_cancel_bet(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
     
     # Отменяем пари
-    cancel_bet(bet_id)
+    if not await asyncio.to_thread(cancel_bet, bet_id, user.id):
+        await query.answer(BET_CHANGED_TEXT, show_alert=True)
+        return
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     card_text = format_bet_card(bet)
     
+    await query.answer()
     await query.edit_message_text(card_text, parse_mode='Markdown')
+    await live_cards.publish(context.bot, query_view(query, bet_id=bet_id), bet)
 
 
-async def view_active_bets_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Просмотр активных пари"""
-    active_bets = get_active_bets()
-    
+def active_bets_view(active_bets: List[Bet], username: Optional[str]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст и кнопки списка актуальных пари; кнопки сторон и отмены — для игрока username"""
     if not active_bets:
-        text = "📌 *Актуальные пари:*\n\nНет активных пари."
-        if update.callback_query:
-            keyboard = [[InlineKeyboardButton("🔙 Главное меню", callback_data="menu_back")]]
-            await update.callback_query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-        else:
-            await update.message.reply_text(text, parse_mode='Markdown')
-        return
+        return "📌 *Актуальные пари:*\n\nНет активных пари.", BACK_TO_MENU_KEYBOARD
     
     text = "📌 *Актуальные пари:*\n\n"
     
     for bet in active_bets:
         bet_name_text = f" • {bet.bet_name}" if bet.bet_name else ""
-        text += f"#{bet.id}{bet_name_text} — {bet.playerA_name} `{bet.oddsA:.2f}` | {bet.playerB_name} `{bet.oddsB:.2f}`\n"
+        text += f"#{bet.id}{bet_name_text} — {bet.playerA_name} `{format_odds(bet.oddsA)}` | {bet.playerB_name} `{format_odds(bet.oddsB)}`\n"
         text += f"Сумма: {format_money(bet.stake)}\n"
         
         # Для TAKEN пари показываем детали
@@ -1250,46 +1247,73 @@ async def view_active_bets_handler(update: Update, context: ContextTypes.DEFAULT
             text += f"Статус: {bet.status}\n\n"
     
     keyboard = []
-    user = update.effective_user
     
     for bet in active_bets:
         if bet.status == 'TAKEN':
             bet_name_btn = f" • {bet.bet_name}" if bet.bet_name else ""
             keyboard.append([
-                InlineKeyboardButton(f"🏁 Результат #{bet.id}{bet_name_btn}", callback_data=f"result_menu_{bet.id}")
+                InlineKeyboardButton(f"🏁 Результат #{bet.id}{bet_name_btn}", callback_data=encode_callback('result_menu', bet.id))
             ])
         elif bet.status == 'OPEN':
             bet_name_lbl = f" • {bet.bet_name}" if bet.bet_name else ""
             # Кнопки выбора стороны для taker
-            if user.username and user.username.lower() == bet.taker_username.lower():
+            if username and username.lower() == bet.taker_username.lower():
                 keyboard.append([
-                    InlineKeyboardButton(f"── #{bet.id}{bet_name_lbl} выбери сторону ──", callback_data=f"noop_{bet.id}")
+                    InlineKeyboardButton(f"── #{bet.id}{bet_name_lbl} выбери сторону ──", callback_data=encode_callback('noop', bet.id))
                 ])
                 keyboard.append([
-                    InlineKeyboardButton(f"🟢 {bet.playerA_name} ({bet.oddsA:.2f})", callback_data=f"side_{bet.id}_A"),
-                    InlineKeyboardButton(f"🔵 {bet.playerB_name} ({bet.oddsB:.2f})", callback_data=f"side_{bet.id}_B")
+                    InlineKeyboardButton(f"🟢 {bet.playerA_name} ({format_odds(bet.oddsA)})", callback_data=encode_callback('side', bet.id, 'A')),
+                    InlineKeyboardButton(f"🔵 {bet.playerB_name} ({format_odds(bet.oddsB)})", callback_data=encode_callback('side', bet.id, 'B'))
                 ])
             
             # Кнопка отмены для maker
-            if user.username and user.username.lower() == bet.maker_username.lower():
-                keyboard.append([InlineKeyboardButton(f"🗑 Отменить #{bet.id}{bet_name_lbl}", callback_data=f"cancel_{bet.id}")])
+            if username and username.lower() == bet.maker_username.lower():
+                keyboard.append([InlineKeyboardButton(f"🗑 Отменить #{bet.id}{bet_name_lbl}", callback_data=encode_callback('cancel', bet.id))])
     
-    if not keyboard:
-        keyboard = [[InlineKeyboardButton("🔙 Главное меню", callback_data="menu_back")]]
-    else:
-        keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data="menu_back")])
+    keyboard.append([MENU_BACK_BUTTON])
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def view_active_bets_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Просмотр активных пари"""
+    tenant = tenant_for_update(update)
+    user = update.effective_user
+    active_bets = await asyncio.to_thread(get_active_bets, tenant.id)
+    text, reply_markup = active_bets_view(active_bets, user.username)
     
+    fields = {'viewer': user.username, 'tenant_id': tenant.id}
     if update.callback_query:
         await update.callback_query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        view = query_view(update.callback_query, VIEW_LIST, **fields)
     else:
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        message = await update.message.reply_text(
+            text, reply_markup=reply_markup if active_bets else None, parse_mode='Markdown'
+        )
+        view = CardView(VIEW_LIST, message.chat_id, message.message_id, **fields)
+    
+    # Список обновляется при изменении любого из показанных пари
+    await live_cards.show(view, [bet.id for bet in active_bets])
+
+
+def render_live_views(views: List[CardView], bets: Dict[int, Bet]):
+    """Отрисовка сообщений с измененными пари для services/live_cards.py"""
+    active_by_tenant: Dict[int, List[Bet]] = {}
+    for view in views:
+        if view.kind == VIEW_LIST:
+            if view.tenant_id not in active_by_tenant:
+                active_by_tenant[view.tenant_id] = get_active_bets(view.tenant_id)
+            active_bets = active_by_tenant[view.tenant_id]
+            text, reply_markup = active_bets_view(active_bets, view.viewer)
+            yield view, text, reply_markup, [bet.id for bet in active_bets]
+        elif view.bet_id in bets:
+            bet = bets[view.bet_id]
+            yield view, format_bet_card(bet), card_keyboard(bet, inline=view.inline_message_id is not None), None
 
 
 async def view_bets_24h_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Просмотр пари за сутки"""    
-    bets = get_bets_last_24h()    
+    bets = await finished_bets_snapshot(tenant_for_update(update).id)    
     if not bets:
         text = "🗓 *Пари за сутки:*\n\nНет завершенных пари за последние 24 часа."
     else:
@@ -1301,7 +1325,7 @@ async def view_bets_24h_handler(update: Update, context: ContextTypes.DEFAULT_TY
             maker_choice = bet.playerB_name if bet.taker_side == 'A' else bet.playerA_name
             
             bet_name_text = f" • {bet.bet_name}" if bet.bet_name else ""
-            text += f"#{bet.id}{bet_name_text} — {bet.playerA_name} `{bet.oddsA:.2f}` | {bet.playerB_name} `{bet.oddsB:.2f}`\n"
+            text += f"#{bet.id}{bet_name_text} — {bet.playerA_name} `{format_odds(bet.oddsA)}` | {bet.playerB_name} `{format_odds(bet.oddsB)}`\n"
             text += f"Результат: {result_text}\n"
             text += f"Ставки: {bet.maker_username} → {maker_choice} | {bet.taker_username} → {taker_choice}\n"
             text += f"{bet.maker_username} {format_money(bet.maker_win, signed=True)} | {bet.taker_username} {format_money(bet.taker_win, signed=True)}\n\n"
@@ -1310,9 +1334,9 @@ async def view_bets_24h_handler(update: Update, context: ContextTypes.DEFAULT_TY
     if bets:
         for bet in bets:
             keyboard.append([
-                InlineKeyboardButton(f"🔄 Изменить результат #{bet.id}", callback_data=f"chresult_menu_{bet.id}")
+                InlineKeyboardButton(f"🔄 Изменить результат #{bet.id}", callback_data=encode_callback('chresult_menu', bet.id))
             ])
-    keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data="menu_back")])
+    keyboard.append([MENU_BACK_BUTTON])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     if update.callback_query:
@@ -1323,41 +1347,8 @@ async def view_bets_24h_handler(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def show_statistics_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показ статистики"""
-    from database.db import get_all_statistics
-    from datetime import datetime, timedelta
-    
-    # Показываем статистику за все время
-    stats = get_all_statistics()
-    
-    text = "📊 *Статистика*\n\n"
-    text += "Период: Все время\n\n"
-    
-    for username, user_stats in stats.items():
-        text += f"*{username}*\n"
-        text += f"Баланс: {format_money(user_stats['total_balance'], signed=True)}\n"
-        text += f"Пари: {user_stats['total_bets']}\n"
-        text += f"Победы: {user_stats['wins']} | Поражения: {user_stats['losses']}\n\n"
-    
-    keyboard = [
-        [
-            InlineKeyboardButton("Сегодня", callback_data="stats_today"),
-            InlineKeyboardButton("7 дней", callback_data="stats_7d")
-        ],
-        [
-            InlineKeyboardButton("30 дней", callback_data="stats_30d"),
-            InlineKeyboardButton("Все время", callback_data="stats_all")
-        ],
-        [
-            InlineKeyboardButton("🔙 Главное меню", callback_data="menu_back")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    if update.callback_query:
-        await update.callback_query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
-    else:
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    # Статистика за все время считается фоновым заданием
+    await show_statistics_job(update, context, "Все время")
 
 
 async def reset_statistics_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1365,14 +1356,7 @@ async def reset_statistics_handler(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     
     # Показываем подтверждение
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Подтвердить", callback_data="reset_confirm"),
-            InlineKeyboardButton("❌ Отмена", callback_data="menu_back")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = RESET_CONFIRM_KEYBOARD
     
     await query.edit_message_text(
         "⚠️ *Подтверждение сброса статистики*\n\n"
@@ -1387,7 +1371,7 @@ async def show_change_result_menu(update: Update, context: ContextTypes.DEFAULT_
     """Показ меню изменения результата завершенного пари"""
     query = update.callback_query
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     if not bet:
         await query.edit_message_text("❌ Пари не найдено!")
         return
@@ -1398,13 +1382,7 @@ async def show_change_result_menu(update: Update, context: ContextTypes.DEFAULT_
     
     current_result = bet.playerA_name if bet.result == 'A' else (bet.playerB_name if bet.result == 'B' else 'VOID')
     
-    keyboard = [
-        [InlineKeyboardButton(f"🏆 {bet.playerA_name}", callback_data=f"chresult_{bet_id}_A")],
-        [InlineKeyboardButton(f"🏆 {bet.playerB_name}", callback_data=f"chresult_{bet_id}_B")],
-        [InlineKeyboardButton("🚫 VOID", callback_data=f"chresult_{bet_id}_VOID")],
-        [InlineKeyboardButton("🔙 Назад к пари за сутки", callback_data="menu_bets_24h")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = CHANGE_RESULT_TEMPLATE.render(bet_id=bet_id, playerA=bet.playerA_name, playerB=bet.playerB_name)
     
     await query.edit_message_text(
         f"🔄 *Изменить результат пари #{bet_id}*\n\n"
@@ -1416,28 +1394,33 @@ async def show_change_result_menu(update: Update, context: ContextTypes.DEFAULT_
     )
 
 
+@bet_locks.locked
 async def handle_change_result(update: Update, context: ContextTypes.DEFAULT_TYPE, bet_id: int, new_result: str):
     """Обработка изменения результата с пересчетом статистики"""
     query = update.callback_query
     user = update.effective_user
     
-    # Проверка доступа
-    if not is_allowed_player(user.username):
-        await query.answer("❌ Только игроки могут изменять результат", show_alert=True)
-        return
-    
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     if not bet:
+        await query.answer()
         await query.edit_message_text("❌ Пари не найдено!")
         return
     
+    # Проверка доступа
+    if not is_allowed_player(user.username, tenants.get(bet.tenant_id)):
+        await query.answer("❌ Только игроки могут изменять результат", show_alert=True)
+        return
+    
     # Изменяем результат с пересчетом
-    change_bet_result(bet_id, new_result)
+    if not await asyncio.to_thread(change_bet_result, bet_id, new_result, user.id):
+        await query.answer(BET_CHANGED_TEXT, show_alert=True)
+        return
     
-    bet = get_bet(bet_id)
+    bet = await asyncio.to_thread(get_bet, bet_id)
     result_text = bet.playerA_name if bet.result == 'A' else (bet.playerB_name if bet.result == 'B' else 'VOID')
     
     await query.answer(f"✅ Результат изменен: {result_text}", show_alert=True)
+    await live_cards.refresh(context.bot, [bet])
     
     # Возвращаемся к списку пари за сутки
     await view_bets_24h_handler(update, context)
@@ -1470,12 +1453,11 @@ KICK_DOG_MESSAGES = [
 
 async def handle_kick_dog(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Пнуть пса — тегнуть противника с рандомным сообщением"""
-    import random
     query = update.callback_query
     user = update.effective_user
     
     # Определяем противника
-    other = get_other_player(user.username)
+    other = get_other_player(user.username, tenant_for_update(update))
     if not other:
         await query.answer("❌ Только игроки могут пинать пса!", show_alert=True)
         return
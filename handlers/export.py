@@ -0,0 +1,82 @@
+"""
+Обработчик /export — выгрузка пари и ledger пары чата файлом
+"""
+import logging
+import os
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import EXPORT_DIR, is_admin
+from database.db import EXPORT_TABLES
+from database.tenants import tenant_for_update
+from services.export import EXPORT_FORMATS, EXPORT_PERIODS
+from services.jobs import jobs
+
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Bot API на размер отправляемого ботом файла
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+USAGE = (
+    "Использование: /export [bets|ledger] [today|7d|30d|all] [@игрок] [csv|parquet]\n"
+    "По умолчанию: bets за все время, csv"
+)
+
+
+def parse_export_args(args) -> dict:
+    """Аргументы /export в любом порядке; ValueError — непонятный аргумент"""
+    options = {'table': 'bets', 'period': 'all', 'format': 'csv', 'player': None}
+    for arg in args:
+        value = arg.lower()
+        if value in EXPORT_TABLES:
+            options['table'] = value
+        elif value in EXPORT_PERIODS:
+            options['period'] = value
+        elif value in EXPORT_FORMATS:
+            options['format'] = value
+        elif arg.startswith('@') and len(arg) > 1:
+            options['player'] = arg[1:]
+        else:
+            raise ValueError(arg)
+    return options
+
+
+async def export_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /export — файл строится фоновым заданием и отправляется документом"""
+    user = update.effective_user
+    tenant = tenant_for_update(update)
+    if not tenant.is_player(user.username) and not is_admin(user.username):
+        await update.message.reply_text("❌ Выгрузка доступна игрокам пары этого чата")
+        return
+
+    try:
+        options = parse_export_args(context.args or [])
+    except ValueError:
+        await update.message.reply_text(USAGE)
+        return
+
+    params = dict(options, tenant_id=tenant.id, directory=EXPORT_DIR)
+    title = f"Выгрузка {options['table']} ({options['period']})"
+    # Выгрузка, которую отменили после последней точки отмены, не отправляется: файл удаляется
+    job = await jobs.submit('export', params, title, user.id, cache=False,
+                            discard=lambda result: os.remove(result['path']))
+    message = await update.message.reply_text(f"⏳ {title}")
+
+    def render(result):
+        return f"✅ {title}: {result['rows']} строк", None
+
+    async def send_file(result):
+        try:
+            if result['size'] > MAX_UPLOAD_BYTES:
+                await context.bot.send_message(
+                    message.chat_id, "❌ Файл больше 50 МБ: сузьте период или выберите игрока"
+                )
+                return
+            with open(result['path'], 'rb') as f:
+                await context.bot.send_document(message.chat_id, document=f, filename=result['filename'])
+        finally:
+            os.remove(result['path'])
+
+    await jobs.present(job, context.bot, message.chat_id, message.message_id, render, on_result=send_file)
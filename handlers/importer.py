@@ -0,0 +1,63 @@
+"""
+Обработчик /import — загрузка истории пари из CSV или JSON в пару чата
+"""
+import os
+import tempfile
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import EXPORT_DIR, is_admin
+from database.tenants import tenant_for_update
+from services.jobs import jobs
+
+
+# Ограничение Bot API на размер файла, который бот может скачать
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+IMPORT_EXTENSIONS = ('.csv', '.csv.gz', '.json')
+# Подпись документа с командой: /import или /import@bot
+IMPORT_CAPTION_PATTERN = r'^/import(@\w+)?(\s|$)'
+
+USAGE = (
+    "Отправьте файл CSV или JSON с подписью /import или ответьте /import на сообщение с файлом.\n"
+    "Колонки как у /export bets: maker_username, taker_username, playerA_name, playerB_name, "
+    "oddsA, oddsB, stake, taker_side, result, created_at"
+)
+
+
+async def import_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик /import — файл проверяется и вставляется фоновым заданием"""
+    user = update.effective_user
+    message = update.message
+    tenant = tenant_for_update(update)
+    if not tenant.is_player(user.username) and not is_admin(user.username):
+        await message.reply_text("❌ Импорт доступен игрокам пары этого чата")
+        return
+
+    document = message.document or (message.reply_to_message and message.reply_to_message.document)
+    if document is None:
+        await message.reply_text(USAGE)
+        return
+    filename = (document.file_name or '').lower()
+    extension = next((ext for ext in IMPORT_EXTENSIONS if filename.endswith(ext)), None)
+    if extension is None:
+        await message.reply_text(f"❌ Поддерживаются файлы {', '.join(IMPORT_EXTENSIONS)}")
+        return
+    if document.file_size and document.file_size > MAX_DOWNLOAD_BYTES:
+        await message.reply_text("❌ Файл больше 20 МБ: разбейте его на части")
+        return
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=extension, dir=EXPORT_DIR)
+    os.close(fd)
+    telegram_file = await context.bot.get_file(document.file_id)
+    await telegram_file.download_to_drive(path)
+
+    title = f"Импорт {document.file_name}"
+    job = await jobs.submit('import', {'path': path, 'tenant_id': tenant.id}, title, user.id, cache=False)
+    status = await message.reply_text(f"⏳ {title}")
+
+    def render(result):
+        return f"📥 {title}\n{result['summary']}", None
+
+    await jobs.present(job, context.bot, status.chat_id, status.message_id, render, parse_mode=None)
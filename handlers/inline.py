@@ -0,0 +1,135 @@
+"""
+Inline-режим: @bot в любом чате — активные пари пользователя
+
+Пользователь видит пари, которые он создал или где он второй игрок (OPEN и TAKEN), и
+отправляет карточку в любой чат: у открытого пари на карточке кнопки выбора стороны, у
+принятого — кнопка результата. Текст после @bot фильтрует список по номеру, названию и именам.
+
+Список пари пользователя хранится снимком в хранилище состояния, пока не изменилась версия
+данных (db.get_data_version): запросы, которые Telegram шлет при наборе каждой буквы, стоят
+одного чтения sqlite_sequence. Ответ помечен is_personal, а cache_time (INLINE_CACHE_TIME)
+позволяет Telegram показать прежний ответ на тот же текст, не спрашивая бота.
+
+Отправленная карточка подписывается на изменения пари (services/live_cards.py) по
+выбранному результату — для этого у бота должна быть включена отправка выбранных
+результатов (/setinlinefeedback в @BotFather).
+"""
+from typing import List, Optional
+
+from telegram import InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent, Update
+from telegram.ext import ContextTypes
+
+from config import INLINE_CACHE_TIME, INLINE_SNAPSHOT_TTL
+from database import db
+from handlers.bet_handlers import format_bet_card, format_money
+from handlers.keyboards import SELECT_SIDE_TEMPLATE, INLINE_TAKEN_TEMPLATE, bet_params
+from models.bet import Bet, STATUS_OPEN
+from monitoring.metrics import REGISTRY
+from services.live_cards import CardView, VIEW_CARD, live_cards
+from services.pricing import format_odds
+from state.base import get_backend
+
+
+# Telegram принимает не больше 50 результатов за ответ, следующие — по offset
+INLINE_PAGE_SIZE = 50
+
+INLINE_LOOKUPS = REGISTRY.counter(
+    'betbot_inline_snapshot_lookups_total', 'Обращения к снимкам пари inline-режима', ('result',))
+
+
+def _key(user_id: int) -> str:
+    return f"inline:{user_id}"
+
+
+async def user_bets_snapshot(user_id: int, username: Optional[str]) -> List[Bet]:
+    """Активные пари пользователя; снимок годен, пока не изменились данные и username"""
+    version = db.get_data_version()
+    backend = get_backend()
+    snapshot = await backend.get(_key(user_id))
+    if snapshot is not None and snapshot['version'] == version and snapshot['username'] == username:
+        INLINE_LOOKUPS.inc('hit')
+        return [Bet.from_dict(data) for data in snapshot['bets']]
+
+    INLINE_LOOKUPS.inc('miss')
+    bets = db.get_user_bets(user_id, username)
+    await backend.set(_key(user_id), {
+        'version': version,
+        'username': username,
+        'bets': [dict(bet.to_dict(), id=bet.id) for bet in bets],
+    }, INLINE_SNAPSHOT_TTL)
+    return bets
+
+
+def _matches(bet: Bet, text: str) -> bool:
+    """Фильтр по тексту запроса: начало номера пари (#12) или часть названия и имен"""
+    text = text.lower().lstrip('#')
+    if text.isdigit():
+        return str(bet.id).startswith(text)
+    return any(
+        text in value.lower()
+        for value in (bet.bet_name, bet.playerA_name, bet.playerB_name, bet.maker_username, bet.taker_username)
+        if value
+    )
+
+
+def bet_article(bet: Bet) -> InlineQueryResultArticle:
+    """Результат inline-запроса: карточка пари с кнопками для отправки в чат"""
+    title = f"#{bet.id}"
+    if bet.bet_name:
+        title += f" • {bet.bet_name}"
+    title += f" — {bet.playerA_name} vs {bet.playerB_name}"
+    if bet.status == STATUS_OPEN:
+        reply_markup = SELECT_SIDE_TEMPLATE.render(**bet_params(bet))
+        description = (f"{format_odds(bet.oddsA)} / {format_odds(bet.oddsB)}, {format_money(bet.stake)} — "
+                       f"ждет выбора стороны @{bet.taker_username}")
+    else:
+        reply_markup = INLINE_TAKEN_TEMPLATE.render(bet_id=bet.id)
+        description = f"{format_money(bet.stake)} — принято, ожидает результат"
+    return InlineQueryResultArticle(
+        # Статус в ID: Telegram не показывает отправленную ранее карточку вместо новой
+        id=f"{bet.id}:{bet.status}",
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(format_bet_card(bet), parse_mode='Markdown'),
+        reply_markup=reply_markup,
+    )
+
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик inline-запросов: активные пари пользователя, постранично по offset"""
+    query = update.inline_query
+    user = update.effective_user
+
+    bets = await user_bets_snapshot(user.id, user.username)
+    text = query.query.strip()
+    if text:
+        bets = [bet for bet in bets if _matches(bet, text)]
+
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    page = bets[offset:offset + INLINE_PAGE_SIZE]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if len(bets) > offset + INLINE_PAGE_SIZE else ''
+    # Без активных пари — кнопка перехода в чат с ботом, где пари создается
+    button = None if page or offset else InlineQueryResultsButton("➕ Создать пари", start_parameter="create")
+
+    await query.answer(
+        [bet_article(bet) for bet in page],
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=next_offset,
+        button=button,
+    )
+
+
+async def chosen_inline_result_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Карточка из inline-режима отправлена: она обновляется вместе с пари"""
+    result = update.chosen_inline_result
+    bet_id, _, status = result.result_id.partition(':')
+    # inline_message_id есть только у сообщений с кнопками
+    if not result.inline_message_id or not bet_id.isdigit():
+        return
+    view = CardView(VIEW_CARD, inline_message_id=result.inline_message_id, bet_id=int(bet_id))
+    await live_cards.show(view, [view.bet_id])
+    # Пари изменилось, пока пользователь выбирал карточку: она отправлена со старым состоянием
+    bet = db.get_bet(view.bet_id)
+    if bet is not None and bet.status != status:
+        await live_cards.refresh(context.bot, [bet])
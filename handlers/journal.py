@@ -0,0 +1,87 @@
+"""
+Обработчики журнала пари: /undo — отмена последнего действия, /audit — история пари
+"""
+import asyncio
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import is_admin
+from database.db import get_bet, get_bet_events, get_undo_target, undo_last_action
+from database.tenants import tenants, tenant_for_update
+from database.users import users
+from handlers.bet_handlers import format_bet_card
+from models.bet_event import EVENT_TITLES
+from services.live_cards import live_cards
+from state.base import LockTimeout
+from state.locks import bet_locks
+
+
+# Сколько последних событий показывать в /audit (сообщение ограничено 4096 символами)
+AUDIT_LIMIT = 50
+
+
+async def undo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /undo — отмена своего последнего принятия, результата или отмены пари"""
+    user = update.effective_user
+    tenant = tenant_for_update(update)
+    if not tenant.is_player(user.username):
+        await update.message.reply_text("❌ Отмена действий доступна игрокам пары этого чата")
+        return
+
+    # Отмена меняет пари, как и кнопки: под той же блокировкой пари, что и обработчики кнопок
+    target = await asyncio.to_thread(get_undo_target, user.id, tenant.id)
+    if target is not None:
+        try:
+            async with bet_locks.hold(target.bet_id):
+                target, bet = await asyncio.to_thread(undo_last_action, user.id, tenant.id, target.bet_id)
+        except LockTimeout:
+            await update.message.reply_text("⏳ Пари сейчас изменяется, попробуйте еще раз")
+            return
+    if target is None:
+        await update.message.reply_text("Нечего отменять")
+        return
+    title = EVENT_TITLES.get(target.type, target.type)
+    if bet is None:
+        await update.message.reply_text(
+            f"❌ Нельзя отменить «{title}» по пари #{target.bet_id}: после него пари уже менялось"
+        )
+        return
+
+    await update.message.reply_text(
+        f"↩️ Отменено: {title} (пари #{bet.id})\n\n{format_bet_card(bet)}",
+        parse_mode='Markdown'
+    )
+    # Карточки и списки с этим пари возвращаются к прежнему состоянию
+    await live_cards.refresh(context.bot, [bet])
+
+
+async def audit_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /audit <ID пари> — журнал событий пари"""
+    user = update.effective_user
+    try:
+        bet_id = int(context.args[0].lstrip('#'))
+    except (IndexError, ValueError):
+        await update.message.reply_text("Использование: /audit <ID пари>")
+        return
+
+    bet = await asyncio.to_thread(get_bet, bet_id)
+    tenant = tenants.get(bet.tenant_id) if bet else None
+    # Чужие пари не отличаются от несуществующих
+    if bet is None or not (is_admin(user.username) or (tenant is not None and tenant.is_player(user.username))):
+        await update.message.reply_text("❌ Пари не найдено!")
+        return
+
+    events = await asyncio.to_thread(get_bet_events, bet_id)
+    undone = {event.ref_event_id for event in events}
+    lines = [f"📜 Журнал пари #{bet_id} ({len(events)} событий)"]
+    if len(events) > AUDIT_LIMIT:
+        lines.append(f"… первые {len(events) - AUDIT_LIMIT} пропущены")
+    for event in events[-AUDIT_LIMIT:]:
+        author = users.get(event.user_id) if event.user_id else None
+        who = f"@{author.username}" if author and author.username else (str(event.user_id) if event.user_id else "—")
+        mark = " (отменено)" if event.id in undone else ""
+        lines.append(f"#{event.id} {event.created_at.strftime('%d.%m %H:%M:%S')} {who}: {event.describe()}{mark}")
+
+    # Без разметки: в названиях и именах бывают символы Markdown
+    await update.message.reply_text("\n".join(lines))
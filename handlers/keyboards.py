@@ -0,0 +1,281 @@
+"""
+Клавиатуры бота
+
+Разметка Telegram неизменяема, поэтому статические клавиатуры (главное меню, периоды
+статистики) собираются один раз при импорте и отдаются готовыми, а клавиатуры каталога
+(названия пари, игроки) — один раз на версию каталога (database/catalog.py).
+Клавиатуры пари (ID пари в callback_data, имена игроков в подписях) описаны компактными
+шаблонами KeyboardTemplate и штампуются по параметрам, а последние отштампованные
+разметки хранятся готовыми: шаги визарда и карточки перерисовываются при каждом нажатии.
+Данные кнопки задаются кортежем (действие, поля...) и кодируются services/callbacks.py.
+"""
+import functools
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from database.catalog import catalog
+from models.bet import STATUS_OPEN, STATUS_TAKEN
+from models.catalog import CatalogItem, KIND_PLAYER, KIND_BET_NAME
+from services.callbacks import encode
+from services.pricing import PERCENT_CHOICES, format_odds
+
+
+# Готовые суммы ставки на шаге 3, ₽
+STAKE_CHOICES = (500, 1000, 1500, 2000)
+# Сколько готовых разметок держать в памяти для каждого шаблона (по одной на пари и параметры)
+KEYBOARD_CACHE = 256
+
+# Действие кнопки каталога по виду элемента
+CATALOG_ACTIONS = {KIND_PLAYER: 'pl', KIND_BET_NAME: 'bn'}
+
+# Строка кнопок: (подпись, (действие, поля...))
+Row = Sequence[Tuple[str, Tuple[Any, ...]]]
+
+
+class Param:
+    """Поле данных кнопки шаблона, значение которого передается в render()"""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+BET_ID = Param('bet_id')
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    return (items[i:i + size] for i in range(0, len(items), size))
+
+
+def static_keyboard(rows: Iterable[Row]) -> InlineKeyboardMarkup:
+    """Разметка из строк (подпись, (действие, поля...)) без параметров"""
+    return InlineKeyboardMarkup(tuple(
+        tuple(InlineKeyboardButton(label, callback_data=encode(*callback)) for label, callback in row)
+        for row in rows
+    ))
+
+
+class KeyboardTemplate:
+    """Строки кнопок (подпись с полями str.format, (действие, поля...) с Param)
+
+    Пример: ("🟢 За {playerA}", ('side', BET_ID, 'A')). Кнопки без полей создаются один раз
+    и входят во все разметки шаблона. render() подставляет параметры; последние cache_size
+    разметок хранятся готовыми, поэтому повторный показ того же пари не создает кнопки заново.
+    """
+
+    __slots__ = ('rows', 'cache_size', '_cache')
+
+    def __init__(self, rows: Iterable[Row], cache_size: int = KEYBOARD_CACHE):
+        self.rows = tuple(
+            tuple(
+                (label, callback) if '{' in label or any(isinstance(arg, Param) for arg in callback)
+                else InlineKeyboardButton(label, callback_data=encode(*callback))
+                for label, callback in row
+            )
+            for row in rows
+        )
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[tuple, InlineKeyboardMarkup]' = OrderedDict()
+
+    @staticmethod
+    def _button(label: str, callback: tuple, params: dict) -> InlineKeyboardButton:
+        return InlineKeyboardButton(
+            label.format_map(params),
+            callback_data=encode(*(params[arg.name] if isinstance(arg, Param) else arg for arg in callback))
+        )
+
+    def _stamp(self, params: dict) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(tuple(
+            tuple(
+                button if isinstance(button, InlineKeyboardButton) else self._button(*button, params)
+                for button in row
+            )
+            for row in self.rows
+        ))
+
+    def render(self, **params) -> InlineKeyboardMarkup:
+        key = tuple(sorted(params.items()))
+        markup = self._cache.get(key)
+        if markup is not None:
+            self._cache.move_to_end(key)
+            return markup
+        markup = self._stamp(params)
+        self._cache[key] = markup
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return markup
+
+
+# Одна кнопка может входить в несколько разметок
+MENU_BACK_BUTTON = InlineKeyboardButton("🔙 Главное меню", callback_data=encode('menu', 'back'))
+
+MAIN_MENU_KEYBOARD = static_keyboard([
+    [("➕ Создать пари", ('menu', 'create_bet')), ("📌 Актуальные пари", ('menu', 'active_bets'))],
+    [("🗓 Пари за сутки", ('menu', 'bets_24h')), ("📊 Статистика", ('menu', 'statistics'))],
+    [("♻️ Сброс статистики", ('menu', 'reset_stats'))],
+    [("🐕 Пнуть пса", ('menu', 'kick_dog'))],
+])
+
+STATISTICS_KEYBOARD = static_keyboard([
+    [("Сегодня", ('stats', 'today')), ("7 дней", ('stats', '7d'))],
+    [("30 дней", ('stats', '30d')), ("Все время", ('stats', 'all'))],
+    [("🔙 Главное меню", ('menu', 'back'))],
+])
+
+BACK_TO_MENU_KEYBOARD = InlineKeyboardMarkup(((MENU_BACK_BUTTON,),))
+
+RESET_CONFIRM_KEYBOARD = static_keyboard([
+    [("✅ Подтвердить", ('reset_confirm',)), ("❌ Отмена", ('menu', 'back'))],
+])
+
+
+def catalog_keyboard(items: Iterable[CatalogItem], per_row: int = 1,
+                     selected: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Кнопки элементов каталога (callback_data с ID элемента), выбранный отмечен ✅"""
+    selected_key = selected.lower() if selected else None
+    return static_keyboard(
+        [(f"✅ {item.name}" if item.name_key == selected_key else item.name, (CATALOG_ACTIONS[item.kind], item.id))
+         for item in row]
+        for row in _chunks(tuple(items), per_row)
+    )
+
+
+class CatalogKeyboards:
+    """Клавиатуры шагов 0 и 1, собранные для текущей версии каталога
+
+    Для игроков готова клавиатура без выбора и по одной на каждого выбранного игрока.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._bet_names: Optional[InlineKeyboardMarkup] = None
+        self._players: Dict[Optional[str], InlineKeyboardMarkup] = {}
+
+    def _ensure_current(self):
+        items = catalog.items(KIND_PLAYER)
+        if self._version == catalog.version:
+            return
+        # Версия читается после items(): каталог мог загрузиться при этом вызове
+        version = catalog.version
+        self._bet_names = catalog_keyboard(catalog.items(KIND_BET_NAME))
+        self._players = {
+            selected: catalog_keyboard(items, 2, selected)
+            for selected in (None, *(item.name_key for item in items))
+        }
+        self._version = version
+
+    def bet_names(self) -> InlineKeyboardMarkup:
+        self._ensure_current()
+        return self._bet_names
+
+    def players(self, selected_player: Optional[str] = None) -> InlineKeyboardMarkup:
+        self._ensure_current()
+        keyboard = self._players.get(selected_player.lower() if selected_player else None)
+        if keyboard is None:
+            # Игрок не из списка (введен вручную или удален из каталога)
+            keyboard = self._players[None]
+        return keyboard
+
+
+catalog_keyboards = CatalogKeyboards()
+
+
+def bet_name_keyboard() -> InlineKeyboardMarkup:
+    """Готовые названия пари для шага 0"""
+    return catalog_keyboards.bet_names()
+
+
+def player_keyboard(selected_player: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Клавиатура выбора игроков с подсветкой выбранного"""
+    return catalog_keyboards.players(selected_player)
+
+
+ODDS_PLAYERS_TEMPLATE = KeyboardTemplate([
+    [("{labelA}", ('op', BET_ID, 'A')), ("{labelB}", ('op', BET_ID, 'B'))],
+])
+# Кнопки процентов (шаг 5), по 5 в ряд
+ODDS_PERCENT_TEMPLATE = KeyboardTemplate(
+    [(f"{pct}%", ('opct', BET_ID, pct)) for pct in row]
+    for row in _chunks(PERCENT_CHOICES, 5)
+)
+
+STAKE_TEMPLATE = KeyboardTemplate(
+    [(f"{stake} ₽", ('stake', BET_ID, stake)) for stake in row]
+    for row in _chunks(STAKE_CHOICES, 2)
+)
+
+# Карточка опубликованного пари: выбор стороны для taker, изменение и отмена для maker
+OPEN_BET_TEMPLATE = KeyboardTemplate([
+    [("🟢 За {playerA} ({oddsA})", ('side', BET_ID, 'A'))],
+    [("🔵 За {playerB} ({oddsB})", ('side', BET_ID, 'B'))],
+    [("✏️ Изменить", ('edit', BET_ID)), ("🗑 Отменить", ('cancel', BET_ID))],
+])
+
+SELECT_SIDE_TEMPLATE = KeyboardTemplate([
+    [("🟢 За {playerA} ({oddsA})", ('side', BET_ID, 'A'))],
+    [("🔵 За {playerB} ({oddsB})", ('side', BET_ID, 'B'))],
+])
+
+TAKEN_BET_TEMPLATE = KeyboardTemplate([
+    [("🏁 Указать результат", ('result_menu', BET_ID))],
+    [("📌 В актуальные", ('menu', 'active_bets'))],
+])
+
+# Карточка принятого пари, отправленная через inline-режим: у сообщения нет чата бота,
+# поэтому без перехода к спискам
+INLINE_TAKEN_TEMPLATE = KeyboardTemplate([
+    [("🏁 Указать результат", ('result_menu', BET_ID))],
+])
+
+RESULT_TEMPLATE = KeyboardTemplate([
+    [("🏆 Победил {playerA}", ('result', BET_ID, 'A'))],
+    [("🏆 Победил {playerB}", ('result', BET_ID, 'B'))],
+    [("🚫 VOID (отмена матча)", ('result', BET_ID, 'VOID'))],
+])
+
+CHANGE_RESULT_TEMPLATE = KeyboardTemplate([
+    [("🏆 {playerA}", ('chresult', BET_ID, 'A'))],
+    [("🏆 {playerB}", ('chresult', BET_ID, 'B'))],
+    [("🚫 VOID", ('chresult', BET_ID, 'VOID'))],
+    [("🔙 Назад к пари за сутки", ('menu', 'bets_24h'))],
+])
+
+
+@functools.lru_cache(maxsize=KEYBOARD_CACHE)
+def odds_keyboard(bet_id: int, playerA: str, playerB: str, selected_player: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Клавиатура выбора игрока и процента для шага 2 (одна на пари и выбранного игрока)"""
+    players = ODDS_PLAYERS_TEMPLATE.render(
+        bet_id=bet_id,
+        labelA=f"✅ {playerA}" if selected_player == 'A' else playerA,
+        labelB=f"✅ {playerB}" if selected_player == 'B' else playerB,
+    )
+    percents = ODDS_PERCENT_TEMPLATE.render(bet_id=bet_id)
+    return InlineKeyboardMarkup(players.inline_keyboard + percents.inline_keyboard)
+
+
+def stake_keyboard(bet_id: int) -> InlineKeyboardMarkup:
+    """Готовые суммы ставки для шага 3"""
+    return STAKE_TEMPLATE.render(bet_id=bet_id)
+
+
+def bet_params(bet) -> dict:
+    """Параметры шаблонов клавиатур пари"""
+    return {
+        'bet_id': bet.id,
+        'playerA': bet.playerA_name,
+        'playerB': bet.playerB_name,
+        'oddsA': format_odds(bet.oddsA) if bet.oddsA else '',
+        'oddsB': format_odds(bet.oddsB) if bet.oddsB else '',
+    }
+
+
+def card_keyboard(bet, inline: bool = False) -> Optional[InlineKeyboardMarkup]:
+    """Кнопки карточки по статусу пари; inline — карточка, отправленная через inline-режим"""
+    if bet.status == STATUS_OPEN:
+        return (SELECT_SIDE_TEMPLATE if inline else OPEN_BET_TEMPLATE).render(**bet_params(bet))
+    if bet.status == STATUS_TAKEN:
+        return (INLINE_TAKEN_TEMPLATE if inline else TAKEN_BET_TEMPLATE).render(bet_id=bet.id)
+    return None
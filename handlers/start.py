@@ -1,19 +1,22 @@
 """
 Обработчик команды /start и главного меню
 """
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ContextTypes
 from config import is_allowed_player
+from database.tenants import tenant_for_update
+from handlers.keyboards import MAIN_MENU_KEYBOARD
 
 
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     user = update.effective_user
+    player1, player2 = tenant_for_update(update).players
     
     welcome_text = f"""
 Привет, {user.first_name}! 👋
 
-Это бот для пари между Inzaaa и TROOLZ.
+Это бот для пари между {player1} и {player2}.
 
 📋 *Как это работает:*
 
@@ -24,24 +27,7 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 Используй кнопки ниже для навигации:
     """
     
-    keyboard = [
-        [
-            InlineKeyboardButton("➕ Создать пари", callback_data="menu_create_bet"),
-            InlineKeyboardButton("📌 Актуальные пари", callback_data="menu_active_bets")
-        ],
-        [
-            InlineKeyboardButton("🗓 Пари за сутки", callback_data="menu_bets_24h"),
-            InlineKeyboardButton("📊 Статистика", callback_data="menu_statistics")
-        ],
-        [
-            InlineKeyboardButton("♻️ Сброс статистики", callback_data="menu_reset_stats")
-        ],
-        [
-            InlineKeyboardButton("🐕 Пнуть пса", callback_data="menu_kick_dog")
-        ]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = MAIN_MENU_KEYBOARD
     
     if update.callback_query:
         await update.callback_query.edit_message_text(welcome_text, reply_markup=reply_markup, parse_mode='Markdown')
@@ -3,7 +3,8 @@
 """
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
+from models.tenant import DEFAULT_TENANT_ID
 
 
 # Фиксированные игроки
@@ -20,6 +21,18 @@ STATUS_FINISHED = "FINISHED"
 STATUS_CANCELED = "CANCELED"
 
 
+def calculate_payout(stake: float, oddsA: float, oddsB: float, taker_side: str, result: str) -> Tuple[float, float]:
+    """Формула расчета согласно ТЗ: (maker_win, taker_win)"""
+    if result == 'VOID':
+        return 0.0, 0.0
+    odds = oddsA if taker_side == 'A' else oddsB
+    if result == taker_side:
+        # Taker выиграл
+        return -stake * (odds - 1), stake * (odds - 1)
+    # Taker проиграл
+    return stake, -stake
+
+
 @dataclass
 class Bet:
     """Модель пари"""
@@ -41,6 +54,8 @@ class Bet:
     finished_at: Optional[datetime] = None
     maker_win: Optional[float] = 0.0  # Выигрыш maker
     taker_win: Optional[float] = 0.0  # Выигрыш taker
+    tenant_id: int = DEFAULT_TENANT_ID  # Пара игроков (чат), к которой относится пари
+    chat_id: Optional[int] = None  # Чат, в котором создано пари (для напоминаний)
     
     def to_dict(self):
         """Преобразование в словарь для базы данных"""
@@ -61,7 +76,9 @@ class Bet:
             'created_at': self.created_at.isoformat(),
             'finished_at': self.finished_at.isoformat() if self.finished_at else None,
             'maker_win': self.maker_win or 0.0,
-            'taker_win': self.taker_win or 0.0
+            'taker_win': self.taker_win or 0.0,
+            'tenant_id': self.tenant_id,
+            'chat_id': self.chat_id
         }
     
     @classmethod
@@ -85,9 +102,15 @@ class Bet:
             created_at=datetime.fromisoformat(data['created_at']),
             finished_at=datetime.fromisoformat(data['finished_at']) if data.get('finished_at') else None,
             maker_win=data.get('maker_win', 0.0),
-            taker_win=data.get('taker_win', 0.0)
+            taker_win=data.get('taker_win', 0.0),
+            tenant_id=data.get('tenant_id') or DEFAULT_TENANT_ID,
+            chat_id=data.get('chat_id')
         )
     
+    def payout(self, result: str) -> Tuple[float, float]:
+        """Выигрыши (maker_win, taker_win) при результате 'A', 'B' или 'VOID'"""
+        return calculate_payout(self.stake, self.oddsA, self.oddsB, self.taker_side, result)
+    
     def get_taker_user_id(self) -> int:
         """Определяет ID второго игрока (Taker)"""
         if self.maker_username.lower() == PLAYER_INZAAA_USERNAME.lower():
@@ -108,6 +131,7 @@ class LedgerEntry:
     username: str
     amount: float  # Может быть положительным (выигрыш) или отрицательным (проигрыш)
     created_at: datetime
+    tenant_id: int = DEFAULT_TENANT_ID
     
     def to_dict(self):
         return {
@@ -115,7 +139,8 @@ class LedgerEntry:
             'user_id': self.user_id,
             'username': self.username,
             'amount': self.amount,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'tenant_id': self.tenant_id
         }
     
     @classmethod
@@ -126,5 +151,6 @@ class LedgerEntry:
             user_id=data['user_id'],
             username=data['username'],
             amount=data['amount'],
-            created_at=datetime.fromisoformat(data['created_at'])
+            created_at=datetime.fromisoformat(data['created_at']),
+            tenant_id=data.get('tenant_id') or DEFAULT_TENANT_ID
         )
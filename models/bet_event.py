@@ -0,0 +1,111 @@
+"""
+Журнал событий пари: состояние пари — свертка его событий
+"""
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional
+from models.tenant import DEFAULT_TENANT_ID
+
+
+# Типы событий
+EVENT_CREATED = "created"
+EVENT_NAMED = "named"
+EVENT_ODDS_SET = "odds_set"
+EVENT_STAKE_SET = "stake_set"
+EVENT_TAKER_SET = "taker_set"
+EVENT_TAKEN = "taken"
+EVENT_SETTLED = "settled"
+EVENT_RESULT_CHANGED = "result_changed"
+EVENT_CANCELED = "canceled"
+EVENT_EXPIRED = "expired"  # Отмена по сроку (services/reminders.py)
+EVENT_UNDONE = "undone"  # Отмена события ref_event_id
+EVENT_LEDGER_RESET = "ledger_reset"  # Записи ledger пари удалены сбросом статистики
+
+# Поля пари (колонки bets кроме id), которые восстанавливаются из журнала
+BET_FIELDS = (
+    'maker_user_id', 'maker_username', 'taker_user_id', 'taker_username', 'bet_name',
+    'playerA_name', 'playerB_name', 'oddsA', 'oddsB', 'stake', 'status', 'taker_side', 'result',
+    'created_at', 'finished_at', 'maker_win', 'taker_win', 'tenant_id', 'chat_id'
+)
+
+# События, которые можно отменить через /undo (шаги визарда отменяются самим визардом)
+UNDOABLE_EVENTS = frozenset((EVENT_TAKEN, EVENT_SETTLED, EVENT_RESULT_CHANGED, EVENT_CANCELED))
+
+EVENT_TITLES = {
+    EVENT_CREATED: "Создано",
+    EVENT_NAMED: "Название",
+    EVENT_ODDS_SET: "Коэффициенты",
+    EVENT_STAKE_SET: "Опубликовано",
+    EVENT_TAKER_SET: "Taker",
+    EVENT_TAKEN: "Принято",
+    EVENT_SETTLED: "Результат",
+    EVENT_RESULT_CHANGED: "Результат изменен",
+    EVENT_CANCELED: "Отменено",
+    EVENT_EXPIRED: "Отменено по сроку",
+    EVENT_UNDONE: "Отмена действия",
+    EVENT_LEDGER_RESET: "Сброс статистики",
+}
+
+
+@dataclass
+class BetEvent:
+    """Событие пари: data — поля пари, которые событие устанавливает"""
+    id: Optional[int]
+    bet_id: int
+    type: str
+    data: dict
+    user_id: Optional[int]
+    created_at: datetime
+    ref_event_id: Optional[int] = None  # Для EVENT_UNDONE — отмененное событие
+    tenant_id: int = DEFAULT_TENANT_ID
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            id=data.get('id'),
+            bet_id=data['bet_id'],
+            type=data['type'],
+            data=json.loads(data['data']) if data.get('data') else {},
+            user_id=data.get('user_id'),
+            created_at=datetime.fromisoformat(data['created_at']),
+            ref_event_id=data.get('ref_event_id'),
+            tenant_id=data.get('tenant_id') or DEFAULT_TENANT_ID
+        )
+
+    def describe(self) -> str:
+        """Краткое описание для просмотра истории"""
+        title = EVENT_TITLES.get(self.type, self.type)
+        if self.type == EVENT_UNDONE:
+            return f"{title} #{self.ref_event_id}"
+        details = ', '.join(
+            f"{key}={value}" for key, value in self.data.items()
+            if key not in ('created_at', 'tenant_id', 'chat_id', 'maker_user_id', 'taker_user_id') and value is not None
+        )
+        return f"{title}: {details}" if details else title
+
+
+def effective_events(events: Iterable[BetEvent]) -> List[BetEvent]:
+    """События без отмененных и без самих отмен (в порядке id)"""
+    events = list(events)
+    undone = {event.ref_event_id for event in events if event.type == EVENT_UNDONE}
+    return [event for event in events if event.type != EVENT_UNDONE and event.id not in undone]
+
+
+def ledger_cleared(events: Iterable[BetEvent]) -> bool:
+    """Последний расчет пари удален сбросом статистики: записей ledger у пари быть не должно"""
+    cleared = False
+    for event in effective_events(events):
+        if event.type in (EVENT_SETTLED, EVENT_RESULT_CHANGED):
+            cleared = False
+        elif event.type == EVENT_LEDGER_RESET:
+            cleared = True
+    return cleared
+
+
+def project(events: Iterable[BetEvent]) -> dict:
+    """Поля пари после применения действующих событий по порядку"""
+    state = {}
+    for event in effective_events(events):
+        state.update(event.data)
+    return state
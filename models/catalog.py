@@ -0,0 +1,40 @@
+"""
+Модель элемента каталога: игрок для быстрого выбора или готовое название пари
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+
+# Виды элементов каталога
+KIND_PLAYER = "player"
+KIND_BET_NAME = "bet_name"
+CATALOG_KINDS = (KIND_PLAYER, KIND_BET_NAME)
+
+
+@dataclass
+class CatalogItem:
+    """Элемент каталога; ID не меняется и передается в callback_data вместо имени"""
+    id: int
+    kind: str
+    name: str
+    position: int  # Порядок в исходном списке (при равной частоте выбора)
+    uses: int  # Сколько раз выбран при создании пари
+    active: bool  # False — удален из списка, но старые кнопки с его ID еще работают
+    updated_at: datetime
+
+    @property
+    def name_key(self) -> str:
+        """Ключ для поиска по имени без учета регистра"""
+        return self.name.lower()
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            id=data['id'],
+            kind=data['kind'],
+            name=data['name'],
+            position=data['position'],
+            uses=data['uses'],
+            active=bool(data['active']),
+            updated_at=datetime.fromisoformat(data['updated_at'])
+        )
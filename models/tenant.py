@@ -0,0 +1,62 @@
+"""
+Модель пары игроков (тенанта): группа или чат со своей парой
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import FrozenSet, Optional, Tuple
+
+
+# Пара по умолчанию (из config.py) — для личных чатов и чатов без своей пары
+DEFAULT_TENANT_ID = 1
+
+
+@dataclass
+class Tenant:
+    """Пара игроков, привязанная к чату"""
+    id: Optional[int]
+    chat_id: Optional[int]  # None — пара по умолчанию
+    title: Optional[str]
+    player1_username: str
+    player2_username: str
+    created_at: datetime
+    _keys: FrozenSet[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._keys = frozenset((self.player1_username.lower(), self.player2_username.lower()))
+
+    @property
+    def players(self) -> Tuple[str, str]:
+        return self.player1_username, self.player2_username
+
+    def is_player(self, username: Optional[str]) -> bool:
+        """Проверка участия в паре за O(1)"""
+        return bool(username) and username.lower() in self._keys
+
+    def other_player(self, username: Optional[str]) -> Optional[str]:
+        """Username второго игрока пары"""
+        username_lower = username.lower() if username else ""
+        if username_lower == self.player1_username.lower():
+            return self.player2_username
+        if username_lower == self.player2_username.lower():
+            return self.player1_username
+        return None
+
+    def to_dict(self):
+        return {
+            'chat_id': self.chat_id,
+            'title': self.title,
+            'player1_username': self.player1_username,
+            'player2_username': self.player2_username,
+            'created_at': self.created_at.isoformat()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            id=data.get('id'),
+            chat_id=data.get('chat_id'),
+            title=data.get('title'),
+            player1_username=data['player1_username'],
+            player2_username=data['player2_username'],
+            created_at=datetime.fromisoformat(data['created_at'])
+        )
@@ -0,0 +1,40 @@
+"""
+Модель пользователя Telegram: соответствие user_id и текущего username
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+
+@dataclass
+class User:
+    """Пользователь, замеченный ботом хотя бы в одном обновлении"""
+    user_id: int
+    username: Optional[str]  # None — username не задан или перешел к другому пользователю
+    first_name: Optional[str]
+    first_seen: datetime
+    last_seen: datetime
+
+    @property
+    def username_key(self) -> Optional[str]:
+        """Ключ для поиска по username без учета регистра"""
+        return self.username.lower() if self.username else None
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'first_name': self.first_name,
+            'first_seen': self.first_seen.isoformat(),
+            'last_seen': self.last_seen.isoformat()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            user_id=data['user_id'],
+            username=data.get('username'),
+            first_name=data.get('first_name'),
+            first_seen=datetime.fromisoformat(data['first_seen']),
+            last_seen=datetime.fromisoformat(data['last_seen'])
+        )
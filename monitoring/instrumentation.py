@@ -0,0 +1,137 @@
+"""
+Инструментирование горячего пути: обработчики, функции БД и SQL-выражения
+"""
+import functools
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from monitoring.metrics import REGISTRY, COUNT_BUCKETS
+from services.callbacks import route_label
+
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    'betbot_handler_duration_seconds', 'Время выполнения обработчика', ('handler', 'route'))
+HANDLER_ERRORS = REGISTRY.counter(
+    'betbot_handler_errors_total', 'Исключения в обработчиках', ('handler', 'route'))
+UPDATE_STATEMENTS = REGISTRY.histogram(
+    'betbot_db_statements_per_update', 'SQL-выражений на одно обработанное обновление', ('route',),
+    buckets=COUNT_BUCKETS)
+DB_SECONDS = REGISTRY.histogram(
+    'betbot_db_call_duration_seconds', 'Время выполнения функций database/db.py', ('function',))
+DB_STATEMENTS = REGISTRY.counter(
+    'betbot_db_statements_total', 'Выполненные SQL-выражения')
+
+
+@dataclass
+class RequestScope:
+    """Счетчики текущего обновления"""
+    route: str
+    update_id: Optional[int] = None
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+    db_calls: int = 0
+    db_statements: int = 0
+    api_calls: int = 0
+
+
+# Одна строка на обработанное обновление — для офлайн-анализа задержек
+access_logger = logging.getLogger('betbot.access')
+
+current_scope: ContextVar[Optional[RequestScope]] = ContextVar('current_scope', default=None)
+
+def route_for_update(update) -> str:
+    """Маршрут обновления с ограниченным числом значений (для меток метрик)"""
+    query = getattr(update, 'callback_query', None)
+    if query is not None and query.data:
+        # Разбор кэшируется: обработчик получит ту же CallbackData без повторного разбора
+        return route_label(query.data)
+    if getattr(update, 'inline_query', None) is not None:
+        return 'inline:query'
+    if getattr(update, 'chosen_inline_result', None) is not None:
+        return 'inline:chosen'
+    message = getattr(update, 'effective_message', None)
+    if message is not None and message.text:
+        if message.text.startswith('/'):
+            return 'cmd:' + message.text.split()[0].split('@')[0][1:]
+        return 'msg:text'
+    return 'update'
+
+
+def trace_statement(statement: str):
+    """Trace-callback соединения SQLite: считает каждое выполненное выражение"""
+    DB_STATEMENTS.inc()
+    scope = current_scope.get()
+    if scope is not None:
+        scope.db_statements += 1
+
+
+def db_timed(func):
+    """Декоратор для функций database/db.py: время и число вызовов"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_SECONDS.observe(name, value=time.perf_counter() - started)
+            scope = current_scope.get()
+            if scope is not None:
+                scope.db_calls += 1
+
+    return wrapper
+
+
+def timed_handler(callback):
+    """Обертка обработчика: время, ошибки и SQL-выражения на маршрут"""
+    name = getattr(callback, '__name__', repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(update, context, *args, **kwargs):
+        user = getattr(update, 'effective_user', None)
+        scope = RequestScope(
+            route=route_for_update(update),
+            update_id=getattr(update, 'update_id', None),
+            user_id=user.id if user else None,
+            username=user.username if user else None,
+        )
+        token = current_scope.set(scope)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await callback(update, context, *args, **kwargs)
+        except Exception:
+            failed = True
+            HANDLER_ERRORS.inc(name, scope.route)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            current_scope.reset(token)
+            HANDLER_SECONDS.observe(name, scope.route, value=duration)
+            UPDATE_STATEMENTS.observe(scope.route, value=scope.db_statements)
+            REGISTRY.route(scope.route).add(duration, scope.db_statements, scope.api_calls, failed)
+            if access_logger.isEnabledFor(logging.INFO):
+                access_logger.info(
+                    "%s handled by %s", scope.route, name,
+                    extra={
+                        'event': 'update', 'update_id': scope.update_id, 'user_id': scope.user_id,
+                        'username': scope.username, 'route': scope.route,
+                        'duration_ms': round(duration * 1000, 3), 'db_statements': scope.db_statements,
+                        'db_calls': scope.db_calls, 'api_calls': scope.api_calls,
+                    }
+                )
+
+    wrapper.__wrapped_handler__ = True
+    return wrapper
+
+
+def instrument_application(application) -> None:
+    """Оборачивает callback каждого зарегистрированного обработчика"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not getattr(handler.callback, '__wrapped_handler__', False):
+                handler.callback = timed_handler(handler.callback)
@@ -0,0 +1,116 @@
+"""
+Асинхронное структурированное логирование: QueueHandler -> QueueListener -> JSON
+
+На потоке event loop остается только создание LogRecord и копирование контекста
+обновления; форматирование и запись в поток выполняются в потоке QueueListener.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from monitoring.instrumentation import current_scope
+
+
+# Поля контекста, которые переносятся в каждую запись
+CONTEXT_FIELDS = ('update_id', 'user_id', 'username', 'route')
+# Дополнительные поля из extra=..., попадающие в JSON
+EXTRA_FIELDS = ('duration_ms', 'db_statements', 'db_calls', 'api_calls', 'event')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Копирует контекст текущего обновления в запись (на потоке вызова)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        scope = current_scope.get()
+        if scope is not None:
+            for name in CONTEXT_FIELDS:
+                if not hasattr(record, name):
+                    setattr(record, name, getattr(scope, name, None))
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования на потоке вызова
+
+    Стандартный prepare() форматирует сообщение сразу; очередь здесь внутрипроцессная,
+    поэтому запись передается как есть и форматируется в потоке слушателя.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS + EXTRA_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                payload[name] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Разбор уровней по модулям: 'httpx=WARNING,database.db=DEBUG'"""
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: str = 'INFO', module_levels: Optional[Dict[str, str]] = None,
+                  fmt: str = 'json', stream=None) -> logging.handlers.QueueListener:
+    """Настройка корневого логгера; повторный вызов пересоздает конвейер"""
+    global _listener
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает поток слушателя"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,142 @@
+"""
+Профилирование работающего бота по команде: cProfile на N секунд или N обновлений
+
+Пока профилировщик выключен, в обработке обновлений не участвует ничего:
+счетчик обновлений добавляется в (пустую) группу только на время сеанса.
+"""
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+
+logger = logging.getLogger(__name__)
+
+# Группа счетчика: после всех обработчиков, чтобы N-е обновление попало в профиль целиком
+COUNTER_GROUP = 1000
+SUMMARY_TOP = 12
+
+
+@dataclass
+class ProfileResult:
+    path: str
+    duration_s: float
+    updates: int
+    summary: List[str]
+
+
+class RuntimeProfiler:
+    """Сеанс cProfile, включаемый и выключаемый на лету"""
+
+    def __init__(self, application: Application, directory: str):
+        self.application = application
+        self.directory = directory
+        self._profile: Optional[cProfile.Profile] = None
+        self._started = 0.0
+        self._updates = 0
+        self._limit_updates: Optional[int] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._counter: Optional[TypeHandler] = None
+        self._notify_chat_id: Optional[int] = None
+        # Группа создается заранее: добавлять и удалять ключи application.handlers
+        # во время обхода групп в process_update нельзя, а менять сам список можно
+        self._group = application.handlers.setdefault(COUNTER_GROUP, [])
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    def start(self, seconds: Optional[float] = None, updates: Optional[int] = None,
+              notify_chat_id: Optional[int] = None) -> bool:
+        """Запуск сеанса; False, если сеанс уже идет"""
+        if self.active:
+            return False
+        self._notify_chat_id = notify_chat_id
+        self._updates = 0
+        self._limit_updates = updates
+        if updates:
+            self._counter = TypeHandler(Update, self._count_update)
+            self._group.append(self._counter)
+        if seconds:
+            self._timer = asyncio.get_running_loop().call_later(seconds, self._stop_in_background)
+
+        self._started = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        logger.info("Профилирование запущено (секунд: %s, обновлений: %s)", seconds, updates)
+        return True
+
+    def stop(self) -> Optional[ProfileResult]:
+        """Остановка сеанса, сохранение pstats и краткая сводка"""
+        if not self.active:
+            return None
+        profile, self._profile = self._profile, None
+        profile.disable()
+        duration = time.perf_counter() - self._started
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._counter is not None:
+            self._group.remove(self._counter)
+            self._counter = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, time.strftime('profile-%Y%m%d-%H%M%S.pstats'))
+        profile.dump_stats(path)
+        result = ProfileResult(path, duration, self._updates, summarize(profile))
+        logger.info("Профиль сохранен в %s (%.1f с, обновлений: %d)", path, duration, self._updates)
+        return result
+
+    async def _count_update(self, update: Update, context) -> None:
+        self._updates += 1
+        if self._limit_updates and self._updates == self._limit_updates:
+            await self._finish()
+
+    def _stop_in_background(self):
+        self._timer = None
+        self.application.create_task(self._finish())
+
+    async def _finish(self):
+        chat_id = self._notify_chat_id
+        result = self.stop()
+        if result and chat_id:
+            await self.application.bot.send_message(chat_id=chat_id, text=format_result(result))
+
+    def toggle(self, seconds: float) -> Optional[ProfileResult]:
+        """Переключение сеанса (для сигнала): старт или досрочная остановка"""
+        if self.active:
+            return self.stop()
+        self.start(seconds=seconds)
+        return None
+
+
+def summarize(profile: cProfile.Profile, top: int = SUMMARY_TOP) -> List[str]:
+    """Топ функций по собственному времени (tottime)"""
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, lineno, func), (cc, nc, tottime, cumtime, _) in stats.stats.items():
+        rows.append((tottime, cumtime, nc, f"{os.path.basename(filename)}:{lineno}({func})"))
+    rows.sort(reverse=True)
+    return [
+        f"{tottime * 1000:8.1f} мс {cumtime * 1000:8.1f} мс {calls:>7}  {name}"
+        for tottime, cumtime, calls, name in rows[:top]
+    ]
+
+
+def format_result(result: ProfileResult) -> str:
+    lines = [
+        f"🔬 Профиль за {result.duration_s:.1f} с, обновлений: {result.updates}",
+        f"Файл: {result.path}",
+        "",
+        "   tottime    cumtime   calls  функция",
+    ]
+    lines.extend(result.summary)
+    return '\n'.join(lines)
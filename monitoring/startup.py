@@ -0,0 +1,104 @@
+"""
+Время запуска бота по этапам: от старта процесса до готовности и первого обновления
+
+Этапы отсчитываются от запуска процесса (/proc/self/stat), а не от импорта модуля, поэтому
+в них входит и запуск интерпретатора. Итог пишется в лог и метрику betbot_startup_seconds;
+python bot.py --check-startup печатает отчет и сравнивает его с бюджетом.
+"""
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from monitoring.metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+# Бюджет этапов от старта процесса, секунд (systemd перезапускает бота через RestartSec=10)
+STARTUP_BUDGETS = {
+    'imports': 1.0,
+    'ready': 3.0,
+}
+# Группа отметки первого обновления: раньше всех обработчиков
+FIRST_UPDATE_GROUP = -1000
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    'betbot_startup_seconds', 'Время от старта процесса до этапа запуска', ('phase',))
+
+
+def _process_age() -> Optional[float]:
+    """Сколько секунд назад запущен процесс (Linux); None — неизвестно"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Поле 22 — время запуска в тиках с загрузки системы; имя процесса может содержать пробелы
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """Отметки этапов запуска: mark(phase) — секунды от старта процесса"""
+
+    def __init__(self):
+        age = _process_age()
+        # Момент старта процесса по часам perf_counter (без /proc — момент импорта модуля)
+        self._origin = time.perf_counter() - (age if age is not None else 0.0)
+        self.phases: List[Tuple[str, float]] = []
+        self._group: Optional[list] = None
+        self._handler: Optional[TypeHandler] = None
+        self._stop = False
+
+    def mark(self, phase: str) -> float:
+        elapsed = time.perf_counter() - self._origin
+        self.phases.append((phase, elapsed))
+        STARTUP_SECONDS.set(phase, value=elapsed)
+        return elapsed
+
+    def elapsed(self, phase: str) -> Optional[float]:
+        return dict(self.phases).get(phase)
+
+    def watch_first_update(self, application: Application, stop: bool = False) -> None:
+        """Отметка first_update на первом обновлении; после него обработчик удаляется
+
+        stop=True — после первого обновления остановить приложение (--check-startup).
+        """
+        # Как у профилировщика: группа создается заранее, во время обработки меняется только список
+        self._group = application.handlers.setdefault(FIRST_UPDATE_GROUP, [])
+        self._handler = TypeHandler(Update, self._on_first_update)
+        self._stop = stop
+        self._group.append(self._handler)
+
+    async def _on_first_update(self, update: Update, context) -> None:
+        if self._handler in self._group:
+            self._group.remove(self._handler)
+            logger.info("Первое обновление через %.2f с после старта процесса", self.mark('first_update'))
+            if self._stop:
+                context.application.stop_running()
+
+    def over_budget(self) -> Dict[str, float]:
+        """Этапы, превысившие STARTUP_BUDGETS: этап -> время"""
+        phases = dict(self.phases)
+        return {
+            phase: phases[phase] for phase, budget in STARTUP_BUDGETS.items()
+            if phase in phases and phases[phase] > budget
+        }
+
+    def report(self) -> str:
+        lines = []
+        previous = 0.0
+        for phase, elapsed in self.phases:
+            budget = STARTUP_BUDGETS.get(phase)
+            mark = f" (бюджет {budget:.1f} с{', превышен' if elapsed > budget else ''})" if budget else ""
+            lines.append(f"{phase:<14} {elapsed:7.3f} с  +{elapsed - previous:.3f} с{mark}")
+            previous = elapsed
+        return "\n".join(lines)
+
+
+startup = StartupTimer()
@@ -0,0 +1,35 @@
+"""
+Замер вызовов Telegram Bot API на уровне сетевого слоя python-telegram-bot
+"""
+import time
+
+from telegram.request import HTTPXRequest
+
+from monitoring.instrumentation import current_scope
+from monitoring.metrics import REGISTRY
+
+
+API_SECONDS = REGISTRY.histogram(
+    'betbot_telegram_api_duration_seconds', 'Время вызова Bot API', ('method',))
+API_ERRORS = REGISTRY.counter(
+    'betbot_telegram_api_errors_total', 'Ошибки вызовов Bot API (сеть или HTTP >= 400)', ('method',))
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с гистограммой времени по методам API"""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        failed = True
+        try:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+            failed = code >= 400
+            return code, payload
+        finally:
+            API_SECONDS.observe(api_method, value=time.perf_counter() - started)
+            if failed:
+                API_ERRORS.inc(api_method)
+            scope = current_scope.get()
+            if scope is not None:
+                scope.api_calls += 1
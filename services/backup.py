@@ -0,0 +1,234 @@
+"""
+Резервные копии базы: онлайн-копия через sqlite3 backup API, проверка, сжатие и ротация
+
+Копия снимается порциями по BACKUP_PAGES_PER_STEP страниц в отдельном потоке: между
+порциями база свободна для записи, event loop бота не блокируется. Готовая копия
+проверяется (PRAGMA integrity_check и чтение таблиц), при BACKUP_COMPRESS сжимается в gzip,
+старые копии сверх BACKUP_KEEP удаляются. Запуск по расписанию — JobQueue бота
+(BACKUP_INTERVAL), вручную — /backup или из командной строки:
+    python -m services.backup                 # снять копию в BACKUP_DIR
+    python -m services.backup --verify FILE   # проверить копию (.db или .db.gz)
+"""
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+
+from config import BACKUP_DIR, BACKUP_KEEP, BACKUP_COMPRESS, SQLITE_BUSY_TIMEOUT_MS
+from database import db
+from monitoring.metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PAGES_PER_STEP = 256
+# Пауза перед повтором порции, если база занята записью (SQLITE_BUSY), секунд
+BACKUP_STEP_SLEEP_S = 0.005
+BACKUP_PREFIX = 'bets-'
+
+BACKUP_SECONDS = REGISTRY.histogram(
+    'betbot_backup_duration_seconds', 'Время снятия резервной копии по этапам', ('stage',))
+BACKUP_BYTES = REGISTRY.gauge(
+    'betbot_backup_size_bytes', 'Размер последней резервной копии', ('kind',))
+BACKUP_LAST_SUCCESS = REGISTRY.gauge(
+    'betbot_backup_last_success_timestamp_seconds', 'Время последней успешной резервной копии (unix)')
+BACKUP_FAILURES = REGISTRY.counter(
+    'betbot_backup_failures_total', 'Неудачные резервные копии')
+
+# Одна копия за раз: расписание и /backup не пересекаются
+_backup_lock = threading.Lock()
+
+
+class BackupError(Exception):
+    """Копия не снята или не прошла проверку"""
+
+
+@dataclass
+class BackupResult:
+    path: str
+    db_bytes: int
+    file_bytes: int
+    bets: int
+    ledger: int
+    copy_s: float
+    verify_s: float
+    compress_s: float
+    removed: List[str]
+
+    def summary(self) -> str:
+        return (
+            f"{os.path.basename(self.path)}: {self.file_bytes / 1024:.0f} КБ "
+            f"(база {self.db_bytes / 1024:.0f} КБ), пари {self.bets}, ledger {self.ledger}; "
+            f"копия {self.copy_s:.2f} с, проверка {self.verify_s:.2f} с, сжатие {self.compress_s:.2f} с"
+        )
+
+
+def copy_database(source_path: str, target_path: str, pages: int = BACKUP_PAGES_PER_STEP,
+                  sleep: float = BACKUP_STEP_SLEEP_S) -> None:
+    """Онлайн-копия базы порциями по pages страниц"""
+    source = sqlite3.connect(source_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, sleep=sleep)
+        # Копия — самостоятельный файл без -wal
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+
+
+def verify_database(path: str) -> dict:
+    """Проверка копии: целостность и чтение основных таблиц; BackupError при ошибке"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        status = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        if status != 'ok':
+            raise BackupError(f"integrity_check: {status}")
+        return {
+            'bets': conn.execute('SELECT COUNT(*) FROM bets').fetchone()[0],
+            'ledger': conn.execute('SELECT COUNT(*) FROM ledger').fetchone()[0],
+        }
+    except sqlite3.DatabaseError as e:
+        raise BackupError(str(e))
+    finally:
+        conn.close()
+
+
+def verify_backup(path: str) -> dict:
+    """Проверка восстановления из файла копии (.db или .db.gz во временный файл)"""
+    if not path.endswith('.gz'):
+        return verify_database(path)
+    fd, restored = tempfile.mkstemp(suffix='.db')
+    try:
+        with os.fdopen(fd, 'wb') as target, gzip.open(path, 'rb') as source:
+            shutil.copyfileobj(source, target)
+        return verify_database(restored)
+    finally:
+        os.remove(restored)
+
+
+def _compress(path: str) -> str:
+    compressed = path + '.gz'
+    with open(path, 'rb') as source, gzip.open(compressed, 'wb', compresslevel=6) as target:
+        shutil.copyfileobj(source, target)
+    os.remove(path)
+    return compressed
+
+
+def list_backups(directory: str = BACKUP_DIR) -> List[str]:
+    """Файлы копий, от старых к новым (имя содержит время снятия)"""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(BACKUP_PREFIX) and (name.endswith('.db') or name.endswith('.db.gz'))
+    )
+    return [os.path.join(directory, name) for name in names]
+
+
+def rotate(directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP) -> List[str]:
+    """Удаление копий сверх keep последних"""
+    backups = list_backups(directory)
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def create_backup(directory: str = BACKUP_DIR, compress: bool = BACKUP_COMPRESS,
+                  keep: int = BACKUP_KEEP) -> BackupResult:
+    """Снятие, проверка, сжатие копии и ротация (блокирующая функция, вызывать в потоке)"""
+    if not _backup_lock.acquire(blocking=False):
+        raise BackupError("Резервная копия уже снимается")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{BACKUP_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+        partial = path + '.part'
+        try:
+            started = time.perf_counter()
+            copy_database(db.DB_PATH, partial)
+            copied = time.perf_counter()
+            counts = verify_database(partial)
+            verified = time.perf_counter()
+            # Под именем копии появляется только проверенный файл
+            os.replace(partial, path)
+            db_bytes = os.path.getsize(path)
+            if compress:
+                path = _compress(path)
+            compressed = time.perf_counter()
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            BACKUP_FAILURES.inc()
+            raise
+
+        result = BackupResult(
+            path=path, db_bytes=db_bytes, file_bytes=os.path.getsize(path),
+            bets=counts['bets'], ledger=counts['ledger'],
+            copy_s=copied - started, verify_s=verified - copied, compress_s=compressed - verified,
+            removed=rotate(directory, keep)
+        )
+        BACKUP_SECONDS.observe('copy', value=result.copy_s)
+        BACKUP_SECONDS.observe('verify', value=result.verify_s)
+        BACKUP_SECONDS.observe('compress', value=result.compress_s)
+        BACKUP_BYTES.set('database', value=result.db_bytes)
+        BACKUP_BYTES.set('file', value=result.file_bytes)
+        BACKUP_LAST_SUCCESS.set(value=time.time())
+        logger.info("Резервная копия: %s", result.summary())
+        return result
+    finally:
+        _backup_lock.release()
+
+
+async def run_backup() -> BackupResult:
+    """Резервная копия из event loop: вся работа в отдельном потоке"""
+    return await asyncio.to_thread(create_backup)
+
+
+async def backup_job(context) -> None:
+    """Задача JobQueue: копия по расписанию BACKUP_INTERVAL"""
+    try:
+        await run_backup()
+    except BackupError as e:
+        logger.error("Резервная копия не снята: %s", e)
+    except Exception:
+        logger.exception("Ошибка резервного копирования")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Резервная копия базы бота")
+    parser.add_argument('--db', default=db.DB_PATH, help='Файл базы данных')
+    parser.add_argument('--output', default=BACKUP_DIR, help='Каталог копий')
+    parser.add_argument('--keep', type=int, default=BACKUP_KEEP, help='Сколько последних копий хранить')
+    parser.add_argument('--no-compress', action='store_true', help='Не сжимать копию')
+    parser.add_argument('--verify', metavar='FILE', help='Только проверить файл копии')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.verify:
+            counts = verify_backup(args.verify)
+            print(f"{args.verify}: ok, пари {counts['bets']}, ledger {counts['ledger']}")
+            return 0
+        db.DB_PATH = args.db
+        result = create_backup(args.output, compress=not args.no_compress, keep=args.keep)
+    except (BackupError, OSError, sqlite3.Error) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(result.summary())
+    for path in result.removed:
+        print(f"удалена {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Кодек callback_data кнопок
+
+Данные кнопки — "~" и base64url (без "=") от байтов:
+    версия (1 байт) | код действия (1 байт) | поля по схеме действия
+Типы полей: int — беззнаковое целое переменной длины (varint), str — длина (varint) и
+UTF-8, перечисление (кортеж значений) — номер значения, 1 байт. Порядок и типы полей
+задает схема действия в ACTIONS, поэтому "_" в имени игрока или длинное название не
+ломают разбор. Коды действий и значения перечислений только добавляются в конец:
+кнопки в уже отправленных сообщениях должны читаться и после обновления бота.
+
+Если данные не помещаются в 64 байта (ограничение Telegram), поля сохраняются в
+state/payloads.py, а в кнопке остаются код 0, код действия и ключ.
+
+Кнопки, отправленные до кодека ("side_5_A", "player_ash"), разбираются в те же
+CallbackData. parse() кэширует результат: маршрут для метрик (monitoring/instrumentation.py)
+и обработчик разбирают одну строку один раз.
+"""
+import base64
+import functools
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from state.payloads import payloads, KEY_SIZE
+
+
+CALLBACK_VERSION = 1
+# Признак закодированных данных: в прежних callback_data и в алфавите base64url его нет
+CALLBACK_MARKER = '~'
+# Ограничение Telegram на callback_data, байт
+CALLBACK_DATA_LIMIT = 64
+# Сколько разобранных строк держать в кэше parse()
+PARSE_CACHE = 4096
+# Код ссылки на данные в state/payloads.py
+REF_CODE = 0
+
+SIDES = ('A', 'B')
+RESULTS = ('A', 'B', 'VOID')
+MENU_ITEMS = ('create_bet', 'active_bets', 'bets_24h', 'statistics', 'reset_stats', 'kick_dog', 'back')
+PERIODS = ('today', '7d', '30d', 'all')
+
+# Действие -> (код, типы полей); имя действия — метка маршрута в метриках
+ACTIONS: Dict[str, Tuple[int, Tuple[Any, ...]]] = {
+    'menu': (1, (MENU_ITEMS,)),
+    'bn': (2, (int,)),  # ID названия пари в каталоге
+    'pl': (3, (int,)),  # ID игрока в каталоге
+    'take': (4, (int,)),
+    'side': (5, (int, SIDES)),
+    'result_menu': (6, (int,)),
+    'result': (7, (int, RESULTS)),
+    'noop': (8, (int,)),
+    'reset_confirm': (9, ()),
+    'jobcancel': (10, (int,)),
+    'stats': (11, (PERIODS,)),
+    'cancel': (12, (int,)),
+    'stake': (13, (int, int)),
+    'op': (14, (int, SIDES)),
+    'opct': (15, (int, int)),
+    'chresult_menu': (16, (int,)),
+    'chresult': (17, (int, RESULTS)),
+    'edit': (18, (int,)),
+}
+_BY_CODE = {code: (action, fields) for action, (code, fields) in ACTIONS.items()}
+
+# Прежние префиксы: (префикс, действие, типы полей); более длинные префиксы — раньше
+LEGACY_PREFIXES = (
+    ('betname_', 'bn', (str,)),
+    ('bn_', 'bn', (int,)),
+    ('player_', 'pl', (str,)),
+    ('pl_', 'pl', (int,)),
+    ('menu_', 'menu', (MENU_ITEMS,)),
+    ('take_', 'take', (int,)),
+    ('side_', 'side', (int, SIDES)),
+    ('result_menu_', 'result_menu', (int,)),
+    ('result_', 'result', (int, RESULTS)),
+    ('noop_', 'noop', (int,)),
+    ('jobcancel_', 'jobcancel', (int,)),
+    ('stats_', 'stats', (PERIODS,)),
+    ('cancel_', 'cancel', (int,)),
+    ('stake_', 'stake', (int, int)),
+    ('opct_', 'opct', (int, int)),
+    ('op_', 'op', (int, SIDES)),
+    ('chresult_menu_', 'chresult_menu', (int,)),
+    ('chresult_', 'chresult', (int, RESULTS)),
+    ('edit_', 'edit', (int,)),
+)
+
+
+class CallbackError(ValueError):
+    """callback_data не разбирается: чужой формат, неизвестное действие или поле"""
+
+
+class CallbackData(NamedTuple):
+    """Разобранные данные кнопки
+
+    ref — ключ данных в state/payloads.py: поля еще не загружены (args пустой), их
+    загружает decode().
+    """
+    action: str
+    args: Tuple[Any, ...]
+    ref: Optional[bytes] = None
+
+
+def _write_uint(out: bytearray, value: int):
+    if value < 0:
+        raise CallbackError(f"Отрицательное значение поля: {value}")
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_uint(raw: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        if pos >= len(raw):
+            raise CallbackError("Данные кнопки обрезаны")
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _pack_fields(action: str, fields: Sequence, args: Sequence) -> bytes:
+    if len(args) != len(fields):
+        raise CallbackError(f"{action}: ожидается полей {len(fields)}, передано {len(args)}")
+    out = bytearray()
+    for kind, value in zip(fields, args):
+        if kind is int:
+            _write_uint(out, int(value))
+        elif kind is str:
+            encoded = str(value).encode()
+            _write_uint(out, len(encoded))
+            out += encoded
+        else:
+            try:
+                out.append(kind.index(value))
+            except ValueError:
+                raise CallbackError(f"{action}: недопустимое значение {value!r}") from None
+    return bytes(out)
+
+
+def _unpack_fields(action: str, fields: Sequence, raw: bytes, pos: int = 0) -> Tuple[Any, ...]:
+    args = []
+    for kind in fields:
+        if kind is int:
+            value, pos = _read_uint(raw, pos)
+        elif kind is str:
+            size, pos = _read_uint(raw, pos)
+            if pos + size > len(raw):
+                raise CallbackError("Данные кнопки обрезаны")
+            value = raw[pos:pos + size].decode()
+            pos += size
+        else:
+            if pos >= len(raw) or raw[pos] >= len(kind):
+                raise CallbackError(f"{action}: недопустимое значение поля")
+            value = kind[raw[pos]]
+            pos += 1
+        args.append(value)
+    if pos != len(raw):
+        raise CallbackError(f"{action}: лишние байты в данных кнопки")
+    return tuple(args)
+
+
+def _wrap(raw: bytes) -> str:
+    return CALLBACK_MARKER + base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def encode(action: str, *args) -> str:
+    """callback_data кнопки: encode('side', 42, 'A')"""
+    try:
+        code, fields = ACTIONS[action]
+    except KeyError:
+        raise CallbackError(f"Неизвестное действие: {action}") from None
+    packed = _pack_fields(action, fields, args)
+    data = _wrap(bytes((CALLBACK_VERSION, code)) + packed)
+    if len(data) > CALLBACK_DATA_LIMIT:
+        data = _wrap(bytes((CALLBACK_VERSION, REF_CODE, code)) + payloads.put(packed))
+    return data
+
+
+def _parse_legacy(data: str) -> CallbackData:
+    if data == 'reset_confirm':
+        return CallbackData('reset_confirm', ())
+    for prefix, action, fields in LEGACY_PREFIXES:
+        if data.startswith(prefix):
+            parts = data[len(prefix):].split('_', len(fields) - 1)
+            if len(parts) != len(fields):
+                raise CallbackError(f"Ошибка формата callback: {data}")
+            args = []
+            for kind, part in zip(fields, parts):
+                if kind is int:
+                    try:
+                        args.append(int(part))
+                    except ValueError:
+                        raise CallbackError(f"Ошибка формата callback: {data}") from None
+                elif kind is str:
+                    args.append(part)
+                elif part in kind:
+                    args.append(part)
+                else:
+                    raise CallbackError(f"Ошибка формата callback: {data}")
+            return CallbackData(action, tuple(args))
+    raise CallbackError(f"Неизвестный callback: {data}")
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE)
+def parse(data: str) -> CallbackData:
+    """Разбор callback_data без обращения к хранилищу (для ссылок поле ref вместо args)"""
+    if not data.startswith(CALLBACK_MARKER):
+        return _parse_legacy(data)
+    body = data[1:]
+    try:
+        raw = base64.urlsafe_b64decode(body + '=' * (-len(body) % 4))
+    except ValueError:
+        raise CallbackError(f"Ошибка формата callback: {data}") from None
+    if len(raw) < 2 or raw[0] != CALLBACK_VERSION:
+        raise CallbackError(f"Неизвестная версия данных кнопки: {data}")
+    if raw[1] == REF_CODE:
+        if len(raw) != 3 + KEY_SIZE or raw[2] not in _BY_CODE:
+            raise CallbackError(f"Ошибка формата ссылки: {data}")
+        return CallbackData(_BY_CODE[raw[2]][0], (), raw[3:])
+    try:
+        action, fields = _BY_CODE[raw[1]]
+    except KeyError:
+        raise CallbackError(f"Неизвестное действие в данных кнопки: {data}") from None
+    return CallbackData(action, _unpack_fields(action, fields, raw, 2))
+
+
+async def decode(data: str) -> Optional[CallbackData]:
+    """Разобранные данные кнопки с полями; None — данные по ссылке больше не хранятся"""
+    callback = parse(data)
+    if callback.ref is None:
+        return callback
+    packed = await payloads.get(callback.ref)
+    if packed is None:
+        return None
+    return CallbackData(callback.action, _unpack_fields(callback.action, ACTIONS[callback.action][1], packed))
+
+
+def route_label(data: str) -> str:
+    """Метка маршрута для метрик: cb:side, cb:menu_back, ..."""
+    try:
+        callback = parse(data)
+    except CallbackError:
+        return 'cb:other'
+    if callback.action == 'menu' and callback.args:
+        return f"cb:menu_{callback.args[0]}"
+    return f"cb:{callback.action}"
@@ -0,0 +1,181 @@
+"""
+Сводки в группы и снимки статистики для экранов бота
+
+Ежедневная (DIGEST_TIME) и еженедельная (DIGEST_WEEKDAY) задачи JobQueue один раз считают
+статистику пары за период и список завершенных пари и отправляют сводку в групповые чаты,
+где играла пара. Результат сохраняется снимком в хранилище состояния: экраны «Статистика»
+(сегодня, 7 дней) и «Пари за сутки» берут снимок, пока версия данных не изменилась, и
+обращаются к базе только при его отсутствии (посчитанное ими тоже становится снимком).
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from telegram.error import TelegramError
+
+from config import DIGEST_SNAPSHOT_TTL
+from database import db
+from database.tenants import tenants
+from database.users import users
+from models.bet import Bet
+from models.tenant import Tenant
+from monitoring.metrics import REGISTRY
+from services.export import period_start
+from services.outbox import outbox
+from state.base import get_backend
+
+
+logger = logging.getLogger(__name__)
+
+# Периоды экранов статистики, для которых хранятся снимки
+SNAPSHOT_PERIODS = ('today', '7d')
+# Вид сводки -> (период статистики, заголовок)
+DIGESTS = {
+    'daily': ('today', "Итоги дня"),
+    'weekly': ('7d', "Итоги недели"),
+}
+# Сколько завершенных пари перечислять в ежедневной сводке
+MAX_DIGEST_BETS = 15
+
+SNAPSHOT_LOOKUPS = REGISTRY.counter(
+    'betbot_snapshot_lookups_total', 'Обращения к снимкам статистики', ('view', 'result'))
+DIGESTS_SENT = REGISTRY.counter(
+    'betbot_digests_sent_total', 'Отправленные сводки', ('kind',))
+
+
+def _key(tenant_id: int, view: str) -> str:
+    return f"digest:{tenant_id}:{view}"
+
+
+async def statistics_snapshot(tenant: Tenant, period: str,
+                              now: Optional[datetime] = None) -> Tuple[dict, Optional[datetime], datetime]:
+    """Статистика пары за период: (stats, начало периода, момент расчета)
+
+    Снимок подходит, если данные с момента расчета не менялись; для «сегодня» — еще и если
+    расчет был в тот же день. Скользящее окно 7 дней сдвигается не больше чем на
+    DIGEST_SNAPSHOT_TTL (время жизни снимка).
+    """
+    now = now or datetime.now()
+    start = period_start(period, now)
+    version = db.get_data_version()
+    backend = get_backend()
+    snapshot = await backend.get(_key(tenant.id, period))
+    if snapshot is not None and snapshot['version'] == version and (
+            period != 'today' or snapshot['start'] == start.isoformat()):
+        SNAPSHOT_LOOKUPS.inc(period, 'hit')
+        snapshot_start = datetime.fromisoformat(snapshot['start']) if snapshot['start'] else None
+        return snapshot['stats'], snapshot_start, datetime.fromisoformat(snapshot['at'])
+
+    SNAPSHOT_LOOKUPS.inc(period, 'miss')
+    # Расчет по истории — в потоке: пока он идет, цикл событий обрабатывает другие обновления
+    stats = await asyncio.to_thread(db.get_all_statistics, start, now, tenant.id, users.user_ids(tenant.players))
+    await backend.set(_key(tenant.id, period), {
+        'version': version,
+        'start': start.isoformat() if start else None,
+        'at': now.isoformat(),
+        'stats': stats,
+    }, DIGEST_SNAPSHOT_TTL)
+    return stats, start, now
+
+
+async def finished_bets_snapshot(tenant_id: int, now: Optional[datetime] = None) -> List[Bet]:
+    """Пари, завершенные за последние 24 часа
+
+    Пока версия данных не изменилась, новых завершенных пари нет, поэтому снимок,
+    отфильтрованный по текущей границе суток, совпадает с запросом к базе.
+    """
+    now = now or datetime.now()
+    version = db.get_data_version()
+    backend = get_backend()
+    snapshot = await backend.get(_key(tenant_id, '24h'))
+    if snapshot is not None and snapshot['version'] == version:
+        SNAPSHOT_LOOKUPS.inc('24h', 'hit')
+        cutoff = now - timedelta(days=1)
+        bets = (Bet.from_dict(data) for data in snapshot['bets'])
+        return [bet for bet in bets if bet.finished_at >= cutoff]
+
+    SNAPSHOT_LOOKUPS.inc('24h', 'miss')
+    bets = await asyncio.to_thread(db.get_bets_last_24h, tenant_id)
+    await backend.set(_key(tenant_id, '24h'), {
+        'version': version,
+        'bets': [dict(bet.to_dict(), id=bet.id) for bet in bets],
+    }, 86400)
+    return bets
+
+
+def _result_name(bet: Bet) -> str:
+    if bet.result == 'A':
+        return bet.playerA_name
+    if bet.result == 'B':
+        return bet.playerB_name
+    return 'VOID'
+
+
+def format_digest(title: str, stats: dict, start: Optional[datetime], now: datetime,
+                  bets: Optional[List[Bet]] = None) -> str:
+    """Текст сводки (без разметки: в именах бывают символы Markdown)"""
+    period = f"{start.strftime('%d.%m')}–{now.strftime('%d.%m.%Y')}" if start and start.date() != now.date() \
+        else now.strftime('%d.%m.%Y')
+    lines = [f"📬 {title} ({period})", ""]
+    for username, user_stats in stats.items():
+        lines.append(
+            f"{username}: {user_stats['total_balance']:+.0f} ₽, пари {user_stats['total_bets']}, "
+            f"победы {user_stats['wins']} / поражения {user_stats['losses']}"
+        )
+    if bets:
+        lines += ["", f"Завершено пари: {len(bets)}"]
+        for bet in bets[:MAX_DIGEST_BETS]:
+            name = f" {bet.bet_name}" if bet.bet_name else ""
+            lines.append(
+                f"#{bet.id}{name} {bet.playerA_name} vs {bet.playerB_name} — {_result_name(bet)}; "
+                f"{bet.maker_username} {bet.maker_win:+.0f} | {bet.taker_username} {bet.taker_win:+.0f}"
+            )
+        if len(bets) > MAX_DIGEST_BETS:
+            lines.append(f"… и еще {len(bets) - MAX_DIGEST_BETS}")
+    return "\n".join(lines)
+
+
+async def send_digest(bot, kind: str, now: Optional[datetime] = None) -> int:
+    """Сводка kind во все группы, где пара играла за неделю; возвращает число отправленных"""
+    period, title = DIGESTS[kind]
+    now = now or datetime.now()
+    texts = {}
+    sent = 0
+    for chat_id, tenant_id in db.get_digest_chats(now - timedelta(days=7)):
+        if tenant_id not in texts:
+            tenant = tenants.get(tenant_id)
+            if tenant is None:
+                texts[tenant_id] = None
+                continue
+            stats, start, as_of = await statistics_snapshot(tenant, period, now)
+            bets = await finished_bets_snapshot(tenant_id, now) if kind == 'daily' else None
+            # Без пари за период сводку не отправляем
+            active = any(user_stats['total_bets'] for user_stats in stats.values())
+            texts[tenant_id] = format_digest(title, stats, start, as_of, bets) if active else None
+        if texts[tenant_id] is None:
+            continue
+        try:
+            await outbox.call(bot, 'send_message', chat_id=chat_id, text=texts[tenant_id])
+        except TelegramError as e:
+            logger.warning("Сводка в чат %s не отправлена: %s", chat_id, e)
+            continue
+        sent += 1
+    DIGESTS_SENT.inc(kind, amount=sent)
+    return sent
+
+
+async def daily_digest_job(context) -> None:
+    """Задача JobQueue: ежедневная сводка"""
+    try:
+        await send_digest(context.bot, 'daily')
+    except Exception:
+        logger.exception("Ошибка ежедневной сводки")
+
+
+async def weekly_digest_job(context) -> None:
+    """Задача JobQueue: еженедельная сводка"""
+    try:
+        await send_digest(context.bot, 'weekly')
+    except Exception:
+        logger.exception("Ошибка еженедельной сводки")
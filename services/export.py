@@ -0,0 +1,130 @@
+"""
+Выгрузка пари и ledger в файл: gzip CSV или Parquet (колоночный формат, нужен pyarrow)
+
+Строки читаются из базы порциями и сразу пишутся в файл, поэтому память не зависит
+от размера выгрузки. Запуск из командной строки:
+    python -m services.export bets --period 30d --player Inzaaa --output bets.csv.gz
+    python -m services.export ledger --format parquet --output ledger.parquet
+"""
+import argparse
+import csv
+import gzip
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from database import db
+
+
+EXPORT_FORMATS = ('csv', 'parquet')
+EXPORT_PERIODS = ('today', '7d', '30d', 'all')
+EXPORT_CHUNK_SIZE = 1000
+FILE_EXTENSIONS = {'csv': '.csv.gz', 'parquet': '.parquet'}
+
+# Объявленный тип колонки SQLite -> тип pyarrow
+_ARROW_TYPES = {'INTEGER': 'int64', 'REAL': 'float64', 'TEXT': 'string'}
+
+
+def period_start(period: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Начало периода выгрузки (None — за все время)"""
+    now = now or datetime.now()
+    if period == 'today':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == '7d':
+        return now - timedelta(days=7)
+    if period == '30d':
+        return now - timedelta(days=30)
+    return None
+
+
+def export_filename(table: str, fmt: str, period: str = 'all', player: Optional[str] = None) -> str:
+    parts = [table, period] + ([player] if player else []) + [datetime.now().strftime('%Y%m%d-%H%M')]
+    return '_'.join(parts) + FILE_EXTENSIONS[fmt]
+
+
+def _write_csv(path: str, columns: List[Tuple[str, str]], chunks: Iterator[List[tuple]]) -> None:
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        for rows in chunks:
+            writer.writerows(rows)
+
+
+def _write_parquet(path: str, columns: List[Tuple[str, str]], chunks: Iterator[List[tuple]]) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Для формата parquet нужен пакет pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        (name, getattr(pa, _ARROW_TYPES.get(sql_type, 'string'))()) for name, sql_type in columns
+    ])
+    # Каждая порция строк — отдельная группа строк файла
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for rows in chunks:
+            arrays = [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+def export_table(path: str, table: str, fmt: str = 'csv', start_date: Optional[datetime] = None,
+                 end_date: Optional[datetime] = None, tenant_id: Optional[int] = None,
+                 player: Optional[str] = None,
+                 progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """Запись выгрузки в файл path; возвращает число строк
+
+    progress(выгружено, всего) вызывается после каждой порции.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    columns = db.get_export_columns(table)
+    total = db.count_export_rows(table, start_date, end_date, tenant_id, player) if progress else 0
+    exported = 0
+
+    def chunks():
+        nonlocal exported
+        for rows in db.iter_export_rows(table, [name for name, _ in columns], start_date, end_date,
+                                        tenant_id, player, EXPORT_CHUNK_SIZE):
+            yield rows
+            exported += len(rows)
+            if progress is not None:
+                progress(exported, total)
+
+    writer = _write_csv if fmt == 'csv' else _write_parquet
+    try:
+        writer(path, columns, chunks())
+    except BaseException:
+        # Недописанный файл не оставляем
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return exported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка пари и ledger из базы бота")
+    parser.add_argument('table', choices=sorted(db.EXPORT_TABLES))
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--period', choices=EXPORT_PERIODS, default='all')
+    parser.add_argument('--player', help='Только строки с участием игрока (username)')
+    parser.add_argument('--tenant', type=int, help='Только пара игроков с этим ID')
+    parser.add_argument('--db', default=db.DB_PATH, help='Файл базы данных')
+    parser.add_argument('--output', help='Файл выгрузки (по умолчанию — имя по таблице и периоду)')
+    args = parser.parse_args(argv)
+
+    db.DB_PATH = args.db
+    player = args.player.lstrip('@') if args.player else None
+    output = args.output or export_filename(args.table, args.format, args.period, player)
+    try:
+        rows = export_table(output, args.table, args.format, period_start(args.period), None,
+                            args.tenant, player)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{rows} строк -> {output} ({os.path.getsize(output)} байт)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
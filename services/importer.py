@@ -0,0 +1,254 @@
+"""
+Импорт истории пари из CSV или JSON: проверка строк, расчет выигрышей, пакетная вставка
+
+Колонки совпадают с выгрузкой bets (services/export.py): maker_username, taker_username,
+bet_name, playerA_name, playerB_name, oddsA, oddsB, stake, taker_side, result,
+created_at, finished_at, status. Колонки id, maker_win, taker_win, tenant_id, chat_id и
+reminded_at игнорируются: ID назначаются заново, выигрыши пересчитываются, пара задается при импорте.
+Запуск из командной строки:
+    python -m services.importer history.csv --tenant 1
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from database import db
+from models.bet import Bet, STATUS_FINISHED, STATUS_CANCELED
+from models.tenant import DEFAULT_TENANT_ID
+
+
+IMPORT_CHUNK_SIZE = 500
+# Сколько отклоненных строк хранить в отчете
+MAX_REJECTED = 100
+IMPORT_STATUSES = (STATUS_FINISHED, STATUS_CANCELED)
+
+
+class RowError(ValueError):
+    """Строка не прошла проверку"""
+
+
+@dataclass
+class ImportReport:
+    """Итог импорта: rejected — [(номер строки, причина)], первые MAX_REJECTED"""
+    total: int = 0
+    imported: int = 0
+    rejected_count: int = 0
+    rejected: List[Tuple[int, str]] = field(default_factory=list)
+    seconds: float = 0.0
+    # Импорт остановлен отменой: записаны только порции до нее (imported)
+    canceled: bool = False
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total / self.seconds if self.seconds else 0.0
+
+    def reject(self, line: int, reason: str):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REJECTED:
+            self.rejected.append((line, reason))
+
+    def summary(self) -> str:
+        text = "Импорт отменен, записанные до отмены пари остаются\n" if self.canceled else ''
+        text += (
+            f"Импортировано {self.imported} из {self.total} строк за {self.seconds:.2f} с "
+            f"({self.rows_per_second:.0f} строк/с), отклонено {self.rejected_count}"
+        )
+        for line, reason in self.rejected[:10]:
+            text += f"\nстрока {line}: {reason}"
+        if self.rejected_count > 10:
+            text += f"\n… и еще {self.rejected_count - 10}"
+        return text
+
+
+def _open_text(path: str):
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, dict]]:
+    """Строки файла с номерами: CSV (в том числе .csv.gz) или JSON-массив объектов"""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise RowError("JSON должен быть массивом объектов")
+        yield from enumerate(data, start=1)
+        return
+
+    with _open_text(path) as f:
+        # Номер строки файла с учетом заголовка
+        yield from enumerate(csv.DictReader(f), start=2)
+
+
+def count_rows(path: str) -> int:
+    """Число строк данных (для хода выполнения): отдельный проход по файлу"""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return len(data) if isinstance(data, list) else 0
+    with _open_text(path) as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def _text(row: dict, key: str, required: bool = True) -> Optional[str]:
+    value = row.get(key)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise RowError(f"нет значения {key}")
+        return None
+    return value
+
+
+def _number(row: dict, key: str) -> float:
+    value = _text(row, key)
+    try:
+        return float(value.replace(',', '.'))
+    except ValueError:
+        raise RowError(f"{key}: не число ({value})")
+
+
+def _timestamp(row: dict, key: str, required: bool = True) -> Optional[datetime]:
+    value = _text(row, key, required)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise RowError(f"{key}: ожидается дата ISO 8601 ({value})")
+
+
+def parse_bet(row: dict, tenant, user_ids: dict) -> Bet:
+    """Проверка строки и построение завершенного или отмененного пари; RowError — причина отказа"""
+    maker_username = _text(row, 'maker_username').lstrip('@')
+    taker_username = _text(row, 'taker_username').lstrip('@')
+    if maker_username.lower() == taker_username.lower():
+        raise RowError("maker и taker совпадают")
+    for username in (maker_username, taker_username):
+        if not tenant.is_player(username):
+            raise RowError(f"@{username} не игрок пары")
+        if username.lower() not in user_ids:
+            raise RowError(f"@{username} еще не писал боту (нет user_id)")
+
+    oddsA, oddsB = _number(row, 'oddsA'), _number(row, 'oddsB')
+    if oddsA <= 1 or oddsB <= 1:
+        raise RowError("коэффициенты должны быть больше 1")
+    stake = _number(row, 'stake')
+    if stake <= 0:
+        raise RowError("ставка должна быть больше 0")
+
+    result = (_text(row, 'result', required=False) or '').upper() or None
+    status = (_text(row, 'status', required=False) or '').upper() or (STATUS_FINISHED if result else STATUS_CANCELED)
+    if status not in IMPORT_STATUSES:
+        raise RowError(f"статус {status}: импортируются только {', '.join(IMPORT_STATUSES)}")
+    taker_side = (_text(row, 'taker_side', required=status == STATUS_FINISHED) or '').upper() or None
+    if taker_side not in (None, 'A', 'B'):
+        raise RowError(f"taker_side: A или B ({taker_side})")
+    if status == STATUS_FINISHED and result not in ('A', 'B', 'VOID'):
+        raise RowError(f"result: A, B или VOID ({result})")
+
+    created_at = _timestamp(row, 'created_at')
+    finished_at = _timestamp(row, 'finished_at', required=False)
+    if status == STATUS_FINISHED:
+        finished_at = finished_at or created_at
+        if finished_at < created_at:
+            raise RowError("finished_at раньше created_at")
+
+    bet = Bet(
+        id=None,
+        maker_user_id=user_ids[maker_username.lower()],
+        maker_username=maker_username,
+        taker_user_id=user_ids[taker_username.lower()],
+        taker_username=taker_username,
+        bet_name=_text(row, 'bet_name', required=False),
+        playerA_name=_text(row, 'playerA_name'),
+        playerB_name=_text(row, 'playerB_name'),
+        oddsA=oddsA,
+        oddsB=oddsB,
+        stake=stake,
+        status=status,
+        taker_side=taker_side,
+        result=result if status == STATUS_FINISHED else None,
+        created_at=created_at,
+        finished_at=finished_at,
+        tenant_id=tenant.id
+    )
+    if status == STATUS_FINISHED:
+        bet.maker_win, bet.taker_win = bet.payout(result)
+    return bet
+
+
+def import_file(path: str, tenant_id: int = DEFAULT_TENANT_ID,
+                progress: Optional[Callable[[int, int], None]] = None,
+                canceled: Optional[Callable[[], bool]] = None) -> ImportReport:
+    """Импорт файла в пару tenant_id транзакциями по IMPORT_CHUNK_SIZE пари
+
+    Отклоненные строки не мешают остальным; progress(обработано, всего) — после каждой порции.
+    canceled() проверяется перед записью каждой порции: после отмены импорт останавливается
+    и возвращает отчет с числом уже записанных пари (canceled=True).
+    """
+    tenant = db.get_tenant(tenant_id)
+    if tenant is None:
+        raise RowError(f"Пара {tenant_id} не найдена")
+    user_ids = db.find_user_ids(tenant.players)
+    report = ImportReport()
+    started = time.perf_counter()
+    chunk: List[Bet] = []
+
+    def flush() -> bool:
+        if canceled is not None and canceled():
+            report.canceled = True
+            return False
+        report.imported += len(db.import_bets(chunk))
+        chunk.clear()
+        if progress is not None:
+            progress(report.total, total)
+        return True
+
+    try:
+        total = count_rows(path) if progress is not None else 0
+        for line, row in read_rows(path):
+            report.total += 1
+            try:
+                if not isinstance(row, dict):
+                    raise RowError("ожидается объект")
+                chunk.append(parse_bet(row, tenant, user_ids))
+            except RowError as e:
+                report.reject(line, str(e))
+            if len(chunk) >= IMPORT_CHUNK_SIZE and not flush():
+                break
+        if chunk and not report.canceled:
+            flush()
+    except (csv.Error, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise RowError(f"Файл не читается: {e}")
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт истории пари из CSV или JSON")
+    parser.add_argument('file', help='CSV (можно .csv.gz, как у выгрузки) или JSON-массив')
+    parser.add_argument('--tenant', type=int, default=DEFAULT_TENANT_ID, help='ID пары игроков')
+    parser.add_argument('--db', default=db.DB_PATH, help='Файл базы данных')
+    args = parser.parse_args(argv)
+
+    db.DB_PATH = args.db
+    db.init_db()
+    try:
+        report = import_file(args.file, args.tenant)
+    except (RowError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(report.summary())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
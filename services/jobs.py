@@ -0,0 +1,355 @@
+"""
+Фоновые задания в пуле процессов: тяжелые отчеты не блокируют event loop бота
+
+Задание — функция из JOB_TYPES, выполняемая в ProcessPoolExecutor. Ход выполнения
+показывается правкой статусного сообщения, задание можно отменить кнопкой, результат
+кэшируется в хранилище состояния по (тип задания, параметры, версия данных).
+
+Начатое задание процесс пула останавливает в ближайшем report_progress: до этого статус
+показывает «отменяется», а итог — тот, с которым задание действительно завершилось.
+"""
+import asyncio
+import hashlib
+import importlib
+import itertools
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+
+from config import JOB_WORKERS, JOB_CACHE_TTL
+from database import db
+from monitoring.metrics import REGISTRY
+from services.callbacks import encode
+from state.base import get_backend
+
+
+logger = logging.getLogger(__name__)
+
+# Тип задания -> 'модуль:функция' (импортируется в процессе пула)
+JOB_TYPES = {
+    'statistics': 'services.reports:statistics_report',
+    'export': 'services.reports:export_report',
+    'import': 'services.reports:import_report',
+}
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELED = 'canceled'
+
+# Не чаще одной правки статусного сообщения за интервал (лимиты Bot API)
+PROGRESS_EDIT_INTERVAL_S = 1.0
+# Кольцо отмененных заданий, разделяемое с процессами пула
+CANCEL_SLOTS = 256
+
+JOBS_SUBMITTED = REGISTRY.counter('betbot_jobs_submitted_total', 'Фоновые задания по типу', ('type',))
+JOBS_CACHE_HITS = REGISTRY.counter('betbot_jobs_cache_hits_total', 'Результаты заданий из кэша', ('type',))
+JOB_SECONDS = REGISTRY.histogram('betbot_job_seconds', 'Длительность фоновых заданий', ('type', 'status'))
+
+
+class JobCanceled(Exception):
+    """Задание отменено пользователем"""
+
+
+# --- Сторона процесса пула ---
+
+_progress_queue = None
+_canceled = None
+_current_job_id: Optional[int] = None
+
+
+def _init_worker(progress_queue, canceled):
+    global _progress_queue, _canceled
+    _progress_queue = progress_queue
+    _canceled = canceled
+
+
+def _run_job(job_id: int, job_type: str, params: dict, db_path: str):
+    global _current_job_id
+    module_name, func_name = JOB_TYPES[job_type].split(':')
+    func = getattr(importlib.import_module(module_name), func_name)
+    db.DB_PATH = db_path
+    _current_job_id = job_id
+    try:
+        report_progress(0, 1)
+        return func(params)
+    finally:
+        _current_job_id = None
+
+
+def report_progress(done: int, total: int, text: str = '', cancelable: bool = True) -> None:
+    """Ход выполнения из функции задания; заодно точка отмены (бросает JobCanceled)
+
+    cancelable=False — только ход: задание, которое уже записало часть данных, проверяет
+    отмену само (is_canceled) и возвращает частичный итог.
+    """
+    if _current_job_id is None:
+        # Функция вызвана не из пула (например, напрямую)
+        return
+    if cancelable and is_canceled():
+        raise JobCanceled()
+    _progress_queue.put((_current_job_id, done / total if total else 1.0, text))
+
+
+def is_canceled() -> bool:
+    """Отменено ли выполняемое в этом процессе задание"""
+    return _current_job_id is not None and _canceled[_current_job_id % CANCEL_SLOTS] == _current_job_id
+
+
+# --- Сторона бота ---
+
+@dataclass
+class Job:
+    id: int
+    type: str
+    title: str
+    cache_key: str
+    user_id: Optional[int]
+    cache: bool = True
+    status: str = JOB_QUEUED
+    progress: float = 0.0
+    progress_text: str = ''
+    result: Any = None
+    error: Optional[str] = None
+    started: float = field(default_factory=time.perf_counter)
+    future: Optional[asyncio.Future] = None
+    # Future пула: отмена снимает с очереди еще не начатое задание
+    pool_future: Optional[Future] = None
+    cancel_requested: bool = False
+    # Уборка результата задания, которое отменили, но оно успело завершиться (например, файл)
+    discard: Optional[Callable[[Any], None]] = None
+
+
+# render(result) -> (text, reply_markup) для итогового сообщения
+Render = Callable[[Any], Tuple[str, Optional[InlineKeyboardMarkup]]]
+# Действие с готовым результатом после показа (например, отправка файла)
+OnResult = Callable[[Any], Awaitable[None]]
+
+
+class JobManager:
+    """Очередь заданий поверх ProcessPoolExecutor (пул создается при первом задании)"""
+
+    def __init__(self, max_workers: int = JOB_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._progress_queue = None
+        self._canceled = None
+        self._progress_thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, Job] = {}
+        self._by_key: Dict[str, Job] = {}
+        # Сообщение -> последнее показанное в нем задание (старое не перезаписывает новое)
+        self._shown: Dict[Tuple[int, int], int] = {}
+        self._tasks = set()
+
+    def _ensure_started(self):
+        if self._executor is not None:
+            return
+        context = multiprocessing.get_context('spawn')
+        self._progress_queue = context.SimpleQueue()
+        self._canceled = context.Array('q', CANCEL_SLOTS)
+        self._executor = ProcessPoolExecutor(
+            self.max_workers, mp_context=context,
+            initializer=_init_worker, initargs=(self._progress_queue, self._canceled)
+        )
+        self._loop = asyncio.get_running_loop()
+        self._progress_thread = threading.Thread(target=self._read_progress, name='job-progress', daemon=True)
+        self._progress_thread.start()
+
+    def _read_progress(self):
+        """Поток чтения хода заданий из процессов пула"""
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_progress, *message)
+
+    def _on_progress(self, job_id: int, fraction: float, text: str):
+        job = self._jobs.get(job_id)
+        if job is not None and job.status in (JOB_QUEUED, JOB_RUNNING):
+            job.status = JOB_RUNNING
+            job.progress = fraction
+            job.progress_text = text
+
+    @staticmethod
+    def _cache_key(job_type: str, params: dict, version: str) -> str:
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+        return f"job:{job_type}:{digest}:{version}"
+
+    async def submit(self, job_type: str, params: dict, title: str, user_id: Optional[int] = None,
+                     cache: bool = True, discard: Optional[Callable[[Any], None]] = None) -> Job:
+        """Постановка задания; готовый результат из кэша возвращается сразу (status=done)
+
+        cache=False — одноразовый результат (например, файл выгрузки): без кэша и без
+        объединения с одинаковым выполняющимся заданием. discard(result) вызывается, если
+        задание отменили, а оно завершилось раньше, чем дошло до точки отмены: такое задание
+        считается отмененным. Без discard успевший результат показывается как есть.
+        """
+        cache_key = self._cache_key(job_type, params, db.get_data_version())
+
+        running = self._by_key.get(cache_key) if cache else None
+        if running is not None:
+            return running
+
+        job = Job(next(self._ids), job_type, title, cache_key, user_id, cache, discard=discard)
+        cached = await get_backend().get(cache_key) if cache else None
+        if cached is not None:
+            JOBS_CACHE_HITS.inc(job_type)
+            job.status = JOB_DONE
+            job.result = cached
+            return job
+
+        self._ensure_started()
+        JOBS_SUBMITTED.inc(job_type)
+        self._jobs[job.id] = job
+        if cache:
+            self._by_key[cache_key] = job
+        job.pool_future = self._executor.submit(_run_job, job.id, job_type, params, db.DB_PATH)
+        job.future = asyncio.wrap_future(job.pool_future, loop=self._loop)
+        job.future.add_done_callback(lambda future: self._track(self._finish(job)))
+        return job
+
+    def _track(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _finish(self, job: Job):
+        self._jobs.pop(job.id, None)
+        if self._by_key.get(job.cache_key) is job:
+            del self._by_key[job.cache_key]
+        if job.future.cancelled():
+            job.status = JOB_CANCELED
+        else:
+            error = job.future.exception()
+            if isinstance(error, JobCanceled):
+                job.status = JOB_CANCELED
+            elif error is not None:
+                if isinstance(error, BrokenProcessPool):
+                    # Процесс пула упал: следующий submit создаст пул заново
+                    self._stop_pool()
+                job.status = JOB_FAILED
+                job.error = str(error)
+                logger.error("Задание %s #%d завершилось ошибкой", job.type, job.id, exc_info=error)
+            elif job.cancel_requested and job.discard is not None:
+                job.status = JOB_CANCELED
+                try:
+                    job.discard(job.future.result())
+                except Exception:
+                    logger.exception("Не удалось убрать результат отмененного задания %s #%d", job.type, job.id)
+            else:
+                job.status = JOB_DONE
+                job.result = job.future.result()
+                if job.cache:
+                    await get_backend().set(job.cache_key, job.result, JOB_CACHE_TTL)
+        JOB_SECONDS.observe(job.type, job.status, value=time.perf_counter() - job.started)
+
+    def cancel(self, job_id: int, user_id: Optional[int]) -> bool:
+        """Запрос отмены задания его автором; False, если задание уже завершено или чужое
+
+        Еще не начатое задание снимается с очереди, начатое остановится в report_progress;
+        статус «отменено» показывается, когда процесс пула действительно закончил задание.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or (job.user_id is not None and job.user_id != user_id):
+            return False
+        job.cancel_requested = True
+        self._canceled[job_id % CANCEL_SLOTS] = job_id
+        job.pool_future.cancel()
+        return True
+
+    async def present(self, job: Job, bot, chat_id: int, message_id: int, render: Render,
+                      keyboard: Optional[List[List[InlineKeyboardButton]]] = None,
+                      on_result: Optional[OnResult] = None, parse_mode: Optional[str] = 'Markdown'):
+        """Показ задания в сообщении: ход выполнения, кнопка отмены и итоговый результат
+
+        keyboard — строки кнопок, которые остаются под статусом (например, выбор периода);
+        parse_mode относится к тексту, который возвращает render.
+        """
+        self._shown[(chat_id, message_id)] = job.id
+        if job.status == JOB_DONE:
+            await self._show_result(job, bot, chat_id, message_id, render, on_result, parse_mode)
+            return
+        await self._edit_status(job, bot, chat_id, message_id, keyboard)
+        self._track(self._watch(job, bot, chat_id, message_id, render, keyboard, on_result, parse_mode))
+
+    async def _watch(self, job: Job, bot, chat_id: int, message_id: int, render: Render, keyboard,
+                     on_result: Optional[OnResult], parse_mode: Optional[str]):
+        shown = (job.progress, job.cancel_requested)
+        while not job.future.done():
+            await asyncio.wait([job.future], timeout=PROGRESS_EDIT_INTERVAL_S)
+            if job.future.done() or (job.progress, job.cancel_requested) == shown:
+                continue
+            if self._shown.get((chat_id, message_id)) != job.id:
+                return
+            shown = (job.progress, job.cancel_requested)
+            await self._edit_status(job, bot, chat_id, message_id, keyboard)
+        # Дожидаемся записи результата и статуса в _finish
+        await asyncio.sleep(0)
+        while job.status in (JOB_QUEUED, JOB_RUNNING):
+            await asyncio.sleep(0.01)
+        if self._shown.get((chat_id, message_id)) != job.id:
+            return
+        del self._shown[(chat_id, message_id)]
+        await self._show_result(job, bot, chat_id, message_id, render, on_result, parse_mode)
+
+    async def _edit_status(self, job: Job, bot, chat_id: int, message_id: int, keyboard):
+        if job.cancel_requested:
+            text = f"⏳ {job.title}: отменяется ({job.progress * 100:.0f}%)"
+            await self._edit(bot, chat_id, message_id, text, None, None)
+            return
+        text = f"⏳ {job.title}: {job.progress * 100:.0f}%"
+        if job.progress_text:
+            text += f"\n{job.progress_text}"
+        rows = list(keyboard or []) + [[InlineKeyboardButton("✖️ Отменить", callback_data=encode('jobcancel', job.id))]]
+        await self._edit(bot, chat_id, message_id, text, InlineKeyboardMarkup(rows), None)
+
+    async def _show_result(self, job: Job, bot, chat_id: int, message_id: int, render: Render,
+                           on_result: Optional[OnResult] = None, parse_mode: Optional[str] = 'Markdown'):
+        if job.status == JOB_DONE:
+            text, reply_markup = render(job.result)
+            await self._edit(bot, chat_id, message_id, text, reply_markup, parse_mode)
+            if on_result is not None:
+                await on_result(job.result)
+        elif job.status == JOB_CANCELED:
+            await self._edit(bot, chat_id, message_id, f"🚫 {job.title}: отменено", None, None)
+        else:
+            await self._edit(bot, chat_id, message_id, f"❌ {job.title}: ошибка", None, None)
+
+    @staticmethod
+    async def _edit(bot, chat_id, message_id, text, reply_markup, parse_mode):
+        try:
+            await bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, text=text,
+                reply_markup=reply_markup, parse_mode=parse_mode
+            )
+        except BadRequest as e:
+            # "message is not modified" и удаленные сообщения не мешают заданию
+            logger.debug("Не удалось обновить сообщение задания: %s", e)
+
+    async def shutdown(self):
+        """Отмена ожидающих заданий и остановка пула"""
+        for task in list(self._tasks):
+            task.cancel()
+        self._stop_pool()
+
+    def _stop_pool(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._progress_queue.put(None)
+            self._executor = None
+
+
+jobs = JobManager()
@@ -0,0 +1,279 @@
+"""
+Жизненный цикл процесса бота: запуск с восстановлением состояния и плавная остановка
+
+По SIGTERM (systemctl stop/restart при деплое) или SIGINT:
+1. прекращается получение обновлений (updater.stop подтверждает Telegram полученные);
+2. обработчики дорабатывают принятые обновления, задачи JobQueue и create_task — в пределах
+   SHUTDOWN_TIMEOUT; обновления, до которых очередь не дошла, сохраняются в bot_state;
+3. дорабатывается очередь исходящих (services/outbox.py);
+4. сессии и кэши хранилища в памяти и смещение getUpdates записываются в bot_state,
+   WAL переносится в основной файл базы.
+При запуске все это восстанавливается: сессии визарда и недоработанные обновления переживают
+перезапуск, а обработанные до сбоя обновления подтверждаются Telegram и не приходят повторно.
+
+Рабочий процесс шардирования (services/sharding.py) проходит те же этапы без getUpdates:
+смещение подтверждает мастер, он же переносит WAL после остановки всех рабочих процессов,
+а недоработанные обновления каждого рабочего процесса хранятся под своим ключом.
+"""
+import asyncio
+import json
+import logging
+import signal
+import time
+from typing import List, Optional
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Application, TypeHandler
+
+from config import SHUTDOWN_TIMEOUT, STATE_FLUSH_INTERVAL
+from database import db
+from monitoring.metrics import REGISTRY
+from services.outbox import outbox
+from services.scheduler import FairUpdateProcessor
+from state.base import get_backend
+from state.payloads import payloads
+
+
+logger = logging.getLogger(__name__)
+
+# Ключи bot_state
+OFFSET_KEY = 'polling_offset'
+BACKEND_KEY = 'state_backend'
+PENDING_KEY = 'pending_updates'
+# Сохраненное смещение старше суток не применяется: после недели без обновлений Telegram
+# начинает нумерацию заново, и старое смещение подтвердило бы новые обновления
+OFFSET_MAX_AGE = 86400
+# Недоработанные обновления старше этого не повторяются (кнопки уже неактуальны), секунд
+PENDING_MAX_AGE = 600
+# Группа отметки полученных обновлений: раньше всех обработчиков
+TRACK_GROUP = -2000
+
+SHUTDOWN_SECONDS = REGISTRY.gauge(
+    'betbot_shutdown_seconds', 'Длительность этапов последней остановки', ('phase',))
+RESTORED = REGISTRY.counter(
+    'betbot_restored_total', 'Восстановлено при запуске из bot_state', ('kind',))
+
+
+def save_offset(offset: int) -> None:
+    """Смещение getUpdates: все обновления с меньшим update_id обработаны"""
+    db.save_bot_state({OFFSET_KEY: json.dumps({'offset': offset, 'saved_at': time.time()})})
+
+
+def load_offset() -> Optional[int]:
+    raw = db.get_bot_state(OFFSET_KEY)
+    if raw is None:
+        return None
+    saved = json.loads(raw)
+    if time.time() - saved['saved_at'] > OFFSET_MAX_AGE:
+        return None
+    return saved['offset']
+
+
+class Lifecycle:
+    """Запуск приложения вместо run_polling: восстановление, работа до сигнала, плавная остановка"""
+
+    def __init__(self, application: Application, shutdown_timeout: float = SHUTDOWN_TIMEOUT,
+                 worker: Optional[int] = None):
+        self.application = application
+        self.shutdown_timeout = shutdown_timeout
+        # Номер рабочего процесса шардирования; None — процесс сам получает обновления
+        self.worker = worker
+        self.pending_key = PENDING_KEY if worker is None else f"{PENDING_KEY}:{worker}"
+        # Последнее полученное обработчиками обновление
+        self.last_update_id: Optional[int] = None
+        # Состояние восстановлено: до этого сохранять нечего (иначе затрется сохраненное)
+        self._restored = False
+
+    def run(self, allowed_updates=Update.ALL_TYPES) -> None:
+        """Работа до SIGTERM/SIGINT или application.stop_running(), затем stop()"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._raise_system_exit)
+        try:
+            loop.run_until_complete(self.start(allowed_updates))
+            loop.run_forever()
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Получен сигнал остановки")
+        finally:
+            try:
+                loop.run_until_complete(self.stop())
+            finally:
+                loop.close()
+
+    @staticmethod
+    def _raise_system_exit():
+        raise SystemExit
+
+    async def start(self, allowed_updates=Update.ALL_TYPES) -> None:
+        application = self.application
+        await application.initialize()
+        await self.restore()
+        if application.post_init:
+            await application.post_init(application)
+        application.add_handler(TypeHandler(Update, self._track), group=TRACK_GROUP)
+        if STATE_FLUSH_INTERVAL and application.job_queue:
+            application.job_queue.run_repeating(
+                self._flush_job, STATE_FLUSH_INTERVAL, first=STATE_FLUSH_INTERVAL, name='state_flush'
+            )
+        if self.worker is None:
+            await application.updater.start_polling(allowed_updates=allowed_updates)
+        await application.start()
+
+    async def _track(self, update: Update, context) -> None:
+        if self.last_update_id is None or update.update_id > self.last_update_id:
+            self.last_update_id = update.update_id
+
+    async def restore(self) -> None:
+        """Сессии и кэши, подтверждение обработанных обновлений, недоработанные обновления"""
+        application = self.application
+        now = time.time()
+
+        raw = db.get_bot_state(BACKEND_KEY)
+        if raw is not None:
+            saved = json.loads(raw)
+            elapsed = now - saved['saved_at']
+            items = {
+                key: (value, ttl - elapsed if ttl is not None else None)
+                for key, (value, ttl) in saved['items'].items()
+            }
+            get_backend().load(items)
+            RESTORED.inc('state', amount=len(items))
+
+        offset = load_offset() if self.worker is None else None
+        if offset is not None:
+            # getUpdates со смещением подтверждает все обновления до него: обработанные
+            # до сбоя не придут повторно (само обновление с этим id остается неподтвержденным)
+            try:
+                await application.bot.get_updates(offset=offset, timeout=0, limit=1)
+            except TelegramError as e:
+                logger.warning("Смещение getUpdates %d не подтверждено: %s", offset, e)
+
+        raw = db.get_bot_state(self.pending_key)
+        if raw is not None:
+            saved = json.loads(raw)
+            if now - saved['saved_at'] <= PENDING_MAX_AGE:
+                for data in saved['updates']:
+                    await application.update_queue.put(Update.de_json(data, application.bot))
+                RESTORED.inc('updates', amount=len(saved['updates']))
+                logger.info("Повторно обрабатывается %d обновлений с прошлой остановки", len(saved['updates']))
+            db.save_bot_state({self.pending_key: None})
+        self._restored = True
+
+    def flush(self, pending: Optional[List[Update]] = None, complete: bool = False) -> None:
+        """Запись состояния в bot_state
+
+        complete — все полученные обновления обработаны (иначе последнее могло не завершиться
+        и при сбое придет повторно); pending — обновления, до которых не дошла очередь.
+        """
+        if not self._restored:
+            return
+        values = {}
+        offset = self._offset(complete) if self.worker is None else None
+        if offset is not None:
+            values[OFFSET_KEY] = json.dumps({'offset': offset, 'saved_at': time.time()})
+        items = get_backend().dump()
+        if items is not None:
+            values[BACKEND_KEY] = json.dumps({'items': items, 'saved_at': time.time()})
+        if pending is not None:
+            values[self.pending_key] = json.dumps({
+                'updates': [update.to_dict() for update in pending],
+                'saved_at': time.time(),
+            }) if pending else None
+        if values:
+            db.save_bot_state(values)
+
+    def _offset(self, complete: bool) -> Optional[int]:
+        """Смещение, до которого все полученные обновления обработаны"""
+        if self.last_update_id is None:
+            return None
+        processor = self.application.update_processor
+        if isinstance(processor, FairUpdateProcessor):
+            # Параллельно: последнее полученное могло завершиться раньше предыдущих
+            unfinished = processor.unfinished_ids()
+            return min(unfinished) if unfinished else self.last_update_id + 1
+        return self.last_update_id + 1 if complete else self.last_update_id
+
+    async def _flush_job(self, context) -> None:
+        """Задача JobQueue: периодическое сохранение на случай аварийного завершения"""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Ошибка сохранения состояния бота")
+
+    def _take_queued(self) -> List[Update]:
+        """Обновления, до которых не дошла очередь приложения (или очередь пользователя)
+
+        Сигнал остановки из application.stop() возвращается в очередь: задача получения
+        обновлений не завершается отменой и ждет именно его.
+        """
+        queue = self.application.update_queue
+        updates, signals = [], []
+        while not queue.empty():
+            item = queue.get_nowait()
+            queue.task_done()
+            (updates if isinstance(item, Update) else signals).append(item)
+        for item in signals:
+            queue.put_nowait(item)
+        processor = self.application.update_processor
+        if isinstance(processor, FairUpdateProcessor):
+            updates = processor.take_waiting() + updates
+        return updates
+
+    def _phase(self, phase: str, started: float) -> float:
+        now = time.perf_counter()
+        SHUTDOWN_SECONDS.set(phase, value=now - started)
+        return now
+
+    async def stop(self) -> None:
+        application = self.application
+        started = time.perf_counter()
+        deadline = started + self.shutdown_timeout
+
+        # 1. Новые обновления не принимаются; полученные подтверждаются Telegram
+        if self.worker is None and application.updater.running:
+            await application.updater.stop()
+        phase_start = self._phase('updater', started)
+
+        # 2. Принятые обновления, задачи JobQueue и create_task — до срока
+        pending: List[Update] = []
+        complete = True
+        if application.running:
+            try:
+                await asyncio.wait_for(application.stop(), max(deadline - time.perf_counter(), 0))
+            except asyncio.TimeoutError:
+                complete = False
+                pending = self._take_queued()
+                if application.job_queue:
+                    await application.job_queue.stop(wait=False)
+                logger.warning("Обработчики не завершились за %.0f с: %d обновлений отложено до запуска",
+                               self.shutdown_timeout, len(pending))
+        phase_start = self._phase('handlers', phase_start)
+
+        # 3. Очередь исходящих — в оставшееся время (минимум секунда)
+        await outbox.drain(max(deadline - time.perf_counter(), 1.0))
+        phase_start = self._phase('outbox', phase_start)
+
+        # 4. Состояние процесса (включая данные кнопок, еще не записанные в хранилище) и WAL
+        try:
+            await payloads.flush()
+            self.flush(pending, complete)
+            if self.worker is None:
+                log_pages, checkpointed = db.checkpoint_wal()
+                logger.info("Состояние сохранено, WAL: перенесено %d из %d страниц", checkpointed, log_pages)
+        except Exception:
+            logger.exception("Ошибка сохранения состояния при остановке")
+        self._phase('flush', phase_start)
+
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+        # Обработчики, брошенные по сроку, отменяются до закрытия цикла событий
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Бот остановлен за %.2f с", self._phase('total', started) - started)
@@ -0,0 +1,213 @@
+"""
+Живые карточки: все сообщения, показывающие пари, обновляются при изменении пари
+
+Индекс подписок хранится в хранилище состояния (общий для рабочих процессов с resp://):
+    cards:bet:<ID пари>  -> ключи сообщений, показывающих пари (последние LIVE_CARD_MAX_VIEWS)
+    cards:msg:<ключ>     -> что показывает сообщение (CardView) и ID пари в нем
+Ключ сообщения — "<chat_id>:<message_id>" или inline_message_id. Обработчик, который
+показал карточку или список пари, вызывает show() (после изменения пари — publish());
+переход сообщения к экрану без пари (меню, визард изменения) — release().
+
+После изменения пари refresh() собирает все сообщения с ним, кроме нажатого (его
+обработчик уже перерисовал), и ставит правки в очередь исходящих одной пачкой: правка
+сообщения схлопывается с еще не отправленной правкой того же сообщения, поэтому частые
+изменения дают одну правку с последним состоянием.
+
+Текст и кнопки строит renderer, который задают обработчики (handlers/bet_handlers.py):
+сервису не нужны шаблоны карточек и списков. Список актуальных пари перерисовывается для
+того, кто его открыл (кнопки выбора стороны и отмены зависят от игрока). Подписки — лучшее
+усилие: сообщение, которое удалили или к которому у бота больше нет доступа, выпадает из
+индекса при первой неудачной правке.
+"""
+import asyncio
+import functools
+import logging
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from telegram.error import BadRequest, Forbidden
+
+from config import LIVE_CARD_TTL, LIVE_CARD_MAX_VIEWS
+from models.bet import Bet
+from monitoring.metrics import REGISTRY
+from services.outbox import outbox
+from state.base import get_backend
+
+
+logger = logging.getLogger(__name__)
+
+# Виды сообщений: карточка одного пари и список актуальных пари пары
+VIEW_CARD = 'card'
+VIEW_LIST = 'list'
+
+LIVE_CARD_EDITS = REGISTRY.counter(
+    'betbot_live_card_edits_total', 'Правки сообщений с пари после его изменения', ('result',))
+
+
+class CardView(NamedTuple):
+    """Сообщение, показывающее пари
+
+    viewer и tenant_id — для списка (кнопки зависят от того, кто его открыл), bet_id — для карточки.
+    """
+    kind: str
+    chat_id: Optional[int] = None
+    message_id: Optional[int] = None
+    inline_message_id: Optional[str] = None
+    bet_id: Optional[int] = None
+    viewer: Optional[str] = None
+    tenant_id: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        return self.inline_message_id or f"{self.chat_id}:{self.message_id}"
+
+    @property
+    def target(self) -> dict:
+        """Аргументы editMessageText, указывающие сообщение"""
+        if self.inline_message_id:
+            return {'inline_message_id': self.inline_message_id}
+        return {'chat_id': self.chat_id, 'message_id': self.message_id}
+
+
+# (сообщения, измененные пари по ID) -> (сообщение, текст в Markdown, кнопки, новые ID пари сообщения
+# или None, если они не меняются: из списка пропадают завершенные пари и появляются новые)
+Renderer = Callable[
+    [List[CardView], Dict[int, Bet]],
+    Iterable[Tuple[CardView, str, Optional[object], Optional[List[int]]]]
+]
+
+
+def query_view(query, kind: str = VIEW_CARD, **fields) -> CardView:
+    """Сообщение, на кнопку которого нажали"""
+    if query.inline_message_id:
+        return CardView(kind, inline_message_id=query.inline_message_id, **fields)
+    return CardView(kind, query.message.chat_id, query.message.message_id, **fields)
+
+
+class LiveCards:
+    """Индекс ID пари -> сообщения и пакетное обновление этих сообщений"""
+
+    def __init__(self, namespace: str = 'cards', ttl: Optional[float] = LIVE_CARD_TTL,
+                 max_views: int = LIVE_CARD_MAX_VIEWS):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_views = max_views
+        self.renderer: Optional[Renderer] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _bet_key(self, bet_id: int) -> str:
+        return f"{self.namespace}:bet:{bet_id}"
+
+    def _msg_key(self, key: str) -> str:
+        return f"{self.namespace}:msg:{key}"
+
+    async def _link(self, bet_id: int, key: str):
+        backend = get_backend()
+        keys = await backend.get(self._bet_key(bet_id)) or []
+        if keys and keys[-1] == key:
+            return
+        if key in keys:
+            keys.remove(key)
+        keys.append(key)
+        await backend.set(self._bet_key(bet_id), keys[-self.max_views:], self.ttl)
+
+    async def _unlink(self, bet_id: int, key: str):
+        backend = get_backend()
+        keys = await backend.get(self._bet_key(bet_id))
+        if keys and key in keys:
+            keys.remove(key)
+            if keys:
+                await backend.set(self._bet_key(bet_id), keys, self.ttl)
+            else:
+                await backend.delete(self._bet_key(bet_id))
+
+    async def show(self, view: CardView, bet_ids: Iterable[int]):
+        """Сообщение теперь показывает эти пари (прежние подписки сообщения снимаются)"""
+        bet_ids = list(dict.fromkeys(bet_ids))
+        backend = get_backend()
+        previous = await backend.get(self._msg_key(view.key))
+        if previous is not None:
+            for bet_id in set(previous['bets']) - set(bet_ids):
+                await self._unlink(bet_id, view.key)
+        if not bet_ids:
+            await backend.delete(self._msg_key(view.key))
+            return
+        await backend.set(self._msg_key(view.key), {'view': list(view), 'bets': bet_ids}, self.ttl)
+        for bet_id in bet_ids:
+            await self._link(bet_id, view.key)
+
+    async def release(self, key: str):
+        """Сообщение больше не показывает пари (перешло к другому экрану или удалено)"""
+        backend = get_backend()
+        previous = await backend.get(self._msg_key(key))
+        if previous is None:
+            return
+        for bet_id in previous['bets']:
+            await self._unlink(bet_id, key)
+        await backend.delete(self._msg_key(key))
+
+    async def views(self, bet_ids: Iterable[int], exclude: Optional[str] = None) -> List[CardView]:
+        """Сообщения, показывающие любое из пари, — каждое один раз"""
+        backend = get_backend()
+        keys: Dict[str, None] = {}
+        for bet_id in bet_ids:
+            for key in await backend.get(self._bet_key(bet_id)) or ():
+                keys[key] = None
+        keys.pop(exclude, None)
+        views = []
+        for key in keys:
+            entry = await backend.get(self._msg_key(key))
+            if entry is not None:
+                views.append(CardView(*entry['view']))
+        return views
+
+    async def refresh(self, bot, bets: Iterable[Bet], exclude: Optional[str] = None) -> int:
+        """Поставить в очередь правки всех сообщений с измененными пари; возвращает их число
+
+        exclude — ключ сообщения, которое обработчик перерисовал сам.
+        """
+        changed = {bet.id: bet for bet in bets if bet is not None}
+        if not changed or self.renderer is None:
+            return 0
+        views = await self.views(changed, exclude)
+        if not views:
+            return 0
+        queued = 0
+        for view, text, reply_markup, bet_ids in self.renderer(views, changed):
+            if bet_ids is not None:
+                await self.show(view, bet_ids)
+            future = outbox.submit(
+                bot, 'edit_message_text', coalesce=('card', view.key),
+                text=text, reply_markup=reply_markup, parse_mode='Markdown', **view.target
+            )
+            future.add_done_callback(functools.partial(self._edited, view.key))
+            queued += 1
+        return queued
+
+    async def publish(self, bot, view: CardView, bet: Bet) -> int:
+        """Сообщение view теперь показывает карточку bet; остальные сообщения с пари обновляются"""
+        await self.show(view, [bet.id])
+        return await self.refresh(bot, [bet], exclude=view.key)
+
+    def set_renderer(self, renderer: Renderer):
+        self.renderer = renderer
+
+    def _edited(self, key: str, future: asyncio.Future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            LIVE_CARD_EDITS.inc('ok')
+        elif isinstance(error, BadRequest) and 'not modified' in error.message.lower():
+            LIVE_CARD_EDITS.inc('unchanged')
+        elif isinstance(error, (BadRequest, Forbidden)):
+            # Сообщение удалено или недоступно боту: больше его не обновляем
+            LIVE_CARD_EDITS.inc('gone')
+            task = asyncio.get_running_loop().create_task(self.release(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            LIVE_CARD_EDITS.inc('error')
+            logger.warning("Карточка %s не обновлена: %s", key, error)
+
+
+live_cards = LiveCards()
@@ -0,0 +1,146 @@
+"""
+Очередь исходящих вызовов Bot API вне обработчиков обновлений
+
+Сообщения, которые отправляют задачи по расписанию (напоминания, сводки), идут через одну
+очередь: ответ 429 (RetryAfter) не роняет рассылку — вызов повторяется после паузы, а при
+остановке бота очередь дорабатывается до срока (drain), а не обрывается вместе с процессом.
+
+Вызовы с ключом coalesce (правка одного сообщения) схлопываются: если вызов с тем же ключом
+еще ждет в очереди, он получает новые аргументы вместо постановки второго — уходит только
+последнее состояние.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Hashable, Optional
+
+from telegram.error import RetryAfter
+
+from monitoring.metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз повторять вызов после RetryAfter
+OUTBOX_RETRIES = 3
+
+OUTBOX_PENDING = REGISTRY.gauge(
+    'betbot_outbox_pending', 'Вызовы Bot API в очереди исходящих')
+OUTBOX_CALLS = REGISTRY.counter(
+    'betbot_outbox_calls_total', 'Вызовы Bot API из очереди исходящих', ('method', 'result'))
+
+
+class Outbox:
+    """Один фоновый исполнитель на цикл событий; вызывающий ждет результат своего вызова"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Ключ coalesce -> вызов, еще не взятый исполнителем: [bot, method, kwargs, future, key]
+        self._waiting: Dict[Hashable, list] = {}
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        # Бенчмарки запускают несколько циклов событий подряд: очередь привязана к циклу
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+            self._waiting = {}
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    async def call(self, bot, method: str, **kwargs) -> Any:
+        """bot.<method>(**kwargs) через очередь: результат вызова или его исключение"""
+        return await self.submit(bot, method, **kwargs)
+
+    def submit(self, bot, method: str, coalesce: Optional[Hashable] = None, **kwargs) -> asyncio.Future:
+        """Постановка вызова без ожидания; future завершится результатом или исключением
+
+        Вызов с тем же coalesce, еще ждущий в очереди, получает новые аргументы, а
+        возвращается его future: все вызывающие узнают результат последнего состояния.
+        """
+        self._ensure_started()
+        if coalesce is not None:
+            entry = self._waiting.get(coalesce)
+            if entry is not None and not entry[3].done():
+                entry[0], entry[2] = bot, kwargs
+                OUTBOX_CALLS.inc(method, 'coalesced')
+                return entry[3]
+        future = self._loop.create_future()
+        entry = [bot, method, kwargs, future, coalesce]
+        if coalesce is not None:
+            self._waiting[coalesce] = entry
+        self._queue.put_nowait(entry)
+        OUTBOX_PENDING.set(value=self._queue.qsize())
+        return future
+
+    async def _run(self):
+        while True:
+            bot, method, kwargs, future, coalesce = entry = await self._queue.get()
+            if coalesce is not None and self._waiting.get(coalesce) is entry:
+                # Взят исполнителем: следующая правка встанет в очередь заново
+                del self._waiting[coalesce]
+            try:
+                if not future.done():
+                    await self._execute(bot, method, kwargs, future)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            finally:
+                self._queue.task_done()
+                OUTBOX_PENDING.set(value=self._queue.qsize())
+
+    async def _execute(self, bot, method: str, kwargs: dict, future: asyncio.Future):
+        for attempt in range(OUTBOX_RETRIES + 1):
+            try:
+                result = await getattr(bot, method)(**kwargs)
+            except RetryAfter as e:
+                if attempt == OUTBOX_RETRIES:
+                    OUTBOX_CALLS.inc(method, 'error')
+                    future.set_exception(e)
+                    return
+                OUTBOX_CALLS.inc(method, 'retry')
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                OUTBOX_CALLS.inc(method, 'error')
+                future.set_exception(e)
+                return
+            else:
+                OUTBOX_CALLS.inc(method, 'ok')
+                future.set_result(result)
+                return
+
+    async def drain(self, timeout: float) -> int:
+        """Дождаться опустошения очереди (не дольше timeout) и остановить исполнителя
+
+        Возвращает число брошенных вызовов: их ожидающие получают CancelledError.
+        """
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return 0
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        dropped = 0
+        while not self._queue.empty():
+            future = self._queue.get_nowait()[3]
+            self._queue.task_done()
+            future.cancel()
+            dropped += 1
+        if dropped:
+            logger.warning("Очередь исходящих не доработана за %.1f с: брошено %d вызовов", timeout, dropped)
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        self._waiting.clear()
+        OUTBOX_PENDING.set(value=0)
+        return dropped
+
+
+outbox = Outbox()
@@ -0,0 +1,80 @@
+"""
+Пересчет процентов в коэффициенты и их форматы
+
+Коэффициент стороны — 100 / (процент × (1 + маржа)): при ODDS_MARGIN = 0 это честный
+коэффициент 100 / процент, с маржой сумма обратных коэффициентов обеих сторон равна
+1 + маржа (овер-раунд). Коэффициенты для целых процентов 1..99 при марже из конфигурации
+считаются один раз при импорте: кнопки шага 2 и обычный ввод «Имя 60» берут готовую пару.
+"""
+from fractions import Fraction
+from typing import Dict, Optional, Tuple
+
+from config import ODDS_MARGIN, ODDS_FORMAT
+
+
+# Проценты на кнопках шага 2: 5, 10, ... 95
+PERCENT_CHOICES = tuple(range(5, 100, 5))
+# Нижняя граница коэффициента (коэффициент 1 и меньше — ставка без выигрыша)
+MIN_ODDS = 1.01
+ODDS_FORMATS = ('decimal', 'fractional', 'american')
+
+
+def _odds(percent: float, margin: float) -> float:
+    return max(MIN_ODDS, round(100 / (percent * (1 + margin / 100)), 2))
+
+
+# Процент стороны A -> (коэффициент A, коэффициент B) при ODDS_MARGIN
+ODDS_TABLE: Dict[int, Tuple[float, float]] = {
+    percent: (_odds(percent, ODDS_MARGIN), _odds(100 - percent, ODDS_MARGIN))
+    for percent in range(1, 100)
+}
+
+
+def odds_for(percent: float, margin: Optional[float] = None) -> float:
+    """Коэффициент стороны с вероятностью percent (0 < percent < 100)"""
+    if margin is None or margin == ODDS_MARGIN:
+        pair = ODDS_TABLE.get(percent) if float(percent).is_integer() else None
+        if pair is not None:
+            return pair[0]
+        margin = ODDS_MARGIN
+    return _odds(percent, margin)
+
+
+def price_pair(percentA: float, margin: Optional[float] = None) -> Tuple[float, float]:
+    """Коэффициенты обеих сторон по проценту стороны A"""
+    if (margin is None or margin == ODDS_MARGIN) and float(percentA).is_integer():
+        pair = ODDS_TABLE.get(int(percentA))
+        if pair is not None:
+            return pair
+    return odds_for(percentA, margin), odds_for(100 - percentA, margin)
+
+
+def percent_for(odds: Optional[float], margin: Optional[float] = None) -> float:
+    """Процент стороны по ее коэффициенту (маржа исключается); без коэффициента — 50"""
+    if not odds:
+        return 50
+    if margin is None:
+        margin = ODDS_MARGIN
+    return round(100 / (odds * (1 + margin / 100)), 1)
+
+
+def overround(oddsA: float, oddsB: float) -> float:
+    """Маржа пары коэффициентов, процентов: 0 — честные коэффициенты"""
+    return round((1 / oddsA + 1 / oddsB - 1) * 100, 2)
+
+
+def format_odds(odds: float, fmt: Optional[str] = None) -> str:
+    """Коэффициент в формате fmt (по умолчанию ODDS_FORMAT)
+
+    decimal — 1.82, fractional — выигрыш к ставке (41/50), american — +150 для
+    коэффициентов от 2 и -122 (ставка на 100 выигрыша) для меньших.
+    """
+    fmt = fmt or ODDS_FORMAT
+    if fmt == 'fractional':
+        fraction = Fraction(odds - 1).limit_denominator(100)
+        return f"{fraction.numerator}/{fraction.denominator}"
+    if fmt == 'american':
+        if odds >= 2:
+            return f"+{(odds - 1) * 100:.0f}"
+        return f"-{100 / (odds - 1):.0f}"
+    return f"{odds:.2f}"
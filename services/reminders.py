@@ -0,0 +1,148 @@
+"""
+Напоминания об активных пари и отмена по сроку (задача JobQueue, период REMINDER_INTERVAL)
+
+Непринятые (OPEN) пари старше OPEN_REMIND_HOURS и нерассчитанные (TAKEN) старше
+TAKEN_REMIND_HOURS попадают в одно сообщение на чат с тегами игроков — один раз на пари.
+Пари старше OPEN_EXPIRE_HOURS / TAKEN_EXPIRE_HOURS отменяются (событие expired в журнале),
+чтобы список активных пари не рос бесконечно; для принятых пари это по умолчанию выключено. Выборки идут по индексу bets(status, created_at).
+Отмена идет без блокировок пари (одной транзакцией на всю пачку): кнопки, проверившие статус
+до нее, записывают изменения с проверкой статуса в самом UPDATE (database/db.py) и не
+перезаписывают отмененное пари.
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from telegram.error import TelegramError
+
+from config import OPEN_REMIND_HOURS, TAKEN_REMIND_HOURS, OPEN_EXPIRE_HOURS, TAKEN_EXPIRE_HOURS
+from database import db
+from database.tenants import tenants
+from models.bet import Bet, STATUS_OPEN, STATUS_TAKEN, STATUS_CANCELED
+from monitoring.metrics import REGISTRY
+from services.live_cards import live_cards
+from services.outbox import outbox
+
+
+logger = logging.getLogger(__name__)
+
+# Строк на раздел сообщения (сообщение ограничено 4096 символами)
+MAX_LINES = 20
+
+REMINDERS_SENT = REGISTRY.counter(
+    'betbot_reminders_sent_total', 'Отправленные напоминания об активных пари (сообщений)')
+BETS_EXPIRED = REGISTRY.counter(
+    'betbot_bets_expired_total', 'Пари, отмененные по сроку', ('status',))
+
+
+@dataclass
+class ChatReminder:
+    """Пари одного чата для сводного напоминания"""
+    open: List[Bet] = field(default_factory=list)
+    taken: List[Bet] = field(default_factory=list)
+    expired: List[Bet] = field(default_factory=list)
+
+
+def _chat_for(bet: Bet) -> Optional[int]:
+    """Чат пари; у пари, созданных до появления chat_id, — чат его пары"""
+    if bet.chat_id is not None:
+        return bet.chat_id
+    tenant = tenants.get(bet.tenant_id)
+    return tenant.chat_id if tenant else None
+
+
+def _bet_line(bet: Bet) -> str:
+    name = f"{bet.bet_name} " if bet.bet_name else ""
+    stake = f" — {bet.stake:.0f} ₽" if bet.stake else ""
+    return f"  #{bet.id} {name}{bet.playerA_name} vs {bet.playerB_name}{stake}"
+
+
+def _section(header: str, bets: List[Bet]) -> List[str]:
+    lines = [header] + [_bet_line(bet) for bet in bets[:MAX_LINES]]
+    if len(bets) > MAX_LINES:
+        lines.append(f"  … и еще {len(bets) - MAX_LINES}")
+    return lines
+
+
+def _tags(usernames) -> str:
+    return ' '.join(f"@{name}" for name in sorted({name for name in usernames if name}, key=str.lower))
+
+
+def format_reminder(reminder: ChatReminder) -> str:
+    """Текст сводного напоминания для чата (без разметки: теги работают как уведомления)"""
+    lines = ["🐕 Напоминание по пари"]
+    if reminder.open:
+        tags = _tags(bet.taker_username for bet in reminder.open)
+        lines += _section(f"\n⏳ {tags}, ждут принятия:", reminder.open)
+    if reminder.taken:
+        tags = _tags(name for bet in reminder.taken for name in (bet.maker_username, bet.taker_username))
+        lines += _section(f"\n🏁 {tags}, ждут результата:", reminder.taken)
+    if reminder.expired:
+        lines += _section("\n⌛ Отменены по сроку:", reminder.expired)
+    return "\n".join(lines)
+
+
+def collect_reminders(now: Optional[datetime] = None, expired_out: Optional[List[Bet]] = None) -> Dict[int, ChatReminder]:
+    """Отмена просроченных пари и сбор напоминаний по чатам; пари без чата только отмечаются
+
+    В expired_out добавляются все отмененные по сроку пари (в состоянии до отмены).
+    """
+    now = now or datetime.now()
+    by_chat: Dict[int, ChatReminder] = defaultdict(ChatReminder)
+
+    for status, hours in ((STATUS_OPEN, OPEN_EXPIRE_HOURS), (STATUS_TAKEN, TAKEN_EXPIRE_HOURS)):
+        if hours <= 0:
+            continue
+        expired = db.expire_bets(status, now - timedelta(hours=hours))
+        if expired:
+            BETS_EXPIRED.inc(status, amount=len(expired))
+            logger.info("Отменено по сроку %d пари в статусе %s", len(expired), status)
+        if expired_out is not None:
+            expired_out.extend(expired)
+        for bet in expired:
+            chat_id = _chat_for(bet)
+            if chat_id is not None:
+                by_chat[chat_id].expired.append(bet)
+
+    reminded = []
+    for status, hours in ((STATUS_OPEN, OPEN_REMIND_HOURS), (STATUS_TAKEN, TAKEN_REMIND_HOURS)):
+        if hours <= 0:
+            continue
+        for bet in db.get_bets_to_remind(status, now - timedelta(hours=hours)):
+            reminded.append(bet.id)
+            chat_id = _chat_for(bet)
+            if chat_id is None:
+                continue
+            reminder = by_chat[chat_id]
+            (reminder.open if status == STATUS_OPEN else reminder.taken).append(bet)
+    # Отмечаются до отправки: сбой Telegram не превращается в повторные напоминания
+    db.mark_bets_reminded(reminded)
+    return by_chat
+
+
+async def send_reminders(bot, now: Optional[datetime] = None) -> int:
+    """Одно сообщение на чат; возвращает число отправленных сообщений"""
+    sent = 0
+    expired: List[Bet] = []
+    by_chat = collect_reminders(now, expired)
+    # Карточки и списки с отмененными по сроку пари
+    await live_cards.refresh(bot, [replace(bet, status=STATUS_CANCELED) for bet in expired])
+    for chat_id, reminder in by_chat.items():
+        try:
+            await outbox.call(bot, 'send_message', chat_id=chat_id, text=format_reminder(reminder))
+        except TelegramError as e:
+            logger.warning("Напоминание в чат %s не отправлено: %s", chat_id, e)
+            continue
+        sent += 1
+    REMINDERS_SENT.inc(amount=sent)
+    return sent
+
+
+async def reminder_job(context) -> None:
+    """Задача JobQueue: напоминания и отмена по сроку"""
+    try:
+        await send_reminders(context.bot)
+    except Exception:
+        logger.exception("Ошибка напоминаний об активных пари")
@@ -0,0 +1,62 @@
+"""
+Функции фоновых заданий (выполняются в процессах пула services/jobs.py)
+
+Параметры и результат — JSON-совместимые значения: они передаются между процессами
+и кэшируются в хранилище состояния.
+"""
+import functools
+import os
+import tempfile
+from datetime import datetime
+
+from database import db
+from services.jobs import is_canceled, report_progress
+
+
+def statistics_report(params: dict) -> dict:
+    """Статистика пары за период: {'tenant_id', 'start' (ISO или None), 'user_ids'}"""
+    start = datetime.fromisoformat(params['start']) if params.get('start') else None
+    stats = db.get_all_statistics(
+        start, None, params['tenant_id'], params.get('user_ids'), progress=report_progress
+    )
+    report_progress(len(stats), len(stats))
+    return stats
+
+
+def export_report(params: dict) -> dict:
+    """Выгрузка таблицы в файл: {'table', 'format', 'period', 'player', 'tenant_id', 'directory'}"""
+    from services.export import export_table, export_filename, period_start
+
+    os.makedirs(params['directory'], exist_ok=True)
+    filename = export_filename(params['table'], params['format'], params['period'], params.get('player'))
+    fd, path = tempfile.mkstemp(suffix=filename, dir=params['directory'])
+    os.close(fd)
+    try:
+        rows = export_table(
+            path, params['table'], params['format'], period_start(params['period']), None,
+            params['tenant_id'], params.get('player'), progress=report_progress
+        )
+    except BaseException:
+        # Отмена (JobCanceled) или ошибка: недописанный файл не остается в каталоге выгрузок
+        os.remove(path)
+        raise
+    return {'path': path, 'filename': filename, 'rows': rows, 'size': os.path.getsize(path)}
+
+
+def import_report(params: dict) -> dict:
+    """Импорт загруженного файла в пару: {'path', 'tenant_id'}; файл удаляется после импорта"""
+    from dataclasses import asdict
+    from services.importer import import_file, RowError
+
+    try:
+        # Отмена проверяется перед каждой порцией: уже записанные порции остаются в отчете
+        report = import_file(
+            params['path'], params['tenant_id'],
+            progress=functools.partial(report_progress, cancelable=False), canceled=is_canceled
+        )
+    except RowError as e:
+        # Файл целиком не подходит: причина показывается пользователю, а не как сбой задания
+        return {'imported': 0, 'summary': str(e)}
+    finally:
+        os.remove(params['path'])
+    return dict(asdict(report), summary=report.summary())
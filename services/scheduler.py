@@ -0,0 +1,135 @@
+"""
+Параллельная обработка обновлений с сохранением порядка для каждого пользователя
+
+FairUpdateProcessor подключается к Application через concurrent_updates(): обновления
+разных пользователей обрабатываются одновременно, не больше UPDATE_WORKERS сразу, а
+обновления одного пользователя — строго по очереди (шаги визарда зависят от порядка).
+Ожидающее своей очереди обновление не занимает слот обработки, поэтому поток нажатий
+одного пользователя не задерживает остальных: на каждого приходится не больше одного слота.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Set
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from monitoring.metrics import REGISTRY
+
+
+# Сколько обновлений может ждать обработки (задачи создаются сразу при получении)
+UPDATE_QUEUE_LIMIT = 1024
+
+QUEUE_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UPDATE_QUEUE_WAIT = REGISTRY.histogram(
+    'betbot_update_queue_wait_seconds', 'Ожидание обновления до начала обработки', ('reason',),
+    buckets=QUEUE_WAIT_BUCKETS)
+UPDATES_IN_PROGRESS = REGISTRY.gauge(
+    'betbot_updates_in_progress', 'Обновления в обработке')
+UPDATES_WAITING = REGISTRY.gauge(
+    'betbot_updates_waiting', 'Обновления, ожидающие своей очереди или свободного слота')
+
+
+def order_key(update: object) -> Optional[int]:
+    """Ключ порядка: пользователь, без пользователя — чат; None — порядок не важен"""
+    if not isinstance(update, Update):
+        return None
+    user = update.effective_user
+    if user is not None:
+        return user.id
+    chat = update.effective_chat
+    if chat is not None:
+        return chat.id
+    return None
+
+
+class FairUpdateProcessor(BaseUpdateProcessor):
+    """Не больше workers обновлений одновременно, по одному на ключ order_key
+
+    reason в betbot_update_queue_wait_seconds: order — ждали предыдущее обновление того же
+    пользователя, slot — только свободный слот.
+    """
+
+    def __init__(self, workers: int, queue_limit: int = UPDATE_QUEUE_LIMIT):
+        # Семафор базового класса ограничивает число задач, а не обработку: ее ограничивает
+        # свой семафор, который берется уже после очереди пользователя
+        super().__init__(max(queue_limit, workers))
+        self.workers = workers
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Ключ -> future последнего обновления ключа (следующее ждет его завершения)
+        self._tails: Dict[int, asyncio.Future] = {}
+        # Полученные и еще не обработанные обновления: ожидающие и в обработке
+        self._unfinished: Set[int] = set()
+        self._waiting: Dict[int, Update] = {}
+        self._dropped: Set[int] = set()
+        self._running = 0
+
+    async def initialize(self) -> None:
+        self._slots = asyncio.Semaphore(self.workers)
+
+    async def shutdown(self) -> None:
+        pass
+
+    def unfinished_ids(self) -> Set[int]:
+        """update_id полученных, но еще не обработанных обновлений"""
+        return set(self._unfinished)
+
+    def take_waiting(self) -> List[Update]:
+        """Снять с очереди обновления, обработка которых не началась (при остановке по сроку)"""
+        updates = sorted(self._waiting.values(), key=lambda update: update.update_id)
+        self._dropped.update(update.update_id for update in updates)
+        self._waiting.clear()
+        return updates
+
+    def _set_gauges(self):
+        UPDATES_IN_PROGRESS.set(value=self._running)
+        UPDATES_WAITING.set(value=len(self._waiting))
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        if self._slots is None:
+            await self.initialize()
+        key = order_key(update)
+        update_id = update.update_id if isinstance(update, Update) else None
+        loop = asyncio.get_running_loop()
+        previous = self._tails.get(key) if key is not None else None
+        done = loop.create_future()
+        if key is not None:
+            self._tails[key] = done
+        if update_id is not None:
+            self._unfinished.add(update_id)
+            self._waiting[update_id] = update
+        self._set_gauges()
+        started = time.perf_counter()
+        running = False
+        try:
+            if previous is not None:
+                await previous
+            async with self._slots:
+                if update_id is not None:
+                    self._waiting.pop(update_id, None)
+                    if update_id in self._dropped:
+                        # Отложено до следующего запуска (Lifecycle.take_waiting)
+                        self._dropped.discard(update_id)
+                        return
+                UPDATE_QUEUE_WAIT.observe('order' if previous is not None else 'slot',
+                                          value=time.perf_counter() - started)
+                running = True
+                self._running += 1
+                self._set_gauges()
+                try:
+                    await coroutine
+                finally:
+                    self._running -= 1
+        finally:
+            if not running:
+                # Обработка не началась (отложено или отменено при остановке)
+                coroutine.close()
+            if update_id is not None:
+                self._unfinished.discard(update_id)
+                self._waiting.pop(update_id, None)
+            if not done.done():
+                done.set_result(None)
+            if key is not None and self._tails.get(key) is done:
+                del self._tails[key]
+            self._set_gauges()
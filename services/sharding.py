@@ -0,0 +1,175 @@
+"""
+Горизонтальное масштабирование: мастер получает обновления, рабочие процессы их обрабатывают
+
+Мастер опрашивает getUpdates и раздает обновления по chat_id: все обновления одного чата
+попадают в один рабочий процесс (внутри него обновления одного пользователя обрабатываются
+по порядку, services/scheduler.py), поэтому шаги визарда не перемешиваются, а кэш пар
+игроков чата живет в одном процессе. Inline-обновления (без чата) раздаются по пользователю,
+поэтому одно пари обрабатывают разные процессы: блокировки пари, индекс живых карточек, данные
+кнопок и снимки обязаны быть общими — режим требует STATE_BACKEND=resp://... (проверяет bot.main).
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from typing import List
+
+from telegram import Bot, Update
+from telegram.error import NetworkError, TelegramError, TimedOut
+from telegram.request import HTTPXRequest
+
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30
+# Меньше TimeoutStopSec (30 с) в telegram-bot.service: мастер успевает остановить рабочие процессы и перенести WAL
+WORKER_STOP_TIMEOUT = 25
+# Сигнал остановки рабочего процесса в очереди обновлений
+STOP = None
+
+
+def shard_key(update: Update) -> int:
+    """Ключ шардирования: чат, без чата (inline-режим) — пользователь"""
+    chat = update.effective_chat
+    if chat is not None:
+        return chat.id
+    user = update.effective_user
+    if user is not None:
+        return user.id
+    return update.update_id
+
+
+def shard_for(update: Update, workers: int) -> int:
+    return shard_key(update) % workers
+
+
+def run_worker(index: int, token: str, updates) -> None:
+    """Точка входа рабочего процесса (multiprocessing, spawn)"""
+    from config import LOG_LEVEL, LOG_LEVELS, LOG_FORMAT
+    from monitoring.log import setup_logging, parse_levels
+
+    # Ctrl+C и SIGTERM от systemd получает вся группа процессов: рабочий останавливается
+    # по STOP от мастера, после того как мастер подтвердил смещение getUpdates
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    setup_logging(LOG_LEVEL, parse_levels(LOG_LEVELS), LOG_FORMAT)
+    asyncio.run(_worker_loop(index, token, updates))
+
+
+async def _worker_loop(index: int, token: str, updates) -> None:
+    from bot import build_application
+    from services.lifecycle import Lifecycle
+
+    application = build_application(token, updater=False)
+    application.bot_data['worker'] = index
+    lifecycle = Lifecycle(application, worker=index)
+    loop = asyncio.get_running_loop()
+
+    await lifecycle.start()
+    logger.info("Рабочий процесс %d запущен", index)
+    try:
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is STOP:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        # Как при остановке одного процесса: принятые обновления, очередь исходящих,
+        # данные кнопок и недоработанные обновления в bot_state
+        await lifecycle.stop()
+    logger.info("Рабочий процесс %d остановлен", index)
+
+
+class ShardMaster:
+    """Процесс-мастер: getUpdates и раздача обновлений по очередям рабочих процессов"""
+
+    def __init__(self, token: str, workers: int):
+        self.token = token
+        self._context = multiprocessing.get_context('spawn')
+        self.queues = [self._context.Queue() for _ in range(workers)]
+        self.processes: List[multiprocessing.Process] = [None] * workers
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=run_worker, args=(index, self.token, self.queues[index]),
+            name=f"bet-worker-{index}", daemon=False
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info("Рабочий процесс %d: pid %d", index, process.pid)
+
+    def dispatch(self, update: Update) -> int:
+        index = shard_for(update, len(self.queues))
+        if not self.processes[index].is_alive():
+            # Очередь переживает процесс: перезапущенный рабочий заберет накопленное
+            logger.warning("Рабочий процесс %d завершился (код %s), перезапуск",
+                           index, self.processes[index].exitcode)
+            self._spawn(index)
+        self.queues[index].put(update.to_dict())
+        return index
+
+    async def poll(self):
+        from services.lifecycle import load_offset, save_offset
+
+        request = HTTPXRequest(read_timeout=POLL_TIMEOUT + 10)
+        # Смещение прошлого запуска: розданные до остановки обновления не придут повторно
+        offset = load_offset()
+        async with Bot(self.token, get_updates_request=request) as bot:
+            await bot.delete_webhook()
+            logger.info("Мастер получает обновления для %d рабочих процессов", len(self.queues))
+            try:
+                while True:
+                    try:
+                        updates = await bot.get_updates(
+                            offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES
+                        )
+                    except (NetworkError, TimedOut) as e:
+                        logger.warning("Ошибка getUpdates: %s", e)
+                        await asyncio.sleep(1)
+                        continue
+                    for update in updates:
+                        self.dispatch(update)
+                        offset = update.update_id + 1
+            finally:
+                # Розданные обновления подтверждаются Telegram сразу, а не следующим запуском
+                if offset is not None:
+                    save_offset(offset)
+                    try:
+                        await bot.get_updates(offset=offset, timeout=0, limit=1)
+                    except TelegramError as e:
+                        logger.warning("Смещение getUpdates %d не подтверждено: %s", offset, e)
+
+    async def _run(self):
+        task = asyncio.current_task()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+        try:
+            await self.poll()
+        except asyncio.CancelledError:
+            pass
+
+    def run(self):
+        for index in range(len(self.queues)):
+            self._spawn(index)
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        for queue in self.queues:
+            queue.put(STOP)
+        # Рабочие процессы останавливаются параллельно: срок общий, а не на каждый процесс
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        for index, process in enumerate(self.processes):
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                # SIGTERM рабочий процесс игнорирует
+                logger.warning("Рабочий процесс %d не остановился за %d с", index, WORKER_STOP_TIMEOUT)
+                process.kill()
+                process.join()
+        # Рабочие процессы остановлены: WAL переносится в основной файл базы
+        from database.db import checkpoint_wal
+        checkpoint_wal()
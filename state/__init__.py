@@ -0,0 +1 @@
+# State package
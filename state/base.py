@@ -0,0 +1,84 @@
+"""
+Интерфейс хранилища состояния: сессии визарда, кэши и блокировки
+
+Реализация выбирается по URL из config.STATE_BACKEND:
+    memory://                 — в памяти процесса (только один процесс, WORKERS=1)
+    resp://host:port[/prefix] — сетевое хранилище с протоколом RESP (Redis или state.server),
+                                обязательно при WORKERS больше 1: inline-обновления раздаются по
+                                пользователю, поэтому карточки одного пари в чате и в inline-режиме
+                                обрабатывают разные рабочие процессы
+"""
+from abc import ABC, abstractmethod
+from typing import Any, AsyncContextManager, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+
+LOCK_TIMEOUT = 10.0
+LOCK_TTL = 30.0
+
+
+class LockTimeout(Exception):
+    """Блокировку не удалось получить за отведенное время"""
+
+
+class StateBackend(ABC):
+    """Ключ -> JSON-совместимое значение с необязательным TTL, плюс именованные блокировки"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Значение по ключу; None, если ключа нет или истек TTL"""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Запись значения; ttl в секундах"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Удаление ключа (отсутствующий ключ — не ошибка)"""
+
+    @abstractmethod
+    def lock(self, name: str, timeout: float = LOCK_TIMEOUT) -> AsyncContextManager[None]:
+        """Именованная блокировка: async with backend.lock('bet:42'): ..."""
+
+    def dump(self) -> Optional[Dict[str, Tuple[Any, Optional[float]]]]:
+        """Содержимое для сохранения при остановке бота: ключ -> (значение, оставшийся TTL)
+
+        None — хранилище само переживает перезапуск бота (сетевое).
+        """
+        return None
+
+    def load(self, items: Dict[str, Tuple[Any, Optional[float]]]) -> None:
+        """Восстановление содержимого, сохраненного dump()"""
+
+    async def close(self) -> None:
+        """Освобождение соединений"""
+
+
+_backend: Optional[StateBackend] = None
+
+
+def create_backend(url: str) -> StateBackend:
+    """Создание хранилища по URL"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'memory':
+        from state.memory import InProcessBackend
+        return InProcessBackend()
+    if parsed.scheme == 'resp':
+        from state.resp import RespBackend
+        return RespBackend(parsed.hostname or '127.0.0.1', parsed.port or 6379, parsed.path.strip('/'))
+    raise ValueError(f"Неизвестное хранилище состояния: {url}")
+
+
+def get_backend() -> StateBackend:
+    """Общее хранилище процесса (создается при первом обращении)"""
+    global _backend
+    if _backend is None:
+        from config import STATE_BACKEND
+        _backend = create_backend(STATE_BACKEND)
+    return _backend
+
+
+def set_backend(backend: StateBackend) -> None:
+    """Замена хранилища (бенчмарки, рабочие процессы)"""
+    global _backend
+    _backend = backend
@@ -0,0 +1,91 @@
+"""
+Блокировки по ключу (например, по ID пари) поверх хранилища состояния
+
+Изменения одного пари выполняются по очереди, разных пари — параллельно. В памяти процесса
+блокировка — asyncio.Lock из слабого словаря InProcessBackend: она существует, пока ее
+держат или ждут; с resp:// она общая для всех процессов. Ожидание и конкуренция видны
+в метриках betbot_lock_*.
+"""
+import functools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable
+
+from monitoring.metrics import REGISTRY
+from state.base import get_backend, LockTimeout, LOCK_TIMEOUT
+
+
+LOCK_WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LOCK_ACQUISITIONS = REGISTRY.counter(
+    'betbot_lock_acquisitions_total', 'Захваты блокировок по ключу', ('lock', 'result'))
+LOCK_WAIT = REGISTRY.histogram(
+    'betbot_lock_wait_seconds', 'Ожидание блокировки по ключу', ('lock',), buckets=LOCK_WAIT_BUCKETS)
+LOCKS_ACTIVE = REGISTRY.gauge(
+    'betbot_locks_active', 'Ключи, блокировку которых держат или ждут в процессе', ('lock',))
+
+
+class KeyedLockManager:
+    """Блокировки вида <kind>:<key>
+
+    result в betbot_lock_acquisitions_total: free — ключ был свободен в этом процессе,
+    contended — пришлось ждать другой обработчик процесса, timeout — не дождались.
+    """
+
+    def __init__(self, kind: str, timeout: float = LOCK_TIMEOUT):
+        self.kind = kind
+        self.timeout = timeout
+        # Держатели и ожидающие по ключу; ключ удаляется, когда их не остается
+        self._active: Dict[Hashable, int] = {}
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable):
+        contended = key in self._active
+        self._active[key] = self._active.get(key, 0) + 1
+        LOCKS_ACTIVE.set(self.kind, value=len(self._active))
+        started = time.perf_counter()
+        lock = get_backend().lock(f"{self.kind}:{key}", self.timeout)
+        try:
+            try:
+                await lock.__aenter__()
+            except LockTimeout:
+                LOCK_ACQUISITIONS.inc(self.kind, 'timeout')
+                raise
+            LOCK_WAIT.observe(self.kind, value=time.perf_counter() - started)
+            LOCK_ACQUISITIONS.inc(self.kind, 'contended' if contended else 'free')
+            try:
+                yield
+            finally:
+                await lock.__aexit__(None, None, None)
+        finally:
+            remaining = self._active[key] - 1
+            if remaining:
+                self._active[key] = remaining
+            else:
+                del self._active[key]
+            LOCKS_ACTIVE.set(self.kind, value=len(self._active))
+
+    def locked(self, handler):
+        """Декоратор обработчика кнопки (update, context, key, ...): весь обработчик под блокировкой key
+
+        Если блокировку не дождались, пользователь получает всплывающее сообщение — это ответ
+        на нажатие, поэтому до вызова обработчика на callback_query не отвечают: обработчик
+        отвечает сам, и на каждое нажатие приходится ровно один answer().
+        """
+        @functools.wraps(handler)
+        async def wrapper(update, context, key, *args, **kwargs):
+            try:
+                async with self.hold(key):
+                    return await handler(update, context, key, *args, **kwargs)
+            except LockTimeout:
+                await update.callback_query.answer("⏳ Пари сейчас изменяется, попробуйте еще раз", show_alert=True)
+
+        return wrapper
+
+
+# Принятие, результат, смена результата и отмена одного пари
+bet_locks = KeyedLockManager('bet')
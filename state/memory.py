@@ -0,0 +1,98 @@
+"""
+Хранилище состояния в памяти процесса
+"""
+import asyncio
+import heapq
+import json
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from state.base import StateBackend, LockTimeout, LOCK_TIMEOUT
+
+
+class InProcessBackend(StateBackend):
+    """Словарь с TTL и asyncio-блокировки
+
+    Значения хранятся сериализованными в JSON, как в сетевом хранилище: изменение
+    полученного словаря не меняет сохраненное состояние без явного set().
+    Истекшие ключи, которые больше никто не читает (задачи, данные кнопок, карточки),
+    удаляются при записи: куча сроков отдает их по порядку истечения.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        # (срок, ключ); записи перезаписанных и удаленных ключей пропускаются при очистке
+        self._expiry: List[Tuple[float, str]] = []
+        # Блокировка живет, пока ее кто-то держит или ждет
+        self._locks: 'weakref.WeakValueDictionary[str, asyncio.Lock]' = weakref.WeakValueDictionary()
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        payload, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return json.loads(payload)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.monotonic()
+        self._purge(now)
+        expires_at = now + ttl if ttl else None
+        self._data[key] = (json.dumps(value), expires_at)
+        if expires_at is not None:
+            self._track(expires_at, key)
+
+    def _track(self, expires_at: float, key: str) -> None:
+        heapq.heappush(self._expiry, (expires_at, key))
+        if len(self._expiry) > 2 * len(self._data) + 64:
+            # Устаревших записей больше, чем живых ключей: куча строится заново
+            self._expiry = [(item[1], k) for k, item in self._data.items() if item[1] is not None]
+            heapq.heapify(self._expiry)
+
+    def _purge(self, now: float) -> None:
+        """Удалить ключи, срок которых истек"""
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(expiry)
+            item = self._data.get(key)
+            if item is not None and item[1] == expires_at:
+                del self._data[key]
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def dump(self) -> Dict[str, Tuple[Any, Optional[float]]]:
+        now = time.monotonic()
+        return {
+            key: (json.loads(payload), expires_at - now if expires_at is not None else None)
+            for key, (payload, expires_at) in self._data.items()
+            if expires_at is None or expires_at > now
+        }
+
+    def load(self, items: Dict[str, Tuple[Any, Optional[float]]]) -> None:
+        now = time.monotonic()
+        for key, (value, ttl) in items.items():
+            if ttl is None or ttl > 0:
+                expires_at = now + ttl if ttl is not None else None
+                self._data[key] = (json.dumps(value), expires_at)
+                if expires_at is not None:
+                    self._track(expires_at, key)
+
+    @asynccontextmanager
+    async def lock(self, name: str, timeout: float = LOCK_TIMEOUT):
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[name] = lock
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise LockTimeout(name) from None
+        try:
+            yield
+        finally:
+            lock.release()
@@ -0,0 +1,95 @@
+"""
+Хранилище данных кнопок, не помещающихся в callback_data (64 байта)
+
+Данные адресуются хешем: одна и та же кнопка получает один ключ в любом процессе и при
+повторной отрисовке. Последние CALLBACK_PAYLOAD_CACHE записей держатся в памяти процесса
+(LRU), все — в хранилище состояния с TTL CALLBACK_PAYLOAD_TTL: кнопку можно нажать после
+перезапуска или в другом рабочем процессе.
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import CALLBACK_PAYLOAD_CACHE, CALLBACK_PAYLOAD_TTL
+from state.base import get_backend
+
+
+logger = logging.getLogger(__name__)
+
+# Длина ключа в байтах (в callback_data он занимает ~11 символов base64)
+KEY_SIZE = 8
+
+
+class PayloadStore:
+    """Ключ (KEY_SIZE байт) -> данные кнопки
+
+    put() синхронный — клавиатуры собираются вне цикла событий; запись в хранилище
+    состояния выполняется фоновой задачей, а до нее данные доступны из памяти.
+    """
+
+    def __init__(self, namespace: str = 'cbdata', cache_size: int = CALLBACK_PAYLOAD_CACHE,
+                 ttl: Optional[float] = CALLBACK_PAYLOAD_TTL):
+        self.namespace = namespace
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._cache: 'OrderedDict[bytes, bytes]' = OrderedDict()
+        # Записи, еще не отправленные в хранилище состояния
+        self._unsaved: Dict[bytes, bytes] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _backend_key(self, key: bytes) -> str:
+        return f"{self.namespace}:{key.hex()}"
+
+    def _remember(self, key: bytes, payload: bytes):
+        self._cache[key] = payload
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def put(self, payload: bytes) -> bytes:
+        key = hashlib.blake2b(payload, digest_size=KEY_SIZE).digest()
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return key
+        self._remember(key, payload)
+        self._unsaved[key] = payload
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне цикла событий: запишется при следующем put() или flush()
+            return key
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self.flush())
+        return key
+
+    async def flush(self):
+        """Записать новые данные в хранилище состояния"""
+        while self._unsaved:
+            key, payload = self._unsaved.popitem()
+            try:
+                await get_backend().set(self._backend_key(key), base64.b64encode(payload).decode(), self.ttl)
+            except Exception:
+                logger.exception("Не удалось сохранить данные кнопки %s", key.hex())
+
+    async def get(self, key: bytes) -> Optional[bytes]:
+        """Данные по ключу; None — истек TTL или ключ неизвестен"""
+        payload = self._cache.get(key)
+        if payload is not None:
+            self._cache.move_to_end(key)
+            return payload
+        stored = await get_backend().get(self._backend_key(key))
+        if stored is None:
+            return None
+        payload = base64.b64decode(stored)
+        self._remember(key, payload)
+        return payload
+
+    def invalidate(self):
+        self._cache.clear()
+        self._unsaved.clear()
+
+
+payloads = PayloadStore()
@@ -0,0 +1,159 @@
+"""
+Сетевое хранилище состояния по протоколу RESP (подмножество команд Redis)
+
+Используются только GET, SET (PX, NX), DEL, PING и EVAL двух скриптов блокировок,
+поэтому вместо Redis можно запустить локальную замену: python -m state.server --port 6380
+"""
+import asyncio
+import json
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional
+
+from state.base import StateBackend, LockTimeout, LOCK_TIMEOUT, LOCK_TTL
+
+
+LOCK_RETRY_S = 0.02
+# Блокировка продлевается на LOCK_TTL, пока ее держат: обработчик может ждать retry_after Bot API
+LOCK_RENEW_S = LOCK_TTL / 3
+
+# Снятие и продление блокировки, только если ее держит этот владелец (токен): проверка и
+# действие атомарны, поэтому чужая блокировка, взятая после истечения нашей, не затрагивается
+LOCK_RELEASE_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+)
+LOCK_RENEW_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+    "return redis.call('PEXPIRE', KEYS[1], ARGV[2]) else return 0 end"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RespError(Exception):
+    """Ответ сервера с ошибкой (-ERR ...)"""
+
+
+def encode_command(*parts) -> bytes:
+    """Команда как массив bulk-строк"""
+    chunks = [b'*%d\r\n' % len(parts)]
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode()
+        chunks.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(chunks)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Чтение одного ответа: строка, число, bytes, None или список"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Соединение с хранилищем закрыто")
+    kind, body = line[:1], line[1:-2]
+    if kind == b'+':
+        return body.decode()
+    if kind == b'-':
+        raise RespError(body.decode())
+    if kind == b':':
+        return int(body)
+    if kind == b'$':
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(body)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RespError(f"Неизвестный тип ответа: {line!r}")
+
+
+class RespBackend(StateBackend):
+    """Клиент с одним соединением; запросы сериализуются, соединение восстанавливается"""
+
+    def __init__(self, host: str, port: int, prefix: str = ''):
+        self.host = host
+        self.port = port
+        self.prefix = f"{prefix}:" if prefix else ''
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._io_lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def _drop(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def execute(self, *parts):
+        """Выполнение команды; при разрыве соединения — одна повторная попытка"""
+        async with self._io_lock:
+            for attempt in (1, 2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    self._writer.write(encode_command(*parts))
+                    await self._writer.drain()
+                    return await read_reply(self._reader)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    await self._drop()
+                    if attempt == 2:
+                        raise
+
+    async def get(self, key: str) -> Optional[Any]:
+        data = await self.execute('GET', self.prefix + key)
+        return json.loads(data) if data is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        parts: List[Any] = ['SET', self.prefix + key, json.dumps(value)]
+        if ttl:
+            parts += ['PX', int(ttl * 1000)]
+        await self.execute(*parts)
+
+    async def delete(self, key: str) -> None:
+        await self.execute('DEL', self.prefix + key)
+
+    @asynccontextmanager
+    async def lock(self, name: str, timeout: float = LOCK_TIMEOUT):
+        key = f"{self.prefix}lock:{name}"
+        token = secrets.token_hex(8)
+        deadline = time.monotonic() + timeout
+        # SET NX PX: блокировка с TTL, чтобы упавший процесс не держал ее вечно
+        while await self.execute('SET', key, token, 'NX', 'PX', int(LOCK_TTL * 1000)) is None:
+            if time.monotonic() >= deadline:
+                raise LockTimeout(name)
+            await asyncio.sleep(LOCK_RETRY_S)
+        stop = asyncio.Event()
+        renewal = asyncio.create_task(self._renew(key, token, stop))
+        try:
+            yield
+        finally:
+            # Продление останавливается между командами, а не отменой посреди ответа сервера
+            stop.set()
+            await renewal
+            await self.execute('EVAL', LOCK_RELEASE_SCRIPT, 1, key, token)
+
+    async def _renew(self, key: str, token: str, stop: asyncio.Event):
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), LOCK_RENEW_S)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                renewed = await self.execute('EVAL', LOCK_RENEW_SCRIPT, 1, key, token, int(LOCK_TTL * 1000))
+            except (ConnectionError, OSError, RespError) as e:
+                logger.warning("Блокировка %s не продлена: %s", key, e)
+                continue
+            if not renewed:
+                logger.warning("Блокировка %s истекла до продления и могла перейти другому владельцу", key)
+                return
+
+    async def close(self) -> None:
+        async with self._io_lock:
+            await self._drop()
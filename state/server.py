@@ -0,0 +1,186 @@
+"""
+Локальная замена сетевого хранилища: RESP-сервер с GET, SET (EX, PX, NX), DEL, PING
+и EVAL только для скриптов блокировок клиента (state/resp.py): снятие и продление своей блокировки
+
+Запуск:
+    python -m state.server --host 127.0.0.1 --port 6380
+    STATE_BACKEND=resp://127.0.0.1:6380 python bot.py
+"""
+import argparse
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from state.resp import LOCK_RELEASE_SCRIPT, LOCK_RENEW_SCRIPT
+
+
+logger = logging.getLogger(__name__)
+
+
+class StateServer:
+    """Однопоточный сервер: команды выполняются по одной, поэтому SET NX атомарен
+
+    Истекшие ключи, которые больше никто не читает, удаляются при SET по куче сроков.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6380):
+        self.host = host
+        self.port = port
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        # (срок, ключ); записи перезаписанных и удаленных ключей пропускаются при очистке
+        self._expiry: List[Tuple[float, bytes]] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Хранилище состояния слушает %s:%d", self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Открытые соединения закрываются явно: wait_closed() их не дожидается
+            clients = list(self._clients.items())
+            for writer, _ in clients:
+                writer.close()
+            await asyncio.gather(*(task for _, task in clients), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def _alive(self, key: bytes) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _purge(self, now: float):
+        """Удалить ключи, срок которых истек"""
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(expiry)
+            item = self._data.get(key)
+            if item is not None and item[1] == expires_at:
+                del self._data[key]
+
+    def _store(self, key: bytes, value: bytes, expires_at: Optional[float]):
+        self._data[key] = (value, expires_at)
+        if expires_at is not None:
+            heapq.heappush(self._expiry, (expires_at, key))
+            if len(self._expiry) > 2 * len(self._data) + 64:
+                # Устаревших записей больше, чем живых ключей: куча строится заново
+                self._expiry = [(item[1], k) for k, item in self._data.items() if item[1] is not None]
+                heapq.heapify(self._expiry)
+
+    def _eval(self, script: bytes, keys: list, argv: list) -> bytes:
+        """Скрипты блокировок: проверка владельца и действие выполняются одной командой"""
+        if script not in (LOCK_RELEASE_SCRIPT.encode(), LOCK_RENEW_SCRIPT.encode()) or not keys or not argv:
+            return b'-ERR unsupported script\r\n'
+        key, token = keys[0], argv[0]
+        if self._alive(key) != token:
+            return b':0\r\n'
+        if script == LOCK_RELEASE_SCRIPT.encode():
+            del self._data[key]
+        elif len(argv) < 2:
+            return b'-ERR wrong number of arguments\r\n'
+        else:
+            self._store(key, token, time.monotonic() + int(argv[1]) / 1000)
+        return b':1\r\n'
+
+    def execute(self, command: list) -> bytes:
+        name = command[0].upper()
+        args = command[1:]
+        if name == b'PING':
+            return b'+PONG\r\n'
+        if name == b'GET' and len(args) == 1:
+            value = self._alive(args[0])
+            return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+        if name == b'SET' and len(args) >= 2:
+            key, value = args[0], args[1]
+            now = time.monotonic()
+            self._purge(now)
+            expires_at = None
+            only_new = False
+            options = [arg.upper() for arg in args[2:]]
+            for i, option in enumerate(options):
+                if option == b'NX':
+                    only_new = True
+                elif option in (b'PX', b'EX') and i + 1 < len(options):
+                    scale = 1000 if option == b'PX' else 1
+                    expires_at = now + int(options[i + 1]) / scale
+            if only_new and self._alive(key) is not None:
+                return b'$-1\r\n'
+            self._store(key, value, expires_at)
+            return b'+OK\r\n'
+        if name == b'EVAL' and len(args) >= 2:
+            numkeys = int(args[1])
+            return self._eval(args[0], args[2:2 + numkeys], args[2 + numkeys:])
+        if name == b'DEL':
+            removed = 0
+            for key in args:
+                if self._alive(key) is not None:
+                    del self._data[key]
+                    removed += 1
+            return b':%d\r\n' % removed
+        return b'-ERR unknown command\r\n'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                command = await _read_command(reader)
+                if command is None:
+                    break
+                writer.write(self.execute(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[list]:
+    """Команда клиента: массив bulk-строк"""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        raise ValueError("Ожидался массив RESP")
+    parts = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        length = int(header[1:-2])
+        parts.append((await reader.readexactly(length + 2))[:-2])
+    return parts
+
+
+async def _serve(host: str, port: int):
+    server = StateServer(host, port)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальное RESP-хранилище состояния бота")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
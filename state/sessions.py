@@ -0,0 +1,29 @@
+"""
+Сессии визарда создания пари поверх хранилища состояния
+"""
+from typing import Optional
+
+from state.base import get_backend
+
+
+class SessionStore:
+    """Состояние пользователя по user_id: {'action': 'step0'|'step1'|..., 'bet_id': int, ...}
+
+    Сохраненный словарь не меняется на месте: после изменения его нужно записать через set().
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.namespace}:{user_id}"
+
+    async def get(self, user_id: int) -> Optional[dict]:
+        return await get_backend().get(self._key(user_id))
+
+    async def set(self, user_id: int, state: dict) -> None:
+        await get_backend().set(self._key(user_id), state, self.ttl)
+
+    async def delete(self, user_id: int) -> None:
+        await get_backend().delete(self._key(user_id))